@@ -0,0 +1,222 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import (
+    QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL,
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY
+)
+import model_registry
+import metrics
+
+# Layered chat cache:
+#   1. query text -> query embedding (in-memory LRU in front of the model)
+#   2. per agent: query embedding -> ChatResponse, matched by cosine similarity
+# Both layers expire entries after a TTL and are bounded in size. The answer
+# layer is dropped per agent when its index or LLM configuration changes.
+#
+# Embeddings barely move when only an identifier changes ("status of order
+# A123" vs "... A124" score well above 0.95), so a semantic match also needs
+# the same set of identifier tokens (words containing a digit).
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-_/][a-z0-9]+)*")
+
+
+def identifier_tokens(text):
+    """Tokens of a query that contain a digit: order numbers, part codes, versions, years."""
+    return frozenset(t for t in _TOKEN.findall(text.lower()) if any(c.isdigit() for c in t))
+
+
+class TTLCache:
+    """Thread-safe LRU map with per-entry expiry and hit/miss counters."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """
+    Embeddings wrapper that keeps recent query vectors in memory. Computing
+    the vector for the semantic cache lookup and again inside the retriever
+    therefore only runs the model once.
+    """
+
+    def __init__(self, base, max_size=QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL):
+        self.base = base
+        self.cache = TTLCache(max_size, ttl)
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = " ".join(text.split())
+        vector = self.cache.get(key)
+        metrics.record_cache("query_embedding", vector is not None)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """Vectors for several queries; those not cached are embedded in one model call."""
+        keys = [" ".join(text.split()) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        for vector in vectors:
+            metrics.record_cache("query_embedding", vector is not None)
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        if missing:
+            # Queries and documents embed the same way (see CachedEmbeddings.embed_query)
+            fresh = dict(zip(missing, self.base.embed_documents(list(missing.values()))))
+            for key, vector in fresh.items():
+                self.cache.put(key, vector)
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+
+class SemanticAnswerCache:
+    """
+    Per-agent answer cache. A query whose embedding has cosine similarity of
+    at least `threshold` with a cached query, and which mentions the same
+    identifiers, gets the stored answer back.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        # agent_id -> OrderedDict(normalized query -> (unit vector, response, expires_at, identifiers))
+        self._agents = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.identifier_mismatches = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, agent_id, query, query_vector):
+        identifiers = identifier_tokens(query)
+        vector = self._unit(query_vector)
+        now = time.time()
+        with self._lock:
+            entries = self._agents.get(agent_id)
+            if entries:
+                for key in [k for k, e in entries.items() if e[2] <= now]:
+                    del entries[key]
+            if not entries:
+                self.misses += 1
+                return None
+
+            keys = list(entries.keys())
+            matrix = np.stack([entries[k][0] for k in keys])
+            scores = matrix @ vector
+            same_ids = np.array([entries[k][3] == identifiers for k in keys])
+            if not same_ids.all() and scores[~same_ids].max() >= self.threshold:
+                self.identifier_mismatches += 1
+            scores = np.where(same_ids, scores, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                entries.move_to_end(keys[best])
+                self.hits += 1
+                return entries[keys[best]][1]
+            self.misses += 1
+            return None
+
+    def store(self, agent_id, query, query_vector, response):
+        key = " ".join(query.split())
+        entry = (self._unit(query_vector), response, time.time() + self.ttl, identifier_tokens(query))
+        with self._lock:
+            entries = self._agents.setdefault(agent_id, OrderedDict())
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, agent_id=None):
+        """Drop one agent's answers, or every agent's when agent_id is None."""
+        with self._lock:
+            if agent_id is None:
+                self._agents.clear()
+            else:
+                self._agents.pop(agent_id, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "agents": {agent_id: len(entries) for agent_id, entries in self._agents.items()},
+                "max_entries_per_agent": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "identifier_mismatches": self.identifier_mismatches,
+                "invalidations": self.invalidations
+            }
+
+
+answer_cache = SemanticAnswerCache()
+
+_query_embeddings = None
+_query_embeddings_lock = threading.Lock()
+
+
+def get_query_embeddings():
+    """Shared query-caching embeddings handle used by every agent's vector store."""
+    global _query_embeddings
+    with _query_embeddings_lock:
+        if _query_embeddings is None:
+            _query_embeddings = QueryEmbeddingLRU(model_registry.get_embeddings())
+        return _query_embeddings
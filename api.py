@@ -1,18 +1,47 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
+from urllib.parse import quote
+import time
+import asyncio
+import contextvars
+import uuid
+import threading
 import ingest
-import rag_app
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from config import GOOGLE_API_KEY, PERSIST_DIRECTORY, LLM_PROVIDER, OLLAMA_BASE_URL, OLLAMA_MODEL, AGENTS_FILE, SETTINGS_FILE
+import ingest_jobs
+import config_store
+import chain_cache
+import blob_store
+import sync_manifest
+from crawler import normalize_extensions, normalize_patterns
+from folder_tree import folder_tree
+from langchain_core.callbacks import BaseCallbackHandler
+from config import GOOGLE_API_KEY, PERSIST_DIRECTORY, LLM_PROVIDER, OLLAMA_BASE_URL, OLLAMA_MODEL, AGENTS_FILE, SETTINGS_FILE, EMBEDDING_WARMUP
+from config import CHAT_EXECUTOR_WORKERS, GEMINI_MAX_CONCURRENCY, OLLAMA_MAX_CONCURRENCY, ANSWER_CACHE_ENABLED
+from config import CHAT_BATCH_CONCURRENCY, CHAT_BATCH_GROUP_SIZE, CHAT_BATCH_MAX_ITEMS
+from config import RETRIEVAL_K, HYBRID_SEARCH_ENABLED, HYBRID_CANDIDATES, RRF_K
+from config import RERANK_ENABLED, RERANK_MODEL, RERANK_CANDIDATES, RERANK_TOP_N, RERANK_BUDGET_MS
+from config import CHAIN_CACHE_MAX_ENTRIES, CHAIN_CACHE_MAX_MB, CHAIN_CACHE_TTL
+from config import CONTEXT_PACKING_ENABLED, GEMINI_CONTEXT_TOKENS, OLLAMA_CONTEXT_TOKENS
+from config import FILES_CACHE_MAX_AGE
+import model_registry
+import metrics
+import answer_cache
+import bm25_index
+from hybrid_retriever import HybridRetriever, use_prefetched
+from reranker import RerankingRetriever
+from context_packer import PackingRetriever, estimate_tokens
+from embedding_cache import get_embedding_cache
+
+# Chroma, the LLM provider clients and the embedding model (torch) are not
+# imported here: uvicorn binds as soon as this module is imported, and the
+# startup warm-up below loads them in the background. /healthz answers once
+# the process is up, /readyz once the warm-up has finished.
 
 app = FastAPI()
 
@@ -22,44 +51,90 @@ app = FastAPI()
 # or we can remove it. Let's redirect config_store usage to the "default" agent.
 # AGENTS_FILE moved to config.py
 
+# agents.json and settings.json are cached per process and shared between
+# uvicorn workers through config_store; changes made by any worker drop the
+# affected chains here (see on_agents_changed / on_settings_changed)
 def load_agents():
-    if os.path.exists(AGENTS_FILE):
-        with open(AGENTS_FILE, "r") as f:
-            return json.load(f)
-    return []
+    return config_store.agents_store.get()
+
+def metrics_agent(agent_id):
+    """
+    Agent label for chat metrics. The agent ID of a request is client input,
+    so IDs that are not configured share one "unknown" series.
+    """
+    known = config_store.agents_store.read(lambda agents: any(agent["id"] == agent_id for agent in agents or []))
+    return agent_id if known else "unknown"
+
+# Warm-up step -> {"status": pending/ready/skipped/failed, "seconds", "error"}
+readiness = {
+    "chain_libraries": {"status": "pending"},
+    "embeddings": {"status": "pending" if EMBEDDING_WARMUP else "skipped"},
+    "reranker": {"status": "pending" if RERANK_ENABLED else "skipped"},
+    "job_store": {"status": "pending"}
+}
+
+def import_chain_libraries():
+    import langchain_chroma
+    import langchain_google_genai
+    import langchain_ollama
+    import langchain.chains
+
+def start_job_store():
+    ingest_jobs.get_store()
+    # Resume jobs whose worker died with the previous server process
+    ingest_jobs.ensure_worker()
+
+def run_warm_up_step(name, fn):
+    if readiness[name]["status"] == "skipped":
+        return
+    t0 = time.perf_counter()
+    try:
+        fn()
+        readiness[name] = {"status": "ready", "seconds": round(time.perf_counter() - t0, 2)}
+    except Exception as e:
+        print(f"Warm-up step {name} failed: {e}")
+        readiness[name] = {"status": "failed", "seconds": round(time.perf_counter() - t0, 2), "error": str(e)}
+
+def warm_up():
+    # One step at a time: they compete for the same CPU, and the first chat
+    # needs the libraries before it needs the model
+    run_warm_up_step("chain_libraries", import_chain_libraries)
+    run_warm_up_step("job_store", start_job_store)
+    run_warm_up_step("embeddings", model_registry.warm_up)
+    run_warm_up_step("reranker", lambda: model_registry.get_cross_encoder(RERANK_MODEL))
+    print("Warm-up finished:", {name: step["status"] for name, step in readiness.items()})
+
+def is_ready():
+    return all(step["status"] in ("ready", "skipped") for step in readiness.values())
 
-def save_agents(agents):
-    with open(AGENTS_FILE, "w") as f:
-        json.dump(agents, f, indent=4)
+async def sweep_idle_chains():
+    # Chains past their TTL are otherwise only evicted when the cache is used
+    while True:
+        await asyncio.sleep(CHAIN_SWEEP_SECONDS)
+        await asyncio.get_running_loop().run_in_executor(blocking_executor, qa_chains.evict_expired)
 
 @app.on_event("startup")
 async def startup_event():
     print("Application starting up...")
+    # Load heavy libraries and models in the background so uvicorn starts
+    # serving (and /healthz answers) right away
+    asyncio.get_running_loop().run_in_executor(blocking_executor, warm_up)
+    asyncio.create_task(sweep_idle_chains())
     # Add any necessary startup logic here, e.g., validating agents.json
     if not os.path.exists(AGENTS_FILE):
         print("No agents.json found. Creating default if needed.")
-        save_agents([{
-            "id": "default",
-            "name": "Default Agent",
-            "folder_id": "", 
-            "folder_name": "Not Configured"
-        }])
+    # Several workers may start at once; only the first one creates the file
+    config_store.agents_store.initialize([{
+        "id": "default",
+        "name": "Default Agent",
+        "folder_id": "", 
+        "folder_name": "Not Configured"
+    }])
 
 # SETTINGS_FILE moved to config.py
 
 def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r") as f:
-            return json.load(f)
-    return {
-        "llm_provider": os.getenv("LLM_PROVIDER", "gemini"),
-        "ollama_base_url": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-        "ollama_model": os.getenv("OLLAMA_MODEL", "llama3")
-    }
-
-def save_settings_to_file(settings):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(settings, f, indent=4)
+    return config_store.settings_store.get()
 
 
 class AgentLLMConfig(BaseModel):
@@ -67,12 +142,25 @@ class AgentLLMConfig(BaseModel):
     ollama_base_url: Optional[str] = None
     ollama_model: Optional[str] = None
 
+class AgentRerankConfig(BaseModel):
+    enabled: bool = True
+    candidates: Optional[int] = None
+    top_n: Optional[int] = None
+    budget_ms: Optional[int] = None
+    model: Optional[str] = None
+
 class Agent(BaseModel):
     id: str
     name: str
     folder_id: str
     folder_name: str
     llm_config: Optional[AgentLLMConfig] = None
+    rerank_config: Optional[AgentRerankConfig] = None
+    # File types to index, e.g. [".docx", ".pdf"]; unset means INGEST_EXTENSIONS
+    extensions: Optional[List[str]] = None
+    # Globs on the path below the folder, e.g. ["Specs/*"] / ["Archive", "~$*"]; unset exclude means CRAWL_EXCLUDE
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
 
 class SettingsRequest(BaseModel):
     llm_provider: str
@@ -85,53 +173,89 @@ class ChatRequest(BaseModel):
     
 class IngestRequest(BaseModel):
     agent_id: str = "default"
+    full_resync: bool = False
+
+class SourceFile(BaseModel):
+    name: str
+    # /files/<item_id>, or None when the file's content is not stored
+    url: Optional[str] = None
 
 class ChatResponse(BaseModel):
     answer: str
     sources: list[str]
+    source_files: list[SourceFile] = []
 
-# Global RAG Chain (Lazy loaded)
-# Global Ingestion Status (Map agent_id -> status dict)
-ingestion_status = {}
+# Global RAG Chains (Map agent_id -> chain), bounded by count, estimated
+# index memory and idle time; evicted chains' Chroma clients are closed
+qa_chains = chain_cache.ChainCache(CHAIN_CACHE_MAX_ENTRIES, CHAIN_CACHE_MAX_MB * 1024 * 1024, CHAIN_CACHE_TTL)
+CHAIN_SWEEP_SECONDS = 60
 
-def update_ingestion_status(agent_id, status, message):
-    ingestion_status[agent_id] = {
-        "status": status,
-        "message": message,
-        "timestamp": str(os.times()) # Simple timestamp
-    }
+def drop_chain(agent_id):
+    qa_chains.pop(agent_id, None)
+    answer_cache.answer_cache.invalidate(agent_id)
 
-async def run_ingestion(target_folder_id, agent_id):
-    try:
-        update_ingestion_status(agent_id, "processing", "Starting ingestion...")
-        ingest.main(target_folder_id=target_folder_id, agent_id=agent_id)
-        update_ingestion_status(agent_id, "completed", "Ingestion complete")
-        
-        # Invalidate chain cache
-        global qa_chains
-        if agent_id in qa_chains:
-            del qa_chains[agent_id]
-            
-    except Exception as e:
-        update_ingestion_status(agent_id, "failed", str(e))
+def on_agents_changed(old, new):
+    # Rebuild chains of agents whose entry changed or was removed
+    new_by_id = {a["id"]: a for a in new or []}
+    for agent in old or []:
+        if new_by_id.get(agent["id"]) != agent:
+            drop_chain(agent["id"])
 
-# Global RAG Chains (Map agent_id -> chain)
-qa_chains = {}
+def on_settings_changed(old, new):
+    # Agents without their own LLM config answer with the global one
+    qa_chains.clear()
+    answer_cache.answer_cache.invalidate()
 
-def get_qa_chain(agent_id="default"):
-    global qa_chains
-    if agent_id in qa_chains:
-        return qa_chains[agent_id]
-    
-    agent_persist_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
-    if not os.path.exists(agent_persist_dir) or not os.listdir(agent_persist_dir):
-        # Allow default agent to fallback? Maybe not.
-        return None
+config_store.agents_store.subscribe(on_agents_changed)
+config_store.settings_store.subscribe(on_settings_changed)
 
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectorstore = Chroma(persist_directory=agent_persist_dir, embedding_function=embeddings)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    
+def config_versions():
+    return config_store.agents_store.version, config_store.settings_store.version
+
+def refresh_if_reconfigured():
+    # At most one stat() per file per CONFIG_CHECK_SECONDS; the listeners
+    # above drop whatever another worker's change affects
+    config_store.agents_store.refresh()
+    config_store.settings_store.refresh()
+
+# Ingestion runs in a worker process (ingest_jobs.py). A chain remembers the
+# index version (finish time of the agent's last job) it was built against and
+# is rebuilt once a newer job has finished. Cached answers outlive idle chains
+# (ANSWER_CACHE_TTL > CHAIN_CACHE_TTL), so their version is tracked separately.
+chain_index_versions = {}
+answer_index_versions = {}
+index_version_checked = {}
+INDEX_VERSION_CHECK_SECONDS = 2.0
+
+def refresh_if_reindexed(agent_id):
+    now = time.monotonic()
+    if now - index_version_checked.get(agent_id, 0.0) < INDEX_VERSION_CHECK_SECONDS:
+        return
+    index_version_checked[agent_id] = now
+    version = ingest_jobs.get_store().index_version(agent_id)
+    if agent_id in qa_chains and chain_index_versions.get(agent_id) != version:
+        print(f"[{agent_id}] Index changed by an ingestion job; rebuilding chain.")
+        # Chroma caches one client per directory and the worker's writes are
+        # only seen by a fresh one; eviction detaches the old client
+        qa_chains.pop(agent_id, None)
+    if answer_index_versions.setdefault(agent_id, version) != version:
+        # Cached answers were built from the old index
+        answer_cache.answer_cache.invalidate(agent_id)
+        answer_index_versions[agent_id] = version
+
+# Map agent_id -> key of the LLM concurrency limiter its chain uses
+chain_llm_keys = {}
+# Serialises chain construction per agent so concurrent first requests build it once
+chain_build_locks = {}
+chain_build_locks_guard = threading.Lock()
+
+# Downloaded source files, served by /files/<item_id>
+downloads = blob_store.open_store(ingest.UPLOAD_DIR)
+
+# Blocking work (chain construction, model loading) runs here instead of on the event loop
+blocking_executor = ThreadPoolExecutor(max_workers=CHAT_EXECUTOR_WORKERS, thread_name_prefix="chat")
+
+def resolve_llm_settings(agent_id):
     # Load Agent Specific Config
     agents = load_agents()
     agent = next((a for a in agents if a["id"] == agent_id), None)
@@ -153,8 +277,85 @@ def get_qa_chain(agent_id="default"):
         provider = settings.get("llm_provider", "gemini")
         ollama_base_url = settings.get("ollama_base_url", ollama_base_url)
         ollama_model = settings.get("ollama_model", ollama_model)
+
+    return provider, ollama_base_url, ollama_model
+
+def resolve_rerank_settings(agent_id):
+    """Agent's rerank_config from agents.json, with unset fields taken from config.py."""
+    agent = next((a for a in load_agents() if a["id"] == agent_id), None)
+    config = (agent or {}).get("rerank_config") or {}
+    return {
+        "enabled": config.get("enabled", RERANK_ENABLED),
+        "candidates": config.get("candidates") or RERANK_CANDIDATES,
+        "top_n": config.get("top_n") or RERANK_TOP_N,
+        "budget_ms": config.get("budget_ms") or RERANK_BUDGET_MS,
+        "model": config.get("model") or RERANK_MODEL
+    }
+
+def llm_limit_key(provider, ollama_base_url):
+    # Each Ollama server has its own capacity; Gemini is one shared quota
+    if provider == "ollama":
+        return f"ollama:{ollama_base_url}"
+    return "gemini"
+
+def get_qa_chain(agent_id="default"):
+    chain = qa_chains.get(agent_id)
+    if chain is not None:
+        return chain
+
+    with chain_build_locks_guard:
+        lock = chain_build_locks.setdefault(agent_id, threading.Lock())
+    with lock:
+        chain = qa_chains.get(agent_id)
+        if chain is not None:
+            return chain
+        return build_qa_chain(agent_id)
+
+def build_qa_chain(agent_id):
+    from langchain_chroma import Chroma
+    from langchain.chains import RetrievalQA
+    from langchain.prompts import PromptTemplate
+
+    index_version = ingest_jobs.get_store().index_version(agent_id)
+    versions = config_versions()
+    agent_persist_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
+    if not os.path.exists(agent_persist_dir) or not os.listdir(agent_persist_dir):
+        # Allow default agent to fallback? Maybe not.
+        return None
+
+    embeddings = answer_cache.get_query_embeddings()
+    vectorstore = Chroma(persist_directory=agent_persist_dir, embedding_function=embeddings)
+    rerank = resolve_rerank_settings(agent_id)
+    # With reranking, retrieve a wider candidate set and let the cross-encoder pick
+    k = max(rerank["candidates"], rerank["top_n"]) if rerank["enabled"] else RETRIEVAL_K
+
+    keyword_index = None
+    if HYBRID_SEARCH_ENABLED and bm25_index.KeywordIndex.exists(agent_id):
+        keyword_index = bm25_index.KeywordIndex.for_agent(agent_id)
+    # Dense-only when there is no keyword index
+    retriever = hybrid = HybridRetriever(
+        vectorstore=vectorstore,
+        keyword_index=keyword_index,
+        k=k,
+        candidates=max(HYBRID_CANDIDATES, k),
+        rrf_k=RRF_K,
+        agent_id=agent_id
+    )
+
+    if rerank["enabled"]:
+        print(f"[{agent_id}] Reranking top {rerank['candidates']} with {rerank['model']} "
+              f"(keep {rerank['top_n']}, budget {rerank['budget_ms']} ms)")
+        retriever = RerankingRetriever(
+            base_retriever=retriever,
+            cross_encoder=model_registry.get_cross_encoder(rerank["model"]),
+            top_n=rerank["top_n"],
+            budget_ms=rerank["budget_ms"]
+        )
+    
+    provider, ollama_base_url, ollama_model = resolve_llm_settings(agent_id)
     
     if provider == "ollama":
+        from langchain_ollama import ChatOllama
         print(f"[{agent_id}] Using Ollama with model {ollama_model} at {ollama_base_url}")
         llm = ChatOllama(
             model=ollama_model,
@@ -163,6 +364,7 @@ def get_qa_chain(agent_id="default"):
         )
     else:
         # Default to Gemini
+        from langchain_google_genai import ChatGoogleGenerativeAI
         print(f"[{agent_id}] Using Gemini")
         llm = ChatGoogleGenerativeAI(
             model="gemini-2.0-flash",
@@ -182,6 +384,15 @@ def get_qa_chain(agent_id="default"):
     PROMPT = PromptTemplate(
         template=prompt_template, input_variables=["context", "question"]
     )
+
+    if CONTEXT_PACKING_ENABLED:
+        retriever = PackingRetriever(
+            base_retriever=retriever,
+            budget_tokens=OLLAMA_CONTEXT_TOKENS if provider == "ollama" else GEMINI_CONTEXT_TOKENS,
+            prompt_tokens=estimate_tokens(prompt_template),
+            agent_id=agent_id,
+            provider=provider
+        )
     
     chain = RetrievalQA.from_chain_type(
         llm=llm,
@@ -190,49 +401,88 @@ def get_qa_chain(agent_id="default"):
         chain_type_kwargs={"prompt": PROMPT},
         return_source_documents=True
     )
-    qa_chains[agent_id] = chain
+    chain_llm_keys[agent_id] = llm_limit_key(provider, ollama_base_url)
+    chain_index_versions[agent_id] = index_version
+    # A config change while building may already have been applied by the
+    # listeners; don't cache a chain built from the old config
+    if config_versions() == versions:
+        size = chain_cache.CHAIN_BASE_BYTES + chain_cache.estimate_vectorstore_bytes(
+            vectorstore, model_registry.embedding_dimension())
+        qa_chains.put(agent_id, chain, size=size,
+                      close=lambda: close_chain(hybrid, vectorstore, keyword_index))
+    else:
+        chain_cache.release_later(vectorstore, keyword_index)
     return chain
 
+def close_chain(hybrid, vectorstore, keyword_index):
+    # Results a batch prefetched from this index must not outlive the chain
+    hybrid.clear_prefetched()
+    chain_cache.release_later(vectorstore, keyword_index)
+
+async def get_qa_chain_async(agent_id="default"):
+    refresh_if_reconfigured()
+    refresh_if_reindexed(agent_id)
+    chain = qa_chains.get(agent_id)
+    if chain is not None:
+        return chain
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, get_qa_chain, agent_id)
+
+# Per-provider limits on in-flight LLM calls (created lazily on the event loop)
+llm_semaphores = {}
+
+def get_llm_semaphore(agent_id):
+    key = chain_llm_keys.get(agent_id, "gemini")
+    semaphore = llm_semaphores.get(key)
+    if semaphore is None:
+        limit = OLLAMA_MAX_CONCURRENCY if key.startswith("ollama:") else GEMINI_MAX_CONCURRENCY
+        semaphore = llm_semaphores[key] = asyncio.Semaphore(limit)
+    return semaphore
+
 @app.get("/api/agents")
 async def get_agents():
     return load_agents()
 
 @app.post("/api/agents")
 async def save_agent(agent: Agent):
-    agents = load_agents()
-    # Update existing or add new
-    existing_index = next((i for i, a in enumerate(agents) if a["id"] == agent.id), -1)
-    
     # Resolve folder name if unknown
     if agent.folder_id and (not agent.folder_name or agent.folder_name == "Unknown"):
         try:
-            headers = ingest.get_header()
-            drive_id = ingest.get_drive_id(headers)
-            info = ingest.get_folder_info(headers, drive_id, agent.folder_id)
-            agent.folder_name = info.get("name", "Unknown")
+            # Usually answered by the folder tree cache the picker just filled
+            loop = asyncio.get_running_loop()
+            drive_id = await loop.run_in_executor(blocking_executor, ingest.get_drive_id)
+            info = await loop.run_in_executor(blocking_executor, folder_tree.folder_info, drive_id, agent.folder_id)
+            agent.folder_name = info.get("name") or "Unknown"
         except:
              pass
 
     agent_data = agent.dict()
-    
-    if existing_index >= 0:
-        agents[existing_index] = agent_data
-        # Invalidate chain cache for this agent
-        if agent.id in qa_chains:
-            del qa_chains[agent.id]
-    else:
-        agents.append(agent_data)
-        
-    save_agents(agents)
+    if agent_data.get("extensions"):
+        agent_data["extensions"] = normalize_extensions(agent_data["extensions"])
+    for key in ("include", "exclude"):
+        if agent_data.get(key) is not None:
+            agent_data[key] = normalize_patterns(agent_data[key])
+
+    def upsert(agents):
+        # Update existing or add new
+        existing_index = next((i for i, a in enumerate(agents) if a["id"] == agent.id), -1)
+        if existing_index >= 0:
+            # The agent form edits neither reranking nor the file selection; keep what agents.json has
+            for key in ("rerank_config", "extensions", "include", "exclude"):
+                if agent_data.get(key) is None and agents[existing_index].get(key) is not None:
+                    agent_data[key] = agents[existing_index][key]
+            agents[existing_index] = agent_data
+        else:
+            agents.append(agent_data)
+        return agents
+
+    # The chain of an updated agent is dropped by on_agents_changed
+    config_store.agents_store.update(upsert)
     return {"status": "success", "agent": agent_data}
 
 @app.delete("/api/agents/{agent_id}")
 async def delete_agent(agent_id: str):
-    agents = load_agents()
-    agents = [a for a in agents if a["id"] != agent_id]
-    save_agents(agents)
-    if agent_id in qa_chains:
-        del qa_chains[agent_id]
+    config_store.agents_store.update(lambda agents: [a for a in agents if a["id"] != agent_id])
     return {"status": "success"}
 
 @app.get("/api/settings")
@@ -242,18 +492,15 @@ async def get_settings():
 @app.post("/api/settings")
 async def update_settings(settings: SettingsRequest):
     new_settings = settings.dict()
-    save_settings_to_file(new_settings)
-    
-    # Reload chain on next request
-    global qa_chains
-    qa_chains = {}
+    # Chains are reset (here and in the other workers) by on_settings_changed
+    config_store.settings_store.write(new_settings)
     
     return {"status": "success", "message": "Settings saved and RAG chain reset"}
 
 # Removed /api/config GET in favor of /api/agents
 
 @app.post("/api/ingest")
-async def trigger_ingest(request: IngestRequest, background_tasks: BackgroundTasks):
+async def trigger_ingest(request: IngestRequest):
     agents = load_agents()
     agent = next((a for a in agents if a["id"] == request.agent_id), None)
     
@@ -264,47 +511,520 @@ async def trigger_ingest(request: IngestRequest, background_tasks: BackgroundTas
     if not folder_id:
         raise HTTPException(status_code=400, detail="Agent has no target folder set")
     
-    # Run ingestion in background
-    background_tasks.add_task(run_ingestion, target_folder_id=folder_id, agent_id=request.agent_id)
-    return {"status": "started", "message": f"Ingestion triggered for agent {agent.get('name')}"}
+    # Queue the job; a separate worker process runs it
+    loop = asyncio.get_running_loop()
+    try:
+        job = await loop.run_in_executor(
+            blocking_executor, ingest_jobs.get_store().enqueue, request.agent_id, folder_id, request.full_resync
+        )
+    except ingest_jobs.JobConflict as e:
+        # A queued job may be waiting for a worker that is no longer there
+        await loop.run_in_executor(blocking_executor, ingest_jobs.ensure_worker)
+        raise HTTPException(status_code=409, detail={"message": str(e), "job": e.job})
+    await loop.run_in_executor(blocking_executor, ingest_jobs.ensure_worker)
+    return {"status": "started", "message": f"Ingestion triggered for agent {agent.get('name')}", "job": job}
+
+def job_status(job):
+    if job is None:
+        return {"status": "idle", "message": "No ingestion record"}
+    # The UI knows processing/completed/failed/cancelled
+    status = "processing" if job["status"] in ("queued", "running") else job["status"]
+    return {"status": status, "message": job["message"], "progress": job["progress"], "job": job}
 
 @app.get("/api/ingest/status")
 async def get_ingest_status(agent_id: str):
-    return ingestion_status.get(agent_id, {"status": "idle", "message": "No ingestion record"})
+    loop = asyncio.get_running_loop()
+    # The UI polls this; a job whose worker died shows as resuming, not running forever
+    await loop.run_in_executor(blocking_executor, ingest_jobs.recover_stale_jobs)
+    job = await loop.run_in_executor(blocking_executor, ingest_jobs.get_store().latest, agent_id)
+    return job_status(job)
+
+@app.get("/api/ingest/jobs")
+async def list_ingest_jobs(agent_id: Optional[str] = None, limit: int = 50):
+    jobs = await asyncio.get_running_loop().run_in_executor(
+        blocking_executor, ingest_jobs.get_store().list_jobs, agent_id, limit
+    )
+    return {"jobs": jobs}
+
+@app.get("/api/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = await asyncio.get_running_loop().run_in_executor(blocking_executor, ingest_jobs.get_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/ingest/jobs/{job_id}/cancel")
+async def cancel_ingest_job(job_id: str):
+    job = await asyncio.get_running_loop().run_in_executor(
+        blocking_executor, ingest_jobs.get_store().request_cancel, job_id
+    )
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+@app.post("/api/ingest/jobs/{job_id}/resume")
+async def resume_ingest_job(job_id: str):
+    loop = asyncio.get_running_loop()
+    try:
+        job = await loop.run_in_executor(blocking_executor, ingest_jobs.get_store().resume, job_id)
+    except ingest_jobs.JobConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job": e.job})
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "queued":
+        raise HTTPException(status_code=400, detail=f"Job is {job['status']}; only failed or cancelled jobs can be resumed")
+    await loop.run_in_executor(blocking_executor, ingest_jobs.ensure_worker)
+    return job_status(job)
 
 
 @app.get("/api/browse")
-async def browse_folders(parent_id: str = "root"):
+async def browse_folders(parent_id: str = "root", refresh: bool = False):
+    # Cached folder tree (see folder_tree.py); refresh=true bypasses it
+    loop = asyncio.get_running_loop()
     try:
-        headers = ingest.get_header()
-        drive_id = ingest.get_drive_id(headers)
-        folders = ingest.list_folders(headers, drive_id, parent_id)
+        drive_id = await loop.run_in_executor(blocking_executor, ingest.get_drive_id)
+        folders = await loop.run_in_executor(blocking_executor, folder_tree.children, drive_id, parent_id, refresh)
         return {"folders": folders, "parent_id": parent_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def lookup_query_vector(query):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    # Embedding runs the model on a miss; keep it off the event loop. The
+    # copied context carries the request's metrics labels into the thread.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, contextvars.copy_context().run,
+                                      answer_cache.get_query_embeddings().embed_query, query)
+
+def lookup_cached_answer(agent_id, query, query_vector):
+    if query_vector is None:
+        return None
+    cached = answer_cache.answer_cache.lookup(agent_id, query, query_vector)
+    metrics.record_cache("answer", cached is not None, metrics_agent(agent_id))
+    return cached
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Measures time to first token and total LLM time of one chain call."""
+    run_inline = True
+
+    def __init__(self, agent_id, timings):
+        self.agent_id = agent_id
+        self.provider = chain_llm_keys.get(agent_id, "gemini").split(":")[0]
+        self.timings = timings
+        self.started = None
+        self.first_token = None
+
+    def _start(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._start()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._start()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None and self.started is not None:
+            self.first_token = time.perf_counter()
+
+    def on_llm_end(self, response, **kwargs):
+        if self.started is None:
+            return
+        now = time.perf_counter()
+        observe_llm(self.provider, self.timings,
+                    (self.first_token or now) - self.started, now - self.started,
+                    reported_input_tokens(response))
+
+def reported_input_tokens(response):
+    """Prompt tokens from the provider's usage metadata, when it sends any."""
+    try:
+        message = response.generations[0][0].message
+    except (AttributeError, IndexError):
+        return None
+    return (getattr(message, "usage_metadata", None) or {}).get("input_tokens")
+
+def observe_llm(provider, timings, ttft, total, input_tokens=None):
+    metrics.LLM_TTFT_SECONDS.labels(timings.agent_id, provider).observe(ttft)
+    metrics.LLM_TOTAL_SECONDS.labels(timings.agent_id, provider).observe(total)
+    if input_tokens:
+        metrics.LLM_INPUT_TOKENS.labels(timings.agent_id, provider).observe(input_tokens)
+    timings.add("llm", total)
+
+def store_cached_answer(agent_id, query, query_vector, response):
+    if query_vector is not None:
+        answer_cache.answer_cache.store(agent_id, query, query_vector, response.dict())
+
+def find_retriever(chain, retriever_class):
+    """The retriever of the given class in the chain's stack of retriever wrappers."""
+    retriever = chain.retriever
+    while retriever is not None and not isinstance(retriever, retriever_class):
+        retriever = getattr(retriever, "base_retriever", None)
+    return retriever
+
+def retriever_stats(retriever_class):
+    found = {agent_id: find_retriever(chain, retriever_class) for agent_id, chain in list(qa_chains.items())}
+    return {agent_id: retriever.stats() for agent_id, retriever in found.items() if retriever is not None}
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "query_embeddings": answer_cache.get_query_embeddings().cache.stats(),
+        "answers": answer_cache.answer_cache.stats(),
+        "embedding_store": get_embedding_cache().stats(),
+        "chains": qa_chains.stats(),
+        "folders": folder_tree.stats(),
+        "rerank": retriever_stats(RerankingRetriever),
+        "context": retriever_stats(PackingRetriever)
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: libraries, models and stores are warmed up (503 until then)."""
+    ready = is_ready()
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"status": "ready" if ready else "starting", "checks": readiness})
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    chain = get_qa_chain(request.agent_id)
+async def chat(request: ChatRequest, http_response: Response):
+    timings = metrics.start_request(metrics_agent(request.agent_id))
+    with timings.measure("chain"):
+        chain = await get_qa_chain_async(request.agent_id)
     if not chain:
+        metrics.CHAT_REQUESTS.labels(timings.agent_id, "chat", "no_index").inc()
         raise HTTPException(status_code=400, detail="Index not found. Please ingest documents first.")
     
     try:
-        res = chain.invoke({"query": request.query})
+        with timings.measure("cache"):
+            query_vector = await lookup_query_vector(request.query)
+            cached = lookup_cached_answer(request.agent_id, request.query, query_vector)
+        if cached:
+            metrics.CHAT_REQUESTS.labels(timings.agent_id, "chat", "cached").inc()
+            http_response.headers["Server-Timing"] = timings.server_timing()
+            return ChatResponse(**cached)
+
+        semaphore = get_llm_semaphore(request.agent_id)
+        with timings.measure("queue"):
+            await semaphore.acquire()
+        try:
+            res = await chain.ainvoke(
+                {"query": request.query},
+                config={"callbacks": [LLMTimingCallback(request.agent_id, timings)]}
+            )
+        finally:
+            semaphore.release()
         answer = res["result"]
         source_docs = res.get("source_documents", [])
         sources = [doc.metadata.get("source", "Unknown") for doc in source_docs]
         
-        return ChatResponse(answer=answer, sources=sources)
+        response = ChatResponse(answer=answer, sources=sources, source_files=source_files(source_docs))
+        store_cached_answer(request.agent_id, request.query, query_vector, response)
+        metrics.CHAT_REQUESTS.labels(timings.agent_id, "chat", "ok").inc()
+        # e.g. "Server-Timing: cache;dur=2.1, retrieve;dur=38.4, rerank;dur=92.0, llm;dur=1210.5"
+        http_response.headers["Server-Timing"] = timings.server_timing()
+        return response
     except Exception as e:
+        metrics.CHAT_REQUESTS.labels(timings.agent_id, "chat", "error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def source_files(docs):
+    """One {"name", "url"} per cited file, in citation order."""
+    files, seen = [], set()
+    for doc in docs:
+        name = doc.metadata.get("source", "Unknown")
+        item_id = doc.metadata.get("item_id")
+        if (item_id or name) in seen:
+            continue
+        seen.add(item_id or name)
+        url = f"/files/{quote(item_id, safe='')}" if item_id and downloads.lookup(item_id) else None
+        files.append({"name": name, "url": url})
+    return files
+
+@app.get("/files/{item_id}")
+async def get_file(item_id: str, request: Request):
+    """
+    A downloaded source file by drive item ID. The ETag is the content hash,
+    so revalidation is answered with 304 until the file changes; Range
+    requests (e.g. PDF viewers fetching pages) are served by FileResponse.
+    """
+    entry = downloads.lookup(item_id)
+    path = downloads.blob_path(entry["blob"]) if entry else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    headers = {"ETag": f'"{entry["blob"]}"', "Cache-Control": f"private, max-age={FILES_CACHE_MAX_AGE}"}
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, filename=entry.get("name") or entry["blob"],
+                        content_disposition_type="inline", headers=headers)
+
+@app.post("/api/files/gc")
+async def collect_file_garbage():
+    """Delete downloaded files that no agent indexes any more."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(blocking_executor, blob_store.collect_garbage, ingest.UPLOAD_DIR)
+    except sync_manifest.ManifestUnavailable as e:
+        raise HTTPException(status_code=409, detail=f"Not collecting: {e}")
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def format_context(docs):
+    # Same layout the "stuff" chain uses
+    return "\n\n".join(doc.page_content for doc in docs)
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events variant of /api/chat: a `sources` event as soon as
+    retrieval finishes, then one `token` event per LLM chunk, then `done`.
+    """
+    chain = await get_qa_chain_async(request.agent_id)
+    if not chain:
+        raise HTTPException(status_code=400, detail="Index not found. Please ingest documents first.")
+
+    retriever = chain.retriever
+    llm_chain = chain.combine_documents_chain.llm_chain
+
+    async def event_stream():
+        # Headers are sent before any stage runs, so timings go in the `done` event
+        timings = metrics.start_request(metrics_agent(request.agent_id))
+        try:
+            with timings.measure("cache"):
+                query_vector = await lookup_query_vector(request.query)
+                cached = lookup_cached_answer(request.agent_id, request.query, query_vector)
+            if cached:
+                metrics.CHAT_REQUESTS.labels(timings.agent_id, "stream", "cached").inc()
+                yield sse_event("sources", {"sources": cached["sources"], "files": cached.get("source_files", [])})
+                yield sse_event("token", {"text": cached["answer"]})
+                yield sse_event("done", {"cached": True, "timings": timings.as_dict()})
+                return
+
+            docs = await retriever.ainvoke(request.query)
+            sources = [doc.metadata.get("source", "Unknown") for doc in docs]
+            files = source_files(docs)
+            yield sse_event("sources", {"sources": sources, "files": files})
+
+            prompt = llm_chain.prompt.format(context=format_context(docs), question=request.query)
+            tokens = []
+            provider = chain_llm_keys.get(request.agent_id, "gemini").split(":")[0]
+            async with get_llm_semaphore(request.agent_id):
+                started = time.perf_counter()
+                first_token = None
+                input_tokens = 0
+                async for chunk in llm_chain.llm.astream(prompt):
+                    # Usage arrives split across chunks (or on the last one)
+                    input_tokens += (getattr(chunk, "usage_metadata", None) or {}).get("input_tokens", 0)
+                    if chunk.content:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        tokens.append(chunk.content)
+                        yield sse_event("token", {"text": chunk.content})
+                now = time.perf_counter()
+                observe_llm(provider, timings, (first_token or now) - started, now - started, input_tokens)
+            metrics.CHAT_REQUESTS.labels(timings.agent_id, "stream", "ok").inc()
+            yield sse_event("done", {"timings": timings.as_dict()})
+            store_cached_answer(request.agent_id, request.query, query_vector,
+                                ChatResponse(answer="".join(tokens), sources=sources, source_files=files))
+        except Exception as e:
+            metrics.CHAT_REQUESTS.labels(timings.agent_id, "stream", "error").inc()
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Batch questions ---
+#
+# /api/chat/batch answers a JSONL body of questions, one {"query", "id"?,
+# "agent_id"?} object per line. Questions are taken in groups of
+# CHAT_BATCH_GROUP_SIZE: a group is embedded in one model call and each
+# agent's vector searches for it go to Chroma as one query (the hybrid
+# retriever keeps the results for the chain calls that follow). While the
+# next group is prepared, up to CHAT_BATCH_CONCURRENCY answers are
+# generated, each holding a slot of its provider's limiter like /api/chat.
+# One JSON line per question is streamed back as soon as it is answered.
+
+def parse_batch_lines(body, agent_id):
+    items = []
+    for line in body.decode("utf-8", errors="replace").splitlines():
+        if not line.strip():
+            continue
+        item = {"index": len(items), "id": None, "agent_id": agent_id, "query": None, "error": None}
+        try:
+            data = json.loads(line)
+            if isinstance(data, str):
+                data = {"query": data}
+            item["id"] = data.get("id")
+            item["agent_id"] = data.get("agent_id") or agent_id
+            item["query"] = str(data.get("query") or "").strip() or None
+            if item["query"] is None:
+                item["error"] = "Missing query"
+        except (ValueError, AttributeError) as e:
+            item["error"] = f"Invalid JSON line: {e}"
+        items.append(item)
+    return items
+
+def batch_result(item, timings=None, **fields):
+    result = {"index": item["index"], "id": item["id"], "agent_id": item["agent_id"], "query": item["query"]}
+    result.update(fields)
+    if timings is not None:
+        result["timings"] = timings.as_dict()
+    if "batch" in item:
+        result["batch"] = item["batch"]
+    return result
+
+def prepare_batch_group(group, chains, batch_id):
+    """
+    Embed a group's queries in one call, look them up in the answer cache
+    and prefetch the searches of the rest, one vector query per agent.
+    """
+    t0 = time.perf_counter()
+    vectors = answer_cache.get_query_embeddings().embed_queries([item["query"] for item in group])
+    embed_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    to_search = {}
+    for item, vector in zip(group, vectors):
+        item["vector"] = vector
+        item["cached"] = lookup_cached_answer(item["agent_id"], item["query"], vector) if ANSWER_CACHE_ENABLED else None
+        if item["cached"] is None:
+            to_search.setdefault(item["agent_id"], []).append(item)
+    for agent_id, items in to_search.items():
+        hybrid = find_retriever(chains[agent_id], HybridRetriever)
+        if hybrid is not None:
+            hybrid.prefetch([item["query"] for item in items], [item["vector"] for item in items], batch_id)
+    search_ms = (time.perf_counter() - t0) * 1000
+
+    for item in group:
+        item["batch"] = {"group_size": len(group), "embed_ms": round(embed_ms, 1), "search_ms": round(search_ms, 1)}
+
+async def answer_batch_item(item, chain):
+    agent_id = item["agent_id"]
+    timings = metrics.start_request(metrics_agent(agent_id))
+    if item["cached"]:
+        metrics.CHAT_REQUESTS.labels(timings.agent_id, "batch", "cached").inc()
+        return batch_result(item, timings, cached=True, **item["cached"])
+    try:
+        with timings.measure("queue"):
+            semaphore = get_llm_semaphore(agent_id)
+            await semaphore.acquire()
+        try:
+            res = await chain.ainvoke(
+                {"query": item["query"]},
+                config={"callbacks": [LLMTimingCallback(agent_id, timings)]}
+            )
+        finally:
+            semaphore.release()
+    except Exception as e:
+        metrics.CHAT_REQUESTS.labels(timings.agent_id, "batch", "error").inc()
+        return batch_result(item, timings, error=str(e))
+
+    source_docs = res.get("source_documents", [])
+    response = ChatResponse(answer=res["result"], sources=[doc.metadata.get("source", "Unknown") for doc in source_docs],
+                            source_files=source_files(source_docs))
+    if ANSWER_CACHE_ENABLED:
+        # Later questions of the batch may be near-duplicates of this one
+        store_cached_answer(agent_id, item["query"], item["vector"], response)
+    metrics.CHAT_REQUESTS.labels(timings.agent_id, "batch", "ok").inc()
+    return batch_result(item, timings, cached=False, **response.dict())
+
+async def run_batch(items):
+    """Yield one result per item, in completion order."""
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+    ready = asyncio.Queue(maxsize=CHAT_BATCH_GROUP_SIZE)
+    workers = max(1, CHAT_BATCH_CONCURRENCY)
+    chains = {}
+    chain_errors = {}
+    batch_id = uuid.uuid4().hex
+
+    async def produce():
+        pending = [item for item in items if not item["error"]]
+        for start in range(0, len(pending), CHAT_BATCH_GROUP_SIZE):
+            group = pending[start:start + CHAT_BATCH_GROUP_SIZE]
+            for agent_id in {item["agent_id"] for item in group} - set(chains):
+                try:
+                    chains[agent_id] = await get_qa_chain_async(agent_id)
+                except Exception as e:
+                    chains[agent_id], chain_errors[agent_id] = None, str(e)
+            searchable = []
+            for item in group:
+                if chains[item["agent_id"]] is None:
+                    error = chain_errors.get(item["agent_id"], "Index not found. Please ingest documents first.")
+                    await results.put(batch_result(item, error=error))
+                else:
+                    searchable.append(item)
+            if not searchable:
+                continue
+            try:
+                await loop.run_in_executor(blocking_executor, contextvars.copy_context().run,
+                                           prepare_batch_group, searchable, chains, batch_id)
+            except Exception as e:
+                for item in searchable:
+                    await results.put(batch_result(item, error=str(e)))
+                continue
+            for item in searchable:
+                await ready.put(item)
+        for _ in range(workers):
+            await ready.put(None)
+
+    async def work():
+        # Each worker task has its own context; only its searches take this batch's prefetched results
+        use_prefetched(batch_id)
+        while (item := await ready.get()) is not None:
+            try:
+                result = await answer_batch_item(item, chains[item["agent_id"]])
+            except Exception as e:
+                result = batch_result(item, error=str(e))
+            await results.put(result)
+
+    for item in items:
+        if item["error"]:
+            await results.put(batch_result(item, error=item["error"]))
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(work()) for _ in range(workers)]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: Request, agent_id: str = "default"):
+    """
+    Answer a JSONL body of questions. Streams one JSON line per question,
+    in completion order: index (line number among non-empty lines), id,
+    agent_id, query, answer, sources, source_files, cached, timings (this
+    question's stages in ms) and batch (its group's shared embedding and
+    search time), or error.
+    """
+    items = parse_batch_lines(await request.body(), agent_id)
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX_ITEMS} questions per batch")
+
+    async def lines():
+        async for result in run_batch(items):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # Mount static files
 # Mount static files
 static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 app.mount("/", StaticFiles(directory=static_dir, html=True), name="static")
-
-# Mount downloads for source access
-if os.path.exists(ingest.UPLOAD_DIR):
-    app.mount("/files", StaticFiles(directory=ingest.UPLOAD_DIR), name="files")
@@ -0,0 +1,68 @@
+import sys
+import json
+import time
+import argparse
+import requests
+
+# Command-line client for /api/chat/batch: sends a JSONL file of questions
+# ({"query": ..., "id": ..., "agent_id": ...} per line, or bare JSON strings)
+# and writes the answers as JSONL while they stream in, with a summary on
+# stderr. Answers arrive in completion order; each carries the input "index".
+#
+#   python batch_chat.py questions.jsonl --agent support > answers.jsonl
+#   python batch_chat.py - --url http://vm:8000 --output answers.jsonl < questions.jsonl
+
+
+def read_input(path):
+    if path == "-":
+        return sys.stdin.buffer.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions through /api/chat/batch.")
+    parser.add_argument("input", help="JSONL file of questions, or - for stdin")
+    parser.add_argument("--agent", default="default", help="agent for lines without an agent_id")
+    parser.add_argument("--url", default="http://localhost:8000", help="base URL of the API")
+    parser.add_argument("--output", help="write answers here instead of stdout")
+    parser.add_argument("--ordered", action="store_true", help="write answers in input order (after all arrived)")
+    args = parser.parse_args()
+
+    body = read_input(args.input)
+    out = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    counts = {"ok": 0, "cached": 0, "error": 0}
+    start = time.perf_counter()
+    try:
+        with requests.post(f"{args.url.rstrip('/')}/api/chat/batch", params={"agent_id": args.agent}, data=body,
+                           headers={"Content-Type": "application/x-ndjson"}, stream=True, timeout=(10, None)) as res:
+            res.raise_for_status()
+            for line in res.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                counts["error" if result.get("error") else "cached" if result.get("cached") else "ok"] += 1
+                if args.ordered:
+                    results.append(result)
+                else:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                done = sum(counts.values())
+                if done % 10 == 0:
+                    print(f"{done} answered ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+        for result in sorted(results, key=lambda r: r["index"]):
+            out.write(json.dumps(result) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"{total} questions in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.2f}/s): "
+          f"{counts['ok']} answered, {counts['cached']} from cache, {counts['error']} failed", file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_client
+from crawler import FolderCrawler, PathFilter
+from benchmarks import fake_graph
+from benchmarks.results import write_results
+
+# Folder enumeration against the local fake Graph server, which adds a fixed
+# per-request latency to stand in for the round trip to Graph. Compares a
+# one-request-at-a-time walk fetching full driveItems (how listing worked
+# before) with the concurrent crawler and its $select projection, at several
+# worker counts. Reports wall time, time to the first file, requests and JSON
+# bytes transferred.
+#
+# Usage: python -m benchmarks.bench_crawl [num_files] [num_folders] [depth] [latency_ms] [page_size]
+
+
+class FullItemCrawler(FolderCrawler):
+    """The crawler without $select, i.e. Graph's default driveItem payload."""
+
+    def children_url(self, drive_id, folder_id):
+        return f"drives/{drive_id}/items/{folder_id}/children?$top={self.page_size}"
+
+
+def run(label, crawler, server):
+    before = dict(server.stats)
+    start = time.perf_counter()
+    first = None
+    files = 0
+    # The crawler logs every folder and file; keep the benchmark output readable
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for _ in crawler.crawl(fake_graph.DRIVE_ID, fake_graph.ROOT_ID):
+            if first is None:
+                first = time.perf_counter() - start
+            files += 1
+    elapsed = time.perf_counter() - start
+    result = {
+        "run": label,
+        "workers": crawler.workers,
+        "seconds": round(elapsed, 3),
+        "first_file_s": round(first, 3) if first is not None else None,
+        "files": files,
+        "folders": crawler.stats["folders"],
+        "requests": server.stats["requests"] - before["requests"],
+        "json_mb": round((server.stats["json_bytes"] - before["json_bytes"]) / (1024 * 1024), 2)
+    }
+    print(f"{label:<24} {elapsed:7.2f}s  first file {result['first_file_s']}s  {files} files  "
+          f"{result['requests']} requests  {result['json_mb']} MiB JSON")
+    return result
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_folders = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    latency = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.03
+    page_size = int(sys.argv[5]) if len(sys.argv) > 5 else 100
+
+    workdir = tempfile.mkdtemp(prefix="bench-crawl-")
+    drive = fake_graph.FakeDrive(workdir, num_files=num_files, num_folders=num_folders, depth=depth, blobs=False)
+    server = fake_graph.FakeGraphServer(drive, page_size=page_size, latency=latency).start()
+    fake_graph.wait_until_ready(server.base_url)
+    print(f"Tree: {num_files} files in {num_folders} folders (depth {depth}), "
+          f"{latency * 1000:.0f} ms per request, {page_size} items per page")
+
+    results = []
+    try:
+        path_filter = PathFilter(exclude=[])
+        for label, crawler_class, workers in [("sequential, full items", FullItemCrawler, 1),
+                                              ("sequential, $select", FolderCrawler, 1),
+                                              ("4 workers, $select", FolderCrawler, 4),
+                                              ("8 workers, $select", FolderCrawler, 8),
+                                              ("16 workers, $select", FolderCrawler, 16)]:
+            client = graph_client.GraphClient(token_cache=fake_graph.StaticTokenCache(),
+                                              base_url=server.graph_url, pool_size=workers)
+            crawler = crawler_class(client=client, path_filter=path_filter, workers=workers, page_size=page_size)
+            results.append(run(label, crawler, server))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results("crawl", {"num_files": num_files, "num_folders": num_folders, "depth": depth,
+                            "latency_s": latency, "page_size": page_size}, results)
+
+
+if __name__ == "__main__":
+    main()
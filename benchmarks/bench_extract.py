@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractors
+from pipeline import timed_load
+from benchmarks.synthetic import generate_pdf, generate_pptx, generate_xlsx
+from benchmarks.results import write_results
+
+# Throughput of the native PDF, PPTX and XLSX extractors (extractors.py)
+# against the unstructured loader, per format, on generated files. For PDFs
+# it also times one large file parsed whole versus split into page ranges
+# across a process pool, which is how the ingestion pipeline runs it.
+# The unstructured runs are skipped when it is not installed.
+#
+# Usage: python -m benchmarks.bench_extract [files_per_format] [large_pdf_pages] [workers]
+
+
+def time_loader(fn, paths):
+    start = time.perf_counter()
+    docs = [doc for path in paths for doc in fn(path)]
+    seconds = time.perf_counter() - start
+    return seconds, docs
+
+
+def unstructured_loader():
+    try:
+        from langchain_community.document_loaders import UnstructuredFileLoader
+        import unstructured  # noqa: F401
+    except ImportError:
+        return None
+    return lambda path: UnstructuredFileLoader(path).load()
+
+
+def format_result(paths, seconds, docs, units):
+    megabytes = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+    return {
+        "seconds": round(seconds, 3),
+        "files_per_s": round(len(paths) / seconds, 2) if seconds else None,
+        f"{units}_per_s": round(len(docs) / seconds, 1) if seconds else None,
+        "mb_per_s": round(megabytes / seconds, 2) if seconds else None,
+        "documents": len(docs),
+        "characters": sum(len(d.page_content) for d in docs)
+    }
+
+
+def split_pdf(pool, path):
+    futures = [pool.submit(timed_load, task, path) for task in extractors.pdf_tasks(path)]
+    wait(futures)
+    return [doc for future in futures for doc in future.result()[0]]
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    large_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp(prefix="bench_extract_")
+    formats = {
+        "pdf": (generate_pdf, extractors.load_pdf, "pages"),
+        "pptx": (generate_pptx, extractors.load_pptx, "slides"),
+        "xlsx": (generate_xlsx, extractors.load_xlsx, "blocks")
+    }
+    fallback = unstructured_loader()
+    results = {}
+    try:
+        for name, (generate, native, units) in formats.items():
+            print(f"Generating {files} .{name} files...")
+            paths = []
+            for i in range(files):
+                path = os.path.join(workdir, f"doc_{i}.{name}")
+                generate(path, rng)
+                paths.append(path)
+
+            seconds, docs = time_loader(native, paths)
+            results[name] = {"native": format_result(paths, seconds, docs, units)}
+            print(f"  native:       {seconds:6.2f}s  {len(paths) / seconds:7.1f} files/s  "
+                  f"{len(docs)} {units}, {sum(len(d.page_content) for d in docs)} chars")
+            if fallback is not None:
+                seconds, docs = time_loader(fallback, paths)
+                results[name]["unstructured"] = format_result(paths, seconds, docs, "elements")
+                print(f"  unstructured: {seconds:6.2f}s  {len(paths) / seconds:7.1f} files/s  "
+                      f"{sum(len(d.page_content) for d in docs)} chars")
+            else:
+                print("  unstructured: not installed, skipped")
+
+        print(f"Generating a {large_pages}-page PDF...")
+        large = os.path.join(workdir, "large.pdf")
+        generate_pdf(large, rng, pages=large_pages)
+        whole, whole_docs = time_loader(extractors.load_pdf, [large])
+
+        # Workers are started (and import pypdf) before timing, so pool start-up is not counted
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            wait([pool.submit(extractors.pdf_page_count, large) for _ in range(workers)])
+            start = time.perf_counter()
+            split_docs = split_pdf(pool, large)
+            split = time.perf_counter() - start
+
+        results["large_pdf"] = {
+            "pages": large_pages,
+            "pages_per_task": extractors.PDF_PAGES_PER_TASK,
+            "workers": workers,
+            "whole_s": round(whole, 3),
+            "split_s": round(split, 3),
+            "speedup": round(whole / split, 2) if split else None,
+            "same_text": [d.page_content for d in whole_docs] == [d.page_content for d in split_docs]
+        }
+        print(f"  whole file:   {whole:6.2f}s  ({large_pages / whole:.0f} pages/s)")
+        print(f"  {workers} workers:    {split:6.2f}s  ({large_pages / split:.0f} pages/s, {whole / split:.1f}x), "
+              f"same text: {results['large_pdf']['same_text']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results("extract", {"files_per_format": files, "large_pdf_pages": large_pages, "workers": workers},
+                  results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chroma import Chroma
+import model_registry
+from bm25_index import KeywordIndex
+from hybrid_retriever import HybridRetriever
+from pipeline import chunk_id
+
+# Compares dense, keyword (BM25) and hybrid (RRF) retrieval on a synthetic
+# corpus of spec-sheet chunks that each carry a unique part number and error
+# code. Reports index build time, per-query latency and recall@k for queries
+# that name a code exactly and for queries that paraphrase the chunk.
+#
+# Usage: python -m benchmarks.bench_hybrid [num_chunks] [num_queries] [k]
+
+COMPONENTS = ("pump valve sensor relay controller gateway inverter actuator "
+              "compressor transformer").split()
+SYMPTOMS = ("overheating", "pressure loss", "signal dropout", "voltage spike",
+            "firmware mismatch", "fan stall", "calibration drift", "seal leak")
+LOCATIONS = ("north hall", "boiler room", "roof deck", "substation B", "line 3", "cold store")
+
+
+def make_chunk(rng, i):
+    component = rng.choice(COMPONENTS)
+    part = f"{rng.choice('ABCDEFGH')}{rng.choice('KLMNPRST')}-{rng.randint(1000, 9999)}-{i:05d}"
+    error = f"E{rng.randint(100, 999)}x{i:05d}"
+    symptom = rng.choice(SYMPTOMS)
+    location = rng.choice(LOCATIONS)
+    text = (f"The {component} {part} installed in the {location} is rated for "
+            f"{rng.randint(12, 480)} V. Error code {error} indicates {symptom}; "
+            f"check the {component} wiring and reset the {component} before replacing it.")
+    return text, {"part": part, "error": error, "component": component,
+                  "symptom": symptom, "location": location}
+
+
+def make_queries(rng, facts, count):
+    """
+    Exact queries name one chunk's code; paraphrased ones describe a situation
+    and are answered by any chunk with the same component, location and symptom.
+    """
+    by_situation = {}
+    for i, f in enumerate(facts):
+        by_situation.setdefault((f["component"], f["location"], f["symptom"]), set()).add(i)
+
+    exact, paraphrase = [], []
+    for _ in range(count):
+        i = rng.randrange(len(facts))
+        f = facts[i]
+        exact.append((rng.choice([f"What does error {f['error']} mean?",
+                                  f"Specs for part {f['part']}"]), {i}))
+        paraphrase.append((f"{f['component']} in the {f['location']} has {f['symptom']}, what should I do?",
+                           by_situation[(f["component"], f["location"], f["symptom"])]))
+    return {"exact": exact, "paraphrase": paraphrase}
+
+
+def evaluate(search, queries, k):
+    latencies = []
+    hits = 0
+    for query, relevant in queries:
+        t0 = time.perf_counter()
+        docs = search(query)
+        latencies.append(time.perf_counter() - t0)
+        hits += any(doc.metadata.get("chunk_index") in relevant for doc in docs[:k])
+    latencies.sort()
+    return {
+        "recall": hits / len(queries),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000
+    }
+
+
+def main():
+    num_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    rng = random.Random(42)
+    chunks = [make_chunk(rng, i) for i in range(num_chunks)]
+    texts = [text for text, _ in chunks]
+    facts = [fact for _, fact in chunks]
+    metadatas = [{"item_id": "bench", "chunk_index": i, "source": f"spec_{i // 20}.docx"} for i in range(num_chunks)]
+    ids = [chunk_id("bench", i, text) for i, text in enumerate(texts)]
+    queries = make_queries(rng, facts, num_queries)
+
+    workdir = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        embeddings = model_registry.get_embedding_model()
+        vectorstore = Chroma(persist_directory=os.path.join(workdir, "chroma"), embedding_function=embeddings)
+
+        t0 = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        embed_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for start in range(0, num_chunks, 2000):
+            end = start + 2000
+            vectorstore._collection.upsert(ids=ids[start:end], embeddings=vectors[start:end],
+                                           documents=texts[start:end], metadatas=metadatas[start:end])
+        chroma_seconds = time.perf_counter() - t0
+
+        keyword_index = KeywordIndex(os.path.join(workdir, "bench.bm25.sqlite"))
+        t0 = time.perf_counter()
+        for start in range(0, num_chunks, 256):
+            end = start + 256
+            keyword_index.upsert(ids[start:end], texts[start:end], metadatas[start:end])
+        bm25_seconds = time.perf_counter() - t0
+
+        print(f"{num_chunks} chunks: embedding {embed_seconds:.2f}s, Chroma upsert {chroma_seconds:.2f}s, "
+              f"BM25 build {bm25_seconds:.2f}s ({num_chunks / bm25_seconds:.0f} chunks/s)")
+
+        hybrid = HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=k)
+        dense = vectorstore.as_retriever(search_kwargs={"k": k})
+
+        def keyword(query):
+            return [doc for _, doc in hybrid._keyword_results(query)[:k]]
+
+        retrievers = {"dense": dense.invoke, "bm25": keyword, "hybrid": hybrid.invoke}
+        # Warm the query path once so the first timing is not an outlier
+        for search in retrievers.values():
+            search("warm up")
+
+        print(f"\n{'queries':<12}{'retriever':<10}{f'recall@{k}':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for kind, kind_queries in queries.items():
+            for name, search in retrievers.items():
+                r = evaluate(search, kind_queries, k)
+                print(f"{kind:<12}{name:<10}{r['recall']:>10.2f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+        keyword_index.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
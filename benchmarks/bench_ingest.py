@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Everything the run writes (Chroma, manifests, caches, job store) goes to a
+# scratch directory, and the Graph credentials only need to be present.
+WORKDIR = tempfile.mkdtemp(prefix="bench-ingest-")
+os.environ["DATA_DIR"] = os.path.join(WORKDIR, "data")
+os.environ.setdefault("CLIENT_ID", "bench")
+os.environ.setdefault("CLIENT_SECRET", "bench")
+os.environ.setdefault("TENANT_ID", "bench")
+os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+
+from benchmarks import fake_graph
+os.environ["SHAREPOINT_DRIVE_ID"] = fake_graph.DRIVE_ID
+
+import ingest
+import graph_client
+import model_registry
+from benchmarks.results import peak_rss_mb, write_results
+
+# End-to-end ingestion benchmark against the local fake Graph server: delta
+# enumeration, downloads, parsing, chunking, embedding and the Chroma and BM25
+# upserts all run for real. Measures a full sync of a generated folder tree
+# and a no-change incremental rerun, and reports files/s, chunks/s, peak RSS
+# and Graph request/429 counts.
+#
+# --fake-embeddings swaps the MiniLM model for a deterministic fake embedding,
+# which isolates the rest of the pipeline from model inference time.
+#
+# Usage: python -m benchmarks.bench_ingest [num_files] [tables_per_file] [throttle_every] [--fake-embeddings]
+
+AGENT_ID = "bench-ingest"
+
+
+def use_fake_embeddings(size=384):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    fake = DeterministicFakeEmbedding(size=size)
+    model_registry.get_embedding_model = lambda *args, **kwargs: fake
+
+
+def run_sync(label, server):
+    requests_before = dict(server.stats)
+    progress_updates = []
+
+    def progress(phase, counters):
+        progress_updates.append((phase, counters))
+
+    start = time.perf_counter()
+    summary = ingest.main(agent_id=AGENT_ID, progress=progress) or {}
+    elapsed = time.perf_counter() - start
+
+    files = summary.get("files_indexed", 0)
+    chunks = summary.get("chunks", 0)
+    result = {
+        "run": label,
+        "seconds": elapsed,
+        "files_indexed": files,
+        "files_failed": summary.get("files_failed", 0),
+        "chunks": chunks,
+        "files_per_s": files / elapsed if elapsed else 0.0,
+        "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+        "graph_requests": server.stats["requests"] - requests_before["requests"],
+        "graph_throttled": server.stats["throttled"] - requests_before["throttled"],
+        "bytes_served": server.stats["bytes_served"] - requests_before["bytes_served"],
+        "progress_updates": len(progress_updates),
+        "phases": list(dict.fromkeys(phase for phase, _ in progress_updates))
+    }
+    print(f"{label:>12}: {elapsed:6.2f} s, {files} files ({result['files_per_s']:.1f}/s), "
+          f"{chunks} chunks ({result['chunks_per_s']:.1f}/s), "
+          f"{result['graph_requests']} Graph requests, {result['graph_throttled']} throttled")
+    return result
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    num_files = int(args[0]) if len(args) > 0 else 100
+    tables = int(args[1]) if len(args) > 1 else 4
+    throttle_every = int(args[2]) if len(args) > 2 else 25
+    fake_embeddings = "--fake-embeddings" in sys.argv
+
+    config = {"num_files": num_files, "tables_per_file": tables, "throttle_every": throttle_every,
+              "fake_embeddings": fake_embeddings}
+    try:
+        print(f"Generating {num_files} documents with {tables} tables each...")
+        drive = fake_graph.FakeDrive(os.path.join(WORKDIR, "corpus"), num_files=num_files, tables=tables)
+        server = fake_graph.FakeGraphServer(drive, throttle_every=throttle_every).start()
+        fake_graph.wait_until_ready(server.base_url)
+
+        ingest.UPLOAD_DIR = os.path.join(WORKDIR, "downloads")
+        os.makedirs(ingest.UPLOAD_DIR, exist_ok=True)
+        graph_client._client = graph_client.GraphClient(
+            token_cache=fake_graph.StaticTokenCache(), base_url=server.graph_url
+        )
+
+        if fake_embeddings:
+            use_fake_embeddings()
+        else:
+            # Keep model loading out of the measured sync
+            model_registry.warm_up()
+
+        results = [run_sync("full sync", server), run_sync("incremental", server)]
+        server.stop()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    rss = peak_rss_mb()
+    print(f"Peak RSS: {rss.get('self', 0):.0f} MB (parse workers {rss.get('children', 0):.0f} MB)")
+    write_results("ingest", config, {"runs": results, "peak_rss_mb": rss})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from benchmarks.results import write_results
+
+# Startup cost of the API: how long `import api` takes (and which of its
+# imports the time goes to, from python -X importtime), and for a real
+# uvicorn process how long until /healthz answers and until /readyz reports
+# the background warm-up as finished. Each run uses a fresh interpreter and
+# a scratch DATA_DIR.
+#
+# Usage: python -m benchmarks.bench_startup [runs] [readiness_timeout_s]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scratch_env(data_dir):
+    env = dict(os.environ)
+    env["DATA_DIR"] = data_dir
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def import_profile(env, top=10):
+    """(wall seconds for `import api`, [(module, cumulative seconds)] for the slowest modules api imports)."""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api"],
+                          cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"import api failed:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Nesting is shown as two spaces per level; keep what `api` imports directly
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if not cumulative.strip().isdigit() or depth != 1:
+            continue
+        name = name.strip()
+        modules[name] = modules.get(name, 0) + int(cumulative) / 1e6
+    slowest = sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return wall, slowest
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout, proc, expect=200):
+    deadline = time.perf_counter() + timeout
+    last = None
+    while time.perf_counter() < deadline and proc.poll() is None:
+        try:
+            last = requests.get(url, timeout=1)
+            if last.status_code == expect:
+                return last
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.05)
+    return last
+
+
+def server_startup(env, readiness_timeout):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port)],
+                            cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        health = wait_for(f"{base}/healthz", 120, proc)
+        healthy_at = time.perf_counter() - t0 if health is not None and health.status_code == 200 else None
+        ready = wait_for(f"{base}/readyz", readiness_timeout, proc)
+        ready_at = time.perf_counter() - t0 if ready is not None and ready.status_code == 200 else None
+        checks = ready.json().get("checks") if ready is not None else None
+    finally:
+        proc.terminate()
+        try:
+            _, stderr = proc.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            _, stderr = proc.communicate()
+    if healthy_at is None:
+        print(f"Server did not come up:\n{stderr.decode(errors='replace')[-2000:]}")
+    return {"healthz_s": healthy_at, "readyz_s": ready_at, "checks": checks}
+
+
+def median_or_none(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def seconds_or_na(value):
+    return f"{value:6.2f} s" if value is not None else "   n/a"
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    readiness_timeout = float(sys.argv[2]) if len(sys.argv) > 2 else 300.0
+
+    results = []
+    for run in range(runs):
+        data_dir = tempfile.mkdtemp(prefix="bench-startup-")
+        try:
+            env = scratch_env(data_dir)
+            import_s, slowest = import_profile(env)
+            server = server_startup(env, readiness_timeout)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        result = {"run": run, "import_api_s": import_s, "slowest_imports": slowest, **server}
+        results.append(result)
+        print(f"run {run}: import api {import_s:5.2f} s, /healthz {seconds_or_na(server['healthz_s'])}, "
+              f"/readyz {seconds_or_na(server['readyz_s'])}")
+        if run == 0:
+            for name, seconds in slowest:
+                print(f"    {seconds:6.3f} s  {name}")
+
+    summary = {
+        "import_api_s_median": median_or_none(r["import_api_s"] for r in results),
+        "healthz_s_median": median_or_none(r["healthz_s"] for r in results),
+        "readyz_s_median": median_or_none(r["readyz_s"] for r in results)
+    }
+    print(summary)
+    write_results("startup", {"runs": runs, "readiness_timeout_s": readiness_timeout},
+                  {"summary": summary, "runs": results})
+
+
+if __name__ == "__main__":
+    main()
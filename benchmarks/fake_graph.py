@@ -0,0 +1,329 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from benchmarks.synthetic import generate_docx
+
+# Local stand-in for the parts of Microsoft Graph that ingestion uses:
+# children listing, delta feeds, item lookups, JSON $batch, /content and
+# pre-signed download URLs. Collections are paged with @odata.nextLink and
+# honour $select and $top, item lookups answer If-None-Match with 304, every
+# `throttle_every`-th request (including $batch sub-requests) is answered
+# with 429 and a Retry-After header, and `latency` adds a fixed delay to each
+# HTTP request to mimic the round trip to Graph.
+
+DRIVE_ID = "bench-drive"
+ROOT_ID = "bench-root"
+
+
+class FakeDrive:
+    """
+    A generated folder tree of synthetic .docx files, kept on local disk.
+    With blobs=False only the listing exists (for crawl benchmarks).
+    """
+
+    def __init__(self, workdir, num_files=100, num_folders=10, depth=2, tables=4, seed=42, blobs=True):
+        self.items = {}
+        self.children = {ROOT_ID: []}
+        self.blobs = {}
+        self.items[ROOT_ID] = self._item(ROOT_ID, "root", None, folder=True)
+
+        rng = random.Random(seed)
+        folders = [ROOT_ID]
+        for f in range(num_folders):
+            # Nest up to `depth` levels by picking a parent among shallow folders
+            parent = rng.choice([fid for fid in folders if self._depth(fid) < depth])
+            folder_id = f"folder-{f}"
+            self._add(self._item(folder_id, f"Area {f}", parent, folder=True))
+            folders.append(folder_id)
+
+        os.makedirs(workdir, exist_ok=True)
+        for i in range(num_files):
+            file_id = f"file-{i}"
+            size = 0
+            if blobs:
+                path = os.path.join(workdir, f"{file_id}.docx")
+                if not os.path.exists(path):
+                    generate_docx(path, rng, tables=tables, rows=15, cols=5)
+                self.blobs[file_id] = path
+                size = os.path.getsize(path)
+            self._add(self._item(file_id, f"Spec {i}.docx", rng.choice(folders), size=size))
+
+    def _depth(self, folder_id):
+        depth = 0
+        while self.items[folder_id]["parentReference"].get("id"):
+            folder_id = self.items[folder_id]["parentReference"]["id"]
+            depth += 1
+        return depth
+
+    def _item(self, item_id, name, parent_id, folder=False, size=0):
+        tag = hashlib.sha1(item_id.encode()).hexdigest()[:12]
+        item = {
+            "id": item_id,
+            "name": name,
+            "eTag": f"\"{tag},1\"",
+            "cTag": f"\"c:{tag},1\"",
+            "size": size,
+            "lastModifiedDateTime": "2024-01-01T00:00:00Z",
+            "parentReference": {"id": parent_id, "driveId": DRIVE_ID} if parent_id else {"driveId": DRIVE_ID},
+            # Fields Graph returns by default that ingestion does not use
+            "createdDateTime": "2023-06-01T08:30:00Z",
+            "webUrl": f"https://contoso.sharepoint.com/sites/bench/Shared%20Documents/{item_id}",
+            "createdBy": {"user": {"email": "author@contoso.com", "id": tag, "displayName": "Bench Author"}},
+            "lastModifiedBy": {"user": {"email": "editor@contoso.com", "id": tag, "displayName": "Bench Editor"}},
+            "fileSystemInfo": {"createdDateTime": "2023-06-01T08:30:00Z",
+                               "lastModifiedDateTime": "2024-01-01T00:00:00Z"},
+            "shared": {"scope": "users"}
+        }
+        if folder:
+            item["folder"] = {"childCount": 0}
+        else:
+            item["file"] = {"mimeType": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                            "hashes": {"quickXorHash": f"{tag}AAAAAAAAAAAAAAAA="}}
+        return item
+
+    def _add(self, item):
+        self.items[item["id"]] = item
+        self.children.setdefault(item["parentReference"]["id"], []).append(item["id"])
+        if "folder" in item:
+            self.children.setdefault(item["id"], [])
+            self.items[item["parentReference"]["id"]]["folder"]["childCount"] += 1
+
+    def descendants(self, folder_id):
+        """Folder subtree in pre-order, as a delta feed enumerates it."""
+        result = []
+        stack = list(reversed(self.children.get(folder_id, [])))
+        while stack:
+            item_id = stack.pop()
+            result.append(item_id)
+            stack.extend(reversed(self.children.get(item_id, [])))
+        return result
+
+
+class FakeGraphServer:
+    def __init__(self, drive, page_size=50, throttle_every=0, retry_after=0.05, latency=0.0,
+                 host="127.0.0.1", port=0):
+        self.drive = drive
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.stats = {"requests": 0, "throttled": 0, "batch_requests": 0, "bytes_served": 0, "json_bytes": 0,
+                      "not_modified": 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    @property
+    def graph_url(self):
+        return f"{self.base_url}/v1.0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-graph", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _count(self, key="requests", n=1):
+        with self._lock:
+            self.stats[key] += n
+            return self.stats[key]
+
+    def _should_throttle(self):
+        count = self._count()
+        if self.throttle_every and count % self.throttle_every == 0:
+            self._count("throttled")
+            return True
+        return False
+
+    # --- Routing ---
+
+    def _page(self, ids, url_path, query):
+        top = int(query.get("$top", [self.page_size])[0])
+        skip = int(query.get("$skiptoken", ["0"])[0])
+        page = [self.drive.items[i] for i in ids[skip:skip + top]]
+        body = {"value": page}
+        if skip + top < len(ids):
+            select = f"&$select={query['$select'][0]}" if "$select" in query else ""
+            body["@odata.nextLink"] = f"{self.graph_url}/{url_path}?$top={top}&$skiptoken={skip + top}{select}"
+        return body
+
+    @staticmethod
+    def _project(payload, query):
+        """Apply $select to an item or a collection page."""
+        if "$select" not in query or not isinstance(payload, dict):
+            return payload
+        fields = set(query["$select"][0].split(","))
+
+        def pick(item):
+            return {k: v for k, v in item.items() if k in fields or k.startswith("@")}
+
+        if "value" in payload:
+            return dict(payload, value=[pick(i) for i in payload["value"]])
+        return pick(payload)
+
+    def route(self, method, path, query, body=None):
+        """Returns (status, json body or file path, headers)."""
+        if method == "POST" and path == "$batch":
+            self._count("batch_requests")
+            responses = []
+            for sub in body.get("requests", []):
+                parts = urlsplit(sub["url"])
+                if self._should_throttle():
+                    responses.append({"id": sub["id"], "status": 429,
+                                      "headers": {"Retry-After": str(self.retry_after)}, "body": None})
+                    continue
+                sub_query = parse_qs(parts.query)
+                status, payload, _ = self.route(sub.get("method", "GET"), parts.path.strip("/"), sub_query)
+                payload = self._project(payload, sub_query) if status == 200 else payload
+                responses.append({"id": sub["id"], "status": status, "body": payload})
+            return 200, {"responses": responses}, {}
+
+        parts = path.split("/")
+        if len(parts) < 3 or parts[0] != "drives" or parts[1] != DRIVE_ID:
+            return 404, {"error": {"code": "itemNotFound"}}, {}
+        rest = parts[2:]
+
+        if rest == ["root"]:
+            return 200, {"id": ROOT_ID}, {}
+        if rest == ["root", "delta"]:
+            rest = ["items", ROOT_ID, "delta"]
+        if rest[0] != "items" or len(rest) < 2 or rest[1] not in self.drive.items:
+            return 404, {"error": {"code": "itemNotFound"}}, {}
+
+        item_id = rest[1]
+        action = rest[2] if len(rest) > 2 else None
+        if action is None:
+            return 200, self.drive.items[item_id], {}
+        if action == "children":
+            return 200, self._page(self.drive.children.get(item_id, []), path, query), {}
+        if action == "delta":
+            if query.get("token") == ["latest"]:
+                return 200, {"value": [], "@odata.deltaLink": f"{self.graph_url}/{path}?token=latest"}, {}
+            body = self._page(self.drive.descendants(item_id), path, query)
+            if "@odata.nextLink" not in body:
+                body["@odata.deltaLink"] = f"{self.graph_url}/{path}?token=latest"
+            return 200, body, {}
+        if action == "content" and item_id in self.drive.blobs:
+            return 200, self.drive.blobs[item_id], {}
+        return 404, {"error": {"code": "itemNotFound"}}, {}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                if payload is None:
+                    data = b""
+                    content_type = "application/json"
+                elif isinstance(payload, str) and os.path.exists(payload):
+                    with open(payload, "rb") as f:
+                        data = f.read()
+                    content_type = "application/octet-stream"
+                    server._count("bytes_served", len(data))
+                else:
+                    data = json.dumps(payload).encode()
+                    content_type = "application/json"
+                    server._count("json_bytes", len(data))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                parts = urlsplit(self.path)
+                body = None
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = json.loads(self.rfile.read(length))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_throttle():
+                    self._send(429, {"error": {"code": "TooManyRequests"}}, {"Retry-After": str(server.retry_after)})
+                    return
+
+                if parts.path.startswith("/download/"):
+                    blob = server.drive.blobs.get(parts.path.rsplit("/", 1)[-1])
+                    self._send(200 if blob else 404, blob or {"error": {"code": "itemNotFound"}})
+                    return
+                if not parts.path.startswith("/v1.0/"):
+                    self._send(404, {"error": {"code": "invalidRequest"}})
+                    return
+
+                query = parse_qs(parts.query)
+                status, payload, headers = server.route(method, parts.path[len("/v1.0/"):], query, body)
+                if status == 200 and isinstance(payload, dict):
+                    if payload.get("eTag") and self.headers.get("If-None-Match") == payload["eTag"]:
+                        server._count("not_modified")
+                        self._send(304, None, headers)
+                        return
+                    payload = server._with_download_urls(payload)
+                    payload = server._project(payload, query)
+                self._send(status, payload, headers)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+    def _with_download_urls(self, payload):
+        """Attach pre-signed style download URLs to file items, as Graph does."""
+        def annotate(item):
+            if isinstance(item, dict) and "file" in item:
+                item = dict(item)
+                item["@microsoft.graph.downloadUrl"] = f"{self.base_url}/download/{item['id']}"
+            return item
+
+        if "value" in payload:
+            payload = dict(payload, value=[annotate(i) for i in payload["value"]])
+        elif "responses" in payload:
+            payload = dict(payload, responses=[
+                dict(r, body=self._with_download_urls(r["body"])) if isinstance(r.get("body"), dict) else r
+                for r in payload["responses"]
+            ])
+        else:
+            payload = annotate(payload)
+        return payload
+
+
+class StaticTokenCache:
+    """Token cache for the fake server, which accepts any bearer token."""
+
+    def get_token(self):
+        return "bench-token"
+
+    def invalidate(self):
+        pass
+
+
+def wait_until_ready(url, timeout=5.0):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Fake Graph server at {url} did not start")
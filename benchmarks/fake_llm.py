@@ -0,0 +1,71 @@
+import time
+import asyncio
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+# Local stand-ins for the LLM provider and the vector store retriever, so chat
+# can be load-tested without Gemini, Ollama or a real index.
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Chat model that answers with a fixed text after a configurable delay:
+    `first_token_latency` before the first token, then `token_latency` per
+    token. Supports sync, async and streaming calls like the real providers.
+    """
+
+    response: str = "This is a synthetic answer produced by the fake chat model for benchmarking."
+    first_token_latency: float = 0.2
+    token_latency: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _tokens(self):
+        words = self.response.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens()
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens()
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class FakeRetriever(BaseRetriever):
+    """Returns `k` canned chunks after a blocking `latency` (simulated vector search)."""
+
+    k: int = 3
+    latency: float = 0.005
+    docs: Optional[List[Document]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        time.sleep(self.latency)
+        if self.docs:
+            return self.docs[:self.k]
+        return [
+            Document(page_content=f"Synthetic context chunk {i} about {query}.", metadata={"source": f"doc_{i}.docx"})
+            for i in range(self.k)
+        ]
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The answer cache path embeds every query; keep it on so both runs embed
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "true")
+os.environ.setdefault("GEMINI_MAX_CONCURRENCY", "16")
+
+import httpx
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import api
+import answer_cache
+from benchmarks.load_chat import AGENT_ID, install_fake_chain
+from benchmarks.results import write_results
+
+# A regression set answered by looping over /api/chat (one question at a
+# time, as the nightly scripts did) against one /api/chat/batch call. Uses
+# the fake LLM and retriever from load_chat and a fake embedding model with a
+# fixed cost per call plus a smaller cost per text, standing in for the
+# per-call overhead of the sentence-transformer. Reports wall time, time to
+# the first answer and the number of embedding model calls.
+#
+# Usage: python -m benchmarks.load_batch [questions] [llm_latency_s] [embed_call_ms]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    call_seconds: float = 0.02
+    text_seconds: float = 0.001
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.call_seconds + self.text_seconds * len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def install_fake_embeddings(call_seconds):
+    model = CountingEmbeddings(size=384, call_seconds=call_seconds)
+    answer_cache._query_embeddings = answer_cache.QueryEmbeddingLRU(model)
+    return model
+
+
+def reset(model):
+    model.calls = 0
+    answer_cache._query_embeddings.cache.clear()
+    answer_cache.answer_cache.invalidate()
+
+
+async def run_loop(client, questions):
+    start = time.perf_counter()
+    first = None
+    for question in questions:
+        res = await client.post("/api/chat", json={"query": question, "agent_id": AGENT_ID})
+        res.raise_for_status()
+        if first is None:
+            first = time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+
+async def run_batch(client, questions):
+    body = "\n".join(json.dumps({"query": q, "id": i}) for i, q in enumerate(questions))
+    start = time.perf_counter()
+    first = None
+    answers = 0
+    async with client.stream("POST", "/api/chat/batch", params={"agent_id": AGENT_ID}, content=body) as res:
+        res.raise_for_status()
+        async for line in res.aiter_lines():
+            if not line:
+                continue
+            if json.loads(line).get("error"):
+                raise RuntimeError(line)
+            answers += 1
+            if first is None:
+                first = time.perf_counter() - start
+    if answers != len(questions):
+        raise RuntimeError(f"Expected {len(questions)} answers, got {answers}")
+    return time.perf_counter() - start, first
+
+
+async def main():
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    llm_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    embed_call_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    install_fake_chain(llm_latency)
+    model = install_fake_embeddings(embed_call_ms / 1000)
+    questions = [f"regression question {i} about topic {i % 17}" for i in range(num_questions)]
+
+    transport = httpx.ASGITransport(app=api.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for label, run in [("loop over /api/chat", run_loop), ("/api/chat/batch", run_batch)]:
+            reset(model)
+            elapsed, first = await run(client, questions)
+            result = {"run": label, "seconds": round(elapsed, 2), "first_answer_s": round(first, 3),
+                      "questions_per_s": round(num_questions / elapsed, 2), "embedding_calls": model.calls}
+            results.append(result)
+            print(f"{label:<20} {elapsed:7.2f}s  first answer {first:.3f}s  "
+                  f"{result['questions_per_s']:6.2f} q/s  {model.calls} embedding calls")
+
+    write_results("load_batch", {"questions": num_questions, "llm_latency_s": llm_latency,
+                                 "embed_call_ms": embed_call_ms, "batch_concurrency": api.CHAT_BATCH_CONCURRENCY,
+                                 "group_size": api.CHAT_BATCH_GROUP_SIZE}, results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import json
+import asyncio
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Let the fake provider, not the limiter or the answer cache, be the bottleneck unless overridden
+os.environ.setdefault("GEMINI_MAX_CONCURRENCY", "64")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+import httpx
+from langchain.chains import RetrievalQA
+from langchain.prompts import PromptTemplate
+import api
+from benchmarks.fake_llm import FakeStreamingChatModel, FakeRetriever
+from benchmarks.results import write_results
+
+# Load test for the chat path. Installs a chain backed by a fake LLM (fixed
+# latency) and fake retriever under a test agent, then drives /api/chat with
+# N concurrent clients. With a non-blocking chat path throughput scales with N
+# until the provider limit, and /api/ingest/status stays fast under load.
+#
+# With --stream the clients use /api/chat/stream instead and also report the
+# time to the first token event as seen by the client.
+#
+# Usage: python -m benchmarks.load_chat [requests_per_client] [llm_latency_s] [token_latency_s] [--stream]
+
+AGENT_ID = "bench-load"
+
+
+def install_fake_chain(llm_latency, token_latency=0.0):
+    prompt = PromptTemplate(template="Context:\n{context}\n\nQuestion: {question}\nAnswer:",
+                            input_variables=["context", "question"])
+    chain = RetrievalQA.from_chain_type(
+        llm=FakeStreamingChatModel(first_token_latency=llm_latency, token_latency=token_latency),
+        chain_type="stuff",
+        retriever=FakeRetriever(),
+        chain_type_kwargs={"prompt": prompt},
+        return_source_documents=True
+    )
+    api.qa_chains[AGENT_ID] = chain
+    api.chain_llm_keys[AGENT_ID] = "gemini"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def stream_chat(client, query):
+    """(total seconds, seconds to the first token event) for one streamed answer."""
+    t0 = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", "/api/chat/stream", json={"query": query, "agent_id": AGENT_ID}) as res:
+        res.raise_for_status()
+        async for line in res.aiter_lines():
+            if line == "event: token" and first_token is None:
+                first_token = time.perf_counter() - t0
+            elif line == "event: error":
+                raise RuntimeError("Stream ended with an error event")
+    return time.perf_counter() - t0, first_token
+
+
+async def run_level(client, concurrency, per_client, stream=False):
+    latencies = []
+    ttfts = []
+    status_latencies = []
+    stop = asyncio.Event()
+
+    async def chat_client(i):
+        for j in range(per_client):
+            query = f"question {i}-{j}"
+            if stream:
+                latency, ttft = await stream_chat(client, query)
+                latencies.append(latency)
+                if ttft is not None:
+                    ttfts.append(ttft)
+                continue
+            t0 = time.perf_counter()
+            res = await client.post("/api/chat", json={"query": query, "agent_id": AGENT_ID})
+            res.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    async def status_poller():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await client.get("/api/ingest/status", params={"agent_id": AGENT_ID})
+            status_latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.05)
+
+    poller = asyncio.create_task(status_poller())
+    start = time.perf_counter()
+    await asyncio.gather(*(chat_client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await poller
+
+    result = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "status_p95_ms": percentile(status_latencies, 95) * 1000
+    }
+    if stream:
+        result["ttft_p50_s"] = statistics.median(ttfts) if ttfts else 0.0
+        result["ttft_p95_s"] = percentile(ttfts, 95)
+    return result
+
+
+async def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    per_client = int(args[0]) if len(args) > 0 else 5
+    llm_latency = float(args[1]) if len(args) > 1 else 0.2
+    token_latency = float(args[2]) if len(args) > 2 else 0.0
+    stream = "--stream" in sys.argv
+    install_fake_chain(llm_latency, token_latency)
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        results = []
+        for concurrency in (1, 2, 4, 8, 16, 32):
+            result = await run_level(client, concurrency, per_client, stream)
+            results.append(result)
+            line = (f"{concurrency:>3} clients: {result['throughput_rps']:6.1f} req/s, "
+                    f"p50 {result['p50_s'] * 1000:6.0f} ms, p95 {result['p95_s'] * 1000:6.0f} ms, "
+                    f"p99 {result['p99_s'] * 1000:6.0f} ms, status p95 {result['status_p95_ms']:5.1f} ms")
+            if stream:
+                line += f", TTFT p50 {result['ttft_p50_s'] * 1000:5.0f} ms"
+            print(line)
+
+    print(json.dumps(results, indent=2))
+    write_results("load_chat", {"requests_per_client": per_client, "llm_latency_s": llm_latency,
+                                "token_latency_s": token_latency, "stream": stream}, results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+import docx
+
+# Synthetic spec-like documents shared by the benchmarks: Word files with
+# headings, paragraphs and tables with horizontally and vertically merged
+# cells, plus text-layer PDFs, slide decks with tables and notes, and
+# workbooks with large sheets. Slide decks and workbooks need the packages
+# in requirements-dev.txt.
+
+WORDS = ("pump valve sensor cable module firmware voltage relay panel gateway "
+         "controller bracket housing fuse terminal spec revision approval").split()
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def generate_docx(path, rng, tables=20, rows=30, cols=6):
+    document = docx.Document()
+    for t in range(tables):
+        document.add_heading(f"Section {t + 1}", level=2)
+        for _ in range(3):
+            document.add_paragraph(sentence(rng, rng.randint(8, 30)))
+        table = document.add_table(rows=rows, cols=cols)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"R{r}C{c} {rng.choice(WORDS)} | {rng.randint(0, 9999)}"
+        # Horizontal and vertical merges, which python-docx resolves per cell
+        for r in range(1, rows - 3, 5):
+            table.cell(r, 0).merge(table.cell(r + 3, 0))
+            table.cell(r, 2).merge(table.cell(r, 4))
+    document.save(path)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def generate_pdf(path, rng, pages=20, lines_per_page=45):
+    """Text-only PDF written by hand (no PDF library needed to generate it)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for number in range(pages):
+        lines = [f"Page {number + 1}"] + [sentence(rng, rng.randint(6, 14)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate_pptx(path, rng, slides=20, rows=8, cols=4):
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    for number in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = f"Slide {number + 1}: {sentence(rng, 4)}"
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(9), Inches(1.5)).text_frame
+        box.text = sentence(rng, 20)
+        for _ in range(2):
+            box.add_paragraph().text = sentence(rng, 15)
+        table = slide.shapes.add_table(rows, cols, Inches(0.5), Inches(3.2), Inches(9), Inches(3)).table
+        for r in range(rows):
+            for c in range(cols):
+                table.cell(r, c).text = f"R{r}C{c} {rng.choice(WORDS)} {rng.randint(0, 9999)}"
+        slide.notes_slide.notes_text_frame.text = sentence(rng, 25)
+    presentation.save(path)
+
+
+def generate_xlsx(path, rng, sheets=3, rows=2000, cols=8):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    for number in range(sheets):
+        sheet = workbook.create_sheet(f"Sheet{number + 1}")
+        sheet.append([f"{rng.choice(WORDS).capitalize()} {c}" for c in range(cols)])
+        for r in range(rows):
+            sheet.append([rng.randint(0, 99999) if c % 2 else f"{rng.choice(WORDS)} {r}" for c in range(cols)])
+    workbook.save(path)
@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import threading
+from config import BLOB_GC_GRACE_SECONDS
+from config_store import JsonFileStore, agents_store
+import sync_manifest
+
+# Downloaded documents, stored by content:
+#
+#   downloads/blobs/<sha256[:2]>/<sha256><ext>   file content, written once
+#   downloads/blobs/tmp/                         downloads in progress
+#   downloads/items.json                         drive item ID -> blob
+#
+# A file that appears in several folders or agents is stored once, and two
+# files with the same name never overwrite each other. The extension is
+# part of the blob name because loaders are chosen by it.
+#
+# Blobs are removed by collect_garbage() once no agent's sync manifest
+# lists an item pointing at them; a manifest that cannot be read stops the
+# collection instead of counting as empty. Anything written within the last
+# BLOB_GC_GRACE_SECONDS is kept, so files an ingestion run has downloaded
+# but not yet recorded in its manifest survive a concurrent collection.
+
+INDEX_FILE_NAME = "items.json"
+BLOB_DIR_NAME = "blobs"
+TMP_DIR_NAME = "tmp"
+
+
+def blob_name(digest, file_name):
+    return digest + os.path.splitext(file_name or "")[1].lower()
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, BLOB_DIR_NAME)
+        self.tmp_dir = os.path.join(self.blob_dir, TMP_DIR_NAME)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._index = JsonFileStore(os.path.join(root, INDEX_FILE_NAME), default=dict)
+
+    def blob_path(self, blob):
+        return os.path.join(self.blob_dir, blob[:2], blob)
+
+    # --- Item index ---
+
+    def lookup(self, item_id):
+        """The index entry of a drive item ({"blob", "name", "eTag", "size", "stored_at"}), or None."""
+        entry = self._index.read(lambda index: index.get(item_id))
+        return dict(entry) if entry else None
+
+    def path_of(self, item_id):
+        """Local path of the item's content, or None when it is not stored."""
+        entry = self.lookup(item_id)
+        if not entry:
+            return None
+        path = self.blob_path(entry["blob"])
+        return path if os.path.exists(path) else None
+
+    def record(self, entries):
+        """Point drive items at their blobs: {item_id: {"blob", "name", "eTag", "size"}}."""
+        if not entries:
+            return
+        now = time.time()
+
+        def merge(index):
+            for item_id, entry in entries.items():
+                index[item_id] = dict(entry, stored_at=now)
+            return index
+
+        self._index.update(merge)
+
+    # --- Content ---
+
+    def open_temp(self):
+        """(path, file) of a new temporary file for a download."""
+        path = os.path.join(self.tmp_dir, f"{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}.part")
+        return path, open(path, "wb")
+
+    def commit(self, tmp_path, digest, file_name):
+        """
+        Move a finished download into the store. Returns (blob, is_new);
+        content that is already stored is kept and the download discarded.
+        """
+        blob = blob_name(digest, file_name)
+        path = self.blob_path(blob)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # Fresh again, so a collection running right now keeps it
+            os.utime(path)
+            return blob, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return blob, True
+
+    # --- Garbage collection ---
+
+    def collect_garbage(self, referenced_items, grace_seconds=BLOB_GC_GRACE_SECONDS):
+        """
+        Drop index entries of items outside `referenced_items` and delete the
+        blobs no remaining entry points to, plus abandoned temporary files and
+        files left in the root by the old flat downloads directory.
+        """
+        cutoff = time.time() - grace_seconds
+        removed_items = []
+
+        def prune(index):
+            for item_id, entry in list(index.items()):
+                if item_id not in referenced_items and entry.get("stored_at", 0) < cutoff:
+                    removed_items.append(item_id)
+                    del index[item_id]
+            return index
+
+        index = self._index.update(prune)
+        keep = {entry["blob"] for entry in index.values()}
+
+        stats = {"items_removed": len(removed_items), "items_kept": len(index),
+                 "blobs_removed": 0, "blobs_kept": 0, "bytes_freed": 0, "bytes_kept": 0}
+        for directory, _, names in os.walk(self.blob_dir):
+            is_tmp = directory == self.tmp_dir
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if (is_tmp or name not in keep) and st.st_mtime < cutoff:
+                    self._remove(path, st.st_size, stats)
+                elif not is_tmp:
+                    stats["blobs_kept"] += 1
+                    stats["bytes_kept"] += st.st_size
+
+        for entry in os.scandir(self.root):
+            # Flat copies (and their download index) from before the blob store
+            if entry.is_file() and not entry.name.startswith((INDEX_FILE_NAME, f".{INDEX_FILE_NAME}")):
+                if entry.stat().st_mtime < cutoff:
+                    self._remove(entry.path, entry.stat().st_size, stats)
+        return stats
+
+    @staticmethod
+    def _remove(path, size, stats):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        stats["blobs_removed"] += 1
+        stats["bytes_freed"] += size
+
+
+def referenced_items():
+    """
+    Drive item IDs indexed by any configured agent, from their sync manifests.
+    Raises sync_manifest.ManifestUnavailable when a manifest cannot be read:
+    counting that agent as indexing nothing would delete all of its files.
+    """
+    item_ids = set()
+    for agent in agents_store.get() or []:
+        manifest = sync_manifest.read_manifest(agent["id"])
+        if manifest is not None:
+            item_ids.update(manifest["items"])
+    return item_ids
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(root):
+    """The BlobStore for a downloads directory, shared within the process."""
+    root = os.path.abspath(root)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = BlobStore(root)
+        return store
+
+
+def collect_garbage(root):
+    stats = open_store(root).collect_garbage(referenced_items())
+    print(f"Blob store: removed {stats['items_removed']} items and {stats['blobs_removed']} files "
+          f"({stats['bytes_freed'] / (1024 * 1024):.1f} MiB); kept {stats['blobs_kept']} blobs "
+          f"({stats['bytes_kept'] / (1024 * 1024):.1f} MiB) for {stats['items_kept']} items")
+    return stats
+
+
+if __name__ == "__main__":
+    # python blob_store.py [downloads dir]
+    collect_garbage(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "downloads"))
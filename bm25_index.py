@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from config import PERSIST_DIRECTORY
+
+# Persistent per-agent BM25 keyword index, kept next to the agent's Chroma
+# directory as chroma_db/<agent_id>.bm25.sqlite. It is written by the same
+# upsert/delete calls as the vector store (chunk IDs are shared), so exact
+# matches on part numbers, error codes and product names that the embedding
+# model handles poorly can be found by keyword.
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_DF_RATIO = 0.5
+SQLITE_MAX_VARIABLES = 900
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """
+    Lowercased alphanumeric tokens. Compound identifiers such as "AB-1234/X"
+    are kept whole and also split into their parts, so both the full code
+    and its pieces match.
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall((text or "").lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(p for p in re.split(r"[-_./]", match) if p)
+    return tokens
+
+
+def index_path(agent_id):
+    return os.path.join(PERSIST_DIRECTORY, f"{agent_id}.bm25.sqlite")
+
+
+class KeywordIndex:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def for_agent(cls, agent_id):
+        return cls(index_path(agent_id))
+
+    @staticmethod
+    def exists(agent_id):
+        return os.path.exists(index_path(agent_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _delete_locked(self, ids):
+        for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", chunk)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", chunk)
+
+    def upsert(self, ids, texts, metadatas):
+        docs = []
+        postings = []
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            counts = Counter(tokenize(text))
+            docs.append((doc_id, sum(counts.values()), text, json.dumps(metadata or {})))
+            postings.extend((term, doc_id, tf) for term, tf in counts.items())
+
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.executemany("INSERT INTO docs (id, length, content, metadata) VALUES (?, ?, ?, ?)", docs)
+            self._conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", postings)
+            self._conn.commit()
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            self._delete_locked(list(ids))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query, k=10):
+        """Returns [(doc_id, score, content, metadata)] best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs, total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+            if n_docs == 0:
+                return []
+            avg_length = total_length / n_docs
+
+            doc_freqs = {}
+            for term in terms:
+                df = self._conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if df:
+                    doc_freqs[term] = df
+            if not doc_freqs:
+                return []
+            # Terms in over half the corpus add little score but cost a full
+            # postings scan; skip them unless nothing rarer is left
+            rare = {t: df for t, df in doc_freqs.items() if df <= n_docs * MAX_DF_RATIO}
+            if rare:
+                doc_freqs = rare
+
+            scores = Counter()
+            for term, df in doc_freqs.items():
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / norm
+
+            top = scores.most_common(k)
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            rows = self._conn.execute(
+                f"SELECT id, content, metadata FROM docs WHERE id IN ({placeholders})",
+                [doc_id for doc_id, _ in top]
+            ).fetchall()
+
+        by_id = {doc_id: (content, json.loads(metadata)) for doc_id, content, metadata in rows}
+        return [(doc_id, score, *by_id[doc_id]) for doc_id, score in top if doc_id in by_id]
+
+
+def rebuild_from_collection(agent_id, collection, page_size=5000):
+    """Backfill the keyword index of an agent from its existing Chroma collection."""
+    index = KeywordIndex.for_agent(agent_id)
+    index.clear()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        index.upsert(page["ids"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
+    print(f"[{agent_id}] Keyword index rebuilt with {offset} chunks.")
+    return index
+
+
+def open_for_agent(agent_id, collection):
+    """
+    Keyword index of an agent, backfilled from its Chroma collection when the
+    collection predates the keyword index.
+    """
+    if not KeywordIndex.exists(agent_id) and collection.count() > 0:
+        return rebuild_from_collection(agent_id, collection)
+    return KeywordIndex.for_agent(agent_id)
+
+
+def main():
+    # Usage: python bm25_index.py agent_id [agent_id ...]
+    from langchain_chroma import Chroma
+    for agent_id in sys.argv[1:]:
+        path = os.path.join(PERSIST_DIRECTORY, agent_id)
+        if not os.path.isdir(path):
+            print(f"[{agent_id}] No index found, skipping.")
+            continue
+        rebuild_from_collection(agent_id, Chroma(persist_directory=path)._collection).close()
+
+
+if __name__ == "__main__":
+    main()
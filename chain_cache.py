@@ -0,0 +1,210 @@
+import time
+import threading
+from collections import OrderedDict
+import metrics
+
+# Bounded cache of per-agent QA chains. Each chain keeps an open Chroma
+# client (whose HNSW index is loaded into memory on the first query), a
+# BM25 index connection and an LLM client, so idle agents are evicted:
+#
+#   - least recently used first once more than `max_entries` chains, or an
+#     estimated `max_bytes` of index memory, are resident;
+#   - any chain unused for `ttl` seconds.
+#
+# Evicted chains may still be serving a request, so their resources are
+# closed after CLOSE_GRACE_SECONDS. Their Chroma system is detached from
+# chromadb's per-directory client cache right away, so a chain rebuilt for
+# the same agent in the meantime opens a fresh one.
+
+CLOSE_GRACE_SECONDS = 120
+
+# hnswlib stores each vector as float32 plus ~130 bytes of level-0 links;
+# Chroma adds label <-> ID maps on top
+HNSW_BYTES_PER_VECTOR = 400
+# LLM client, retriever and chain objects of one agent
+CHAIN_BASE_BYTES = 8 * 1024 * 1024
+
+
+def estimate_vectorstore_bytes(vectorstore, dimension):
+    """Approximate resident size of a Chroma collection's HNSW index once loaded."""
+    try:
+        count = vectorstore._collection.count()
+    except Exception:
+        return 0
+    return count * (dimension * 4 + HNSW_BYTES_PER_VECTOR)
+
+
+def detach_chroma(vectorstore):
+    """
+    Remove the vector store's system from chromadb's shared client cache and
+    return it, so it can be stopped once in-flight queries are done.
+    """
+    from chromadb.api.client import SharedSystemClient
+    client = getattr(vectorstore, "_client", None)
+    identifier = getattr(client, "_identifier", None)
+    systems = SharedSystemClient._identifier_to_system
+    return systems.pop(identifier, None) if identifier is not None else None
+
+
+class _Entry:
+    __slots__ = ("value", "size", "close", "created", "last_used")
+
+    def __init__(self, value, size, close):
+        self.value = value
+        self.size = size
+        self.close = close
+        self.created = self.last_used = time.monotonic()
+
+
+class ChainCache:
+    """
+    LRU/TTL cache of agent_id -> chain with a count and memory budget.
+    Supports the dict operations api.py uses (in, [], get, pop, clear, items).
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": {"lru": 0, "memory": 0, "ttl": 0, "invalidated": 0}}
+
+    def __contains__(self, agent_id):
+        return agent_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, agent_id):
+        value = self.get(agent_id)
+        if value is None:
+            raise KeyError(agent_id)
+        return value
+
+    def __setitem__(self, agent_id, value):
+        self.put(agent_id, value)
+
+    def get(self, agent_id, default=None):
+        evicted = []
+        with self._lock:
+            self._expire(evicted)
+            entry = self._entries.get(agent_id)
+            if entry is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(agent_id)
+        self._close(evicted)
+        return entry.value if entry is not None else default
+
+    def put(self, agent_id, value, size=0, close=None):
+        """Cache `value`; `close()` releases its resources once it is evicted."""
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(agent_id, None)
+            if old is not None:
+                evicted.append((agent_id, old, "invalidated"))
+            self._entries[agent_id] = _Entry(value, size, close)
+            self._expire(evicted)
+            # Never evict the entry just added
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries or self._bytes() > self.max_bytes):
+                reason = "lru" if len(self._entries) > self.max_entries else "memory"
+                oldest_id, oldest = self._entries.popitem(last=False)
+                evicted.append((oldest_id, oldest, reason))
+        self._close(evicted)
+
+    def pop(self, agent_id, default=None):
+        with self._lock:
+            entry = self._entries.pop(agent_id, None)
+        if entry is None:
+            return default
+        self._close([(agent_id, entry, "invalidated")])
+        return entry.value
+
+    def clear(self):
+        with self._lock:
+            evicted = [(agent_id, entry, "invalidated") for agent_id, entry in self._entries.items()]
+            self._entries.clear()
+        self._close(evicted)
+
+    def items(self):
+        with self._lock:
+            return [(agent_id, entry.value) for agent_id, entry in self._entries.items()]
+
+    def evict_expired(self):
+        evicted = []
+        with self._lock:
+            self._expire(evicted)
+        self._close(evicted)
+        return len(evicted)
+
+    def _bytes(self):
+        return sum(entry.size for entry in self._entries.values())
+
+    def _expire(self, evicted):
+        if not self.ttl:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for agent_id in [a for a, e in self._entries.items() if e.last_used < cutoff]:
+            evicted.append((agent_id, self._entries.pop(agent_id), "ttl"))
+
+    def _close(self, evicted):
+        for agent_id, entry, reason in evicted:
+            with self._lock:
+                self._stats["evictions"][reason] += 1
+            metrics.CHAIN_EVICTIONS.labels(metrics.agent_label(agent_id), reason).inc()
+            if reason != "invalidated":
+                print(f"[{agent_id}] Chain evicted ({reason})")
+            if entry.close is None:
+                continue
+            try:
+                entry.close()
+            except Exception as e:
+                print(f"[{agent_id}] Closing evicted chain failed: {e}")
+        metrics.CHAINS_RESIDENT.set(len(self._entries))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            agents = [{
+                "agent_id": agent_id,
+                "mb": round(entry.size / (1024 * 1024), 1),
+                "idle_s": round(now - entry.last_used, 1),
+                "age_s": round(now - entry.created, 1)
+            } for agent_id, entry in reversed(self._entries.items())]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "mb": round(self._bytes() / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "ttl_seconds": self.ttl,
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "evictions": dict(self._stats["evictions"]),
+                "agents": agents
+            }
+
+
+def release_later(vectorstore, keyword_index=None, delay=CLOSE_GRACE_SECONDS):
+    """
+    Release an evicted chain's stores: detach its Chroma system now, then
+    stop it and close the keyword index after `delay` seconds.
+    """
+    system = detach_chroma(vectorstore)
+
+    def run():
+        try:
+            if system is not None:
+                system.stop()
+            if keyword_index is not None:
+                keyword_index.close()
+        except Exception as e:
+            print(f"Closing evicted vector store failed: {e}")
+
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.start()
+    return timer
@@ -0,0 +1,91 @@
+import os
+import sys
+from langchain_chroma import Chroma
+from config import PERSIST_DIRECTORY
+from pipeline import content_hash
+import bm25_index
+
+# One-shot cleanup for stores built before chunk IDs were deterministic:
+# every re-ingest appended the whole corpus again under random IDs.
+# Chunks with the same file and identical text are collapsed to one copy.
+#
+# Usage: python compact_index.py [--dry-run] [agent_id ...]
+
+PAGE_SIZE = 5000
+
+
+def is_deterministic_id(chunk_id):
+    return chunk_id.count(":") >= 2
+
+
+def compact_agent(agent_id, dry_run=False):
+    path = os.path.join(PERSIST_DIRECTORY, agent_id)
+    if not os.path.isdir(path) or not os.listdir(path):
+        print(f"[{agent_id}] No index found, skipping.")
+        return 0
+
+    collection = Chroma(persist_directory=path)._collection
+
+    # Read everything first; deleting while paging would shift offsets
+    keep = {}
+    duplicates = []
+    total = 0
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            break
+        for cid, text, meta in zip(ids, page["documents"], page["metadatas"]):
+            meta = meta or {}
+            key = (meta.get("item_id") or meta.get("source"), content_hash(text or ""))
+            kept = keep.get(key)
+            if kept is None:
+                keep[key] = cid
+            elif is_deterministic_id(cid) and not is_deterministic_id(kept):
+                # Prefer the copy a future upsert will overwrite
+                duplicates.append(kept)
+                keep[key] = cid
+            else:
+                duplicates.append(cid)
+        total += len(ids)
+        offset += len(ids)
+
+    print(f"[{agent_id}] {total} chunks, {len(keep)} unique, {len(duplicates)} duplicates.")
+    if dry_run or not duplicates:
+        return len(duplicates)
+
+    # The keyword index holds the same chunk IDs; hybrid search would still return them
+    keyword_index = bm25_index.KeywordIndex.for_agent(agent_id) if bm25_index.KeywordIndex.exists(agent_id) else None
+    try:
+        for start in range(0, len(duplicates), PAGE_SIZE):
+            batch = duplicates[start:start + PAGE_SIZE]
+            collection.delete(ids=batch)
+            if keyword_index is not None:
+                keyword_index.delete(batch)
+    finally:
+        if keyword_index is not None:
+            keyword_index.close()
+    print(f"[{agent_id}] Removed {len(duplicates)} duplicate chunks.")
+    return len(duplicates)
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    agent_ids = [a for a in args if not a.startswith("--")]
+
+    if not os.path.exists(PERSIST_DIRECTORY):
+        print(f"Persist directory {PERSIST_DIRECTORY} not found.")
+        return
+
+    if not agent_ids:
+        agent_ids = sorted(d for d in os.listdir(PERSIST_DIRECTORY)
+                           if os.path.isdir(os.path.join(PERSIST_DIRECTORY, d)))
+
+    removed = sum(compact_agent(agent_id, dry_run) for agent_id in agent_ids)
+    print(f"{'Would remove' if dry_run else 'Removed'} {removed} duplicate chunks in total.")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,50 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini") # "gemini" or "ollama"
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 
+# Serving Concurrency
+CHAT_EXECUTOR_WORKERS = int(os.getenv("CHAT_EXECUTOR_WORKERS", "8"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+# /api/chat/batch: questions in flight per batch (each also holds a provider slot above while it runs)
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+CHAT_BATCH_GROUP_SIZE = int(os.getenv("CHAT_BATCH_GROUP_SIZE", "32")) # Queries embedded and searched together
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "5000"))
+
+# Chat Caching
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+
+# Retrieval
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "3"))
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20")) # Per retriever, before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Reranking (defaults; each agent can override them via "rerank_config" in agents.json)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "250"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_WORKERS = int(os.getenv("RERANK_WORKERS", "2"))
+
+# Context packing: retrieved chunks are deduplicated, merged and trimmed into a token budget per LLM provider
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+GEMINI_CONTEXT_TOKENS = int(os.getenv("GEMINI_CONTEXT_TOKENS", "3000"))
+OLLAMA_CONTEXT_TOKENS = int(os.getenv("OLLAMA_CONTEXT_TOKENS", "1500")) # CPU prompt processing is the slow part
+CONTEXT_DEDUPE_SIMILARITY = float(os.getenv("CONTEXT_DEDUPE_SIMILARITY", "0.85"))
+CONTEXT_TABLE_MAX_ROWS = int(os.getenv("CONTEXT_TABLE_MAX_ROWS", "10")) # Longer tables keep only rows matching the question
+
+# Per-agent QA chain cache (each resident chain holds its Chroma HNSW index in memory)
+CHAIN_CACHE_MAX_ENTRIES = int(os.getenv("CHAIN_CACHE_MAX_ENTRIES", "8"))
+CHAIN_CACHE_MAX_MB = int(os.getenv("CHAIN_CACHE_MAX_MB", "1024"))
+CHAIN_CACHE_TTL = int(os.getenv("CHAIN_CACHE_TTL", "1800")) # Seconds idle before a chain is evicted
+
 # Persistence Configuration
 DATA_DIR = os.getenv("DATA_DIR")
 BASE_DIR = os.path.dirname(__file__)
@@ -27,7 +71,61 @@ if DATA_DIR:
     PERSIST_DIRECTORY = os.path.join(DATA_DIR, "chroma_db")
     AGENTS_FILE = os.path.join(DATA_DIR, "agents.json")
     SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
+    EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "embedding_cache.sqlite")
+    INGEST_JOBS_PATH = os.path.join(DATA_DIR, "ingest_jobs.sqlite")
 else:
     PERSIST_DIRECTORY = os.path.join(BASE_DIR, "chroma_db")
     AGENTS_FILE = os.path.join(BASE_DIR, "agents.json")
     SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
+    EMBEDDING_CACHE_PATH = os.path.join(BASE_DIR, "embedding_cache.sqlite")
+    INGEST_JOBS_PATH = os.path.join(BASE_DIR, "ingest_jobs.sqlite")
+
+# How often each API worker checks agents.json/settings.json for changes made by other workers
+CONFIG_CHECK_SECONDS = float(os.getenv("CONFIG_CHECK_SECONDS", "1.0"))
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+
+# Ingestion Tuning
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25")) # Larger PDFs are parsed in parallel page ranges
+XLSX_ROWS_PER_DOCUMENT = int(os.getenv("XLSX_ROWS_PER_DOCUMENT", "50")) # Each block repeats the header row
+
+# Downloaded files (content-addressed blob store, see blob_store.py)
+BLOB_GC_AFTER_INGEST = os.getenv("BLOB_GC_AFTER_INGEST", "true").lower() == "true"
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600")) # Files younger than this are never collected
+FILES_CACHE_MAX_AGE = int(os.getenv("FILES_CACHE_MAX_AGE", "300")) # Browser cache lifetime of /files responses
+
+# Folder crawl (full listings and the fallback when the delta feed is unavailable)
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8")) # Folder pages fetched concurrently
+CRAWL_PAGE_SIZE = int(os.getenv("CRAWL_PAGE_SIZE", "999")) # $top per children request
+# Folders and files never indexed, as name or path globs (each agent can override them via "exclude" in agents.json)
+CRAWL_EXCLUDE = [p.strip() for p in os.getenv("CRAWL_EXCLUDE", "node_modules,bin,obj,.git,~$*").split(",") if p.strip()]
+
+# Folder picker (/api/browse) cache
+FOLDER_CACHE_TTL = int(os.getenv("FOLDER_CACHE_TTL", "300")) # Seconds before a listing is revalidated by eTag
+FOLDER_CACHE_MAX_AGE = int(os.getenv("FOLDER_CACHE_MAX_AGE", "3600")) # Seconds before a listing is always fetched again
+FOLDER_CACHE_MAX_ENTRIES = int(os.getenv("FOLDER_CACHE_MAX_ENTRIES", "2000"))
+FOLDER_PREFETCH_LIMIT = int(os.getenv("FOLDER_PREFETCH_LIMIT", "20")) # Sub-folders listed ahead per expanded folder
+
+# File types to index (each agent can override them via "extensions" in agents.json)
+INGEST_EXTENSIONS = [e.strip().lower() for e in os.getenv("INGEST_EXTENSIONS", ".docx,.pdf,.pptx,.xlsx").split(",") if e.strip()]
+
+# Ingestion Jobs (run in a separate worker process)
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "1"))
+INGEST_CPU_THREADS = int(os.getenv("INGEST_CPU_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+INGEST_NICE = int(os.getenv("INGEST_NICE", "10"))
+INGEST_HEARTBEAT_SECONDS = int(os.getenv("INGEST_HEARTBEAT_SECONDS", "5"))
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "60"))
+
+# Metrics
+# Shared directory for Prometheus multiprocess mode, so /metrics includes the
+# ingestion worker's samples (empty it before starting the server)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
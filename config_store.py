@@ -0,0 +1,183 @@
+import os
+import copy
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from config import AGENTS_FILE, SETTINGS_FILE, CONFIG_CHECK_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialised within the process
+    fcntl = None
+
+# agents.json and settings.json, shared by every API worker process.
+#
+# Each process keeps the parsed file in memory and revalidates it at most
+# every CONFIG_CHECK_SECONDS with a stat() of the file (inode, mtime, size),
+# so requests do not re-read JSON. Writes take an exclusive lock on
+# <file>.lock, write a temporary file and rename it over the original, and
+# bump the version counter stored in the lock file. Listeners registered
+# with subscribe() are called with the old and new contents whenever a
+# process sees a change, whether it made the change or another worker did.
+
+
+class JsonFileStore:
+    def __init__(self, path, default=None, check_interval=CONFIG_CHECK_SECONDS):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.check_interval = check_interval
+        self._default = default or (lambda: None)
+        self._data = None
+        self._stat = None
+        self._loaded = False
+        self._version = 0
+        self._checked = 0.0
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Call listener(old, new) whenever the contents change."""
+        self._listeners.append(listener)
+
+    @property
+    def version(self):
+        """Number of writes made through any JsonFileStore on this file."""
+        self.refresh()
+        return self._version
+
+    def _read(self):
+        """(contents, stat signature) of the file as one consistent snapshot."""
+        try:
+            with open(self.path, "r") as f:
+                st = os.fstat(f.fileno())
+                return json.load(f), (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return self._default(), None
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_version(self):
+        try:
+            with open(self.lock_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _notify(self, old, new):
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                print(f"Config listener for {os.path.basename(self.path)} failed: {e}")
+
+    def refresh(self, force=False):
+        """Reload the file if it changed on disk. Returns True when it did."""
+        with self._lock:
+            now = time.monotonic()
+            loaded = self._loaded
+            if loaded and not force and now - self._checked < self.check_interval:
+                return False
+            self._checked = now
+            if loaded and self._stat_signature() == self._stat:
+                return False
+            old = self._data
+            self._data, self._stat = self._read()
+            self._version = self._read_version()
+            self._loaded = True
+            new = self._data
+        if loaded and old != new:
+            self._notify(old, new)
+            return True
+        return False
+
+    def get(self):
+        """A copy of the current contents (callers may modify it freely)."""
+        self.refresh()
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def read(self, fn):
+        """fn(current contents) without copying them; fn must not modify them."""
+        self.refresh()
+        with self._lock:
+            return fn(self._data)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield None
+                return
+            with open(self.lock_path, "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield lock_file
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_atomic(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.path)}.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def update(self, fn):
+        """
+        Read-modify-write under the file lock: fn gets a copy of the current
+        contents (read fresh from disk) and returns the new contents. Nothing
+        is written when they are unchanged. Returns a copy of the new contents.
+        """
+        with self._file_lock() as lock_file:
+            current, _ = self._read()
+            new = fn(copy.deepcopy(current))
+            if new != current or not os.path.exists(self.path):
+                self._write_atomic(new)
+                if lock_file is not None:
+                    version = self._read_version() + 1
+                    lock_file.seek(0)
+                    lock_file.truncate()
+                    lock_file.write(str(version))
+                    lock_file.flush()
+            loaded, previous = self._loaded, self._data
+            self._data, self._stat = self._read()
+            self._version = self._read_version()
+            self._loaded = True
+            self._checked = time.monotonic()
+            new = self._data
+        if loaded and previous != new:
+            self._notify(previous, new)
+        return copy.deepcopy(new)
+
+    def write(self, data):
+        return self.update(lambda _: data)
+
+    def initialize(self, data):
+        """Write `data` unless the file already exists (checked under the lock)."""
+        return self.update(lambda current: current if os.path.exists(self.path) else data)
+
+
+def default_settings():
+    return {
+        "llm_provider": os.getenv("LLM_PROVIDER", "gemini"),
+        "ollama_base_url": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+        "ollama_model": os.getenv("OLLAMA_MODEL", "llama3")
+    }
+
+
+agents_store = JsonFileStore(AGENTS_FILE, default=list)
+settings_store = JsonFileStore(SETTINGS_FILE, default=default_settings)
@@ -0,0 +1,246 @@
+import re
+import math
+import time
+import threading
+from typing import Any, List
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from config import CONTEXT_DEDUPE_SIMILARITY, CONTEXT_TABLE_MAX_ROWS
+import metrics
+
+# Context assembly between retrieval and the LLM. The retrieved chunks, in
+# relevance order, are packed into a token budget per LLM provider:
+#
+#   1. exact and near-duplicate chunks are dropped (word 3-gram Jaccard
+#      similarity of at least CONTEXT_DEDUPE_SIMILARITY);
+#   2. chunks that are neighbours in the same file are merged into one
+#      passage, without the text the splitter repeats as overlap;
+#   3. Markdown tables longer than CONTEXT_TABLE_MAX_ROWS keep their header
+#      and only the rows that mention terms from the question;
+#   4. passages are added best first until the budget is spent; the last
+#      one is cut at a line boundary when only part of it fits.
+#
+# Token counts are estimates (about 4 characters per token), which is close
+# enough for both Gemini and Llama tokenizers to keep prompts bounded.
+
+CHARS_PER_TOKEN = 4
+# Shortest remainder worth filling with a truncated passage
+MIN_PASSAGE_TOKENS = 64
+# Longest text the splitter repeats between neighbouring chunks (chunk_overlap plus slack)
+MAX_OVERLAP_CHARS = 400
+# Rows kept from a table in which no row matches the question
+UNMATCHED_TABLE_ROWS = 3
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or "
+    "that the their there these this to was what when where which who why will with you your".split())
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def query_terms(query):
+    return {w for w in _WORD.findall(query.lower()) if w not in STOPWORDS and (len(w) > 2 or w.isdigit())}
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def drop_duplicates(docs, threshold=CONTEXT_DEDUPE_SIMILARITY):
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / (len(shingles | other) or 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _join_overlapping(first, second):
+    """Concatenate two neighbouring chunks, dropping the overlap the splitter repeated."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), 19, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def merge_adjacent(docs):
+    """
+    Merge chunks with consecutive chunk_index from the same file. Each merged
+    passage takes the rank of its best chunk.
+    """
+    groups = {}
+    order = []
+    for rank, doc in enumerate(docs):
+        key = doc.metadata.get("item_id") or doc.metadata.get("source")
+        if key is None or doc.metadata.get("chunk_index") is None:
+            key = ("unmergeable", rank)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append((rank, doc))
+
+    passages = []
+    for key in order:
+        members = sorted(groups[key], key=lambda rd: rd[1].metadata.get("chunk_index", 0))
+        run = [members[0]]
+        for rank, doc in members[1:]:
+            if doc.metadata.get("chunk_index") == run[-1][1].metadata.get("chunk_index") + 1:
+                run.append((rank, doc))
+            else:
+                passages.append(_merge_run(run))
+                run = [(rank, doc)]
+        passages.append(_merge_run(run))
+    passages.sort(key=lambda rp: rp[0])
+    return [doc for _, doc in passages]
+
+
+def _merge_run(run):
+    rank = min(r for r, _ in run)
+    if len(run) == 1:
+        return rank, run[0][1]
+    text = run[0][1].page_content
+    for _, doc in run[1:]:
+        text = _join_overlapping(text, doc.page_content)
+    metadata = dict(run[0][1].metadata)
+    metadata["merged_chunks"] = len(run)
+    return rank, Document(page_content=text, metadata=metadata)
+
+
+def _is_separator(line):
+    cells = [c.strip() for c in line.strip().strip("|").split("|")]
+    return bool(cells) and all(c and set(c) <= set("-: ") for c in cells)
+
+
+def trim_tables(text, terms, max_rows=CONTEXT_TABLE_MAX_ROWS):
+    """Shorten Markdown tables to their header and the rows mentioning `terms`."""
+    lines = text.split("\n")
+    out = []
+    i = 0
+    while i < len(lines):
+        if not lines[i].lstrip().startswith("|"):
+            out.append(lines[i])
+            i += 1
+            continue
+        start = i
+        while i < len(lines) and lines[i].lstrip().startswith("|"):
+            i += 1
+        out.extend(_trim_table(lines[start:i], terms, max_rows))
+    return "\n".join(out)
+
+
+def _trim_table(table, terms, max_rows):
+    # A chunk may start in the middle of a table, without its header
+    header = table[:2] if len(table) > 1 and _is_separator(table[1]) else []
+    rows = table[len(header):]
+    if len(rows) <= max_rows:
+        return table
+
+    scores = [len(terms & set(_WORD.findall(row.lower()))) for row in rows]
+    matching = sorted((i for i, s in enumerate(scores) if s), key=lambda i: scores[i], reverse=True)[:max_rows]
+    keep = sorted(matching) if matching else list(range(UNMATCHED_TABLE_ROWS))
+    omitted = len(rows) - len(keep)
+    return header + [rows[i] for i in keep] + [f"({omitted} of {len(rows)} table rows omitted)"]
+
+
+def truncate_to_tokens(text, tokens):
+    """Cut `text` to about `tokens`, at the last line (or sentence) break that fits."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(". ", 0, limit) + 1
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip()
+
+
+def pack(docs, query, budget_tokens, separator_tokens=1):
+    """
+    Fit retrieved chunks (best first) into `budget_tokens`.
+    Returns (packed documents, stats of this call).
+    """
+    stats = {"chunks_in": len(docs), "tokens_in": sum(estimate_tokens(d.page_content) for d in docs)}
+    unique = drop_duplicates(docs)
+    stats["duplicates"] = len(docs) - len(unique)
+    passages = merge_adjacent(unique)
+    stats["merged"] = len(unique) - len(passages)
+
+    terms = query_terms(query)
+    packed = []
+    used = 0
+    for doc in passages:
+        text = trim_tables(doc.page_content, terms)
+        tokens = estimate_tokens(text)
+        remaining = budget_tokens - used - (separator_tokens if packed else 0)
+        if tokens > remaining:
+            # Always answer from something, even if the best passage alone is too long
+            if remaining < MIN_PASSAGE_TOKENS and packed:
+                break
+            text = truncate_to_tokens(text, max(remaining, MIN_PASSAGE_TOKENS))
+            tokens = estimate_tokens(text)
+        used += tokens + (separator_tokens if packed else 0)
+        packed.append(Document(page_content=text, metadata=doc.metadata))
+        if used >= budget_tokens:
+            break
+    stats["chunks_out"] = len(packed)
+    stats["tokens_out"] = used
+    return packed, stats
+
+
+class PackingRetriever(BaseRetriever):
+    """
+    Wraps the chain's retriever so the "stuff" chain only ever sees the
+    packed context. `prompt_tokens` is the template's own size, so the
+    prompt token count recorded per query covers the whole prompt.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: Any
+    budget_tokens: int = 3000
+    prompt_tokens: int = 0
+    agent_id: str = "default"
+    provider: str = "gemini"
+
+    _stats: dict = PrivateAttr(default_factory=lambda: {"queries": 0, "chunks_in": 0, "chunks_out": 0,
+                                                          "tokens_in": 0, "tokens_out": 0, "duplicates": 0,
+                                                          "merged": 0, "prompt_tokens": 0})
+    _stats_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _pack(self, docs, query):
+        t0 = time.perf_counter()
+        packed, stats = pack(docs, query, self.budget_tokens)
+        metrics.record_stage("pack", time.perf_counter() - t0)
+        prompt_tokens = self.prompt_tokens + estimate_tokens(query) + stats["tokens_out"]
+        metrics.PROMPT_TOKENS.labels(self.agent_id, self.provider).observe(prompt_tokens)
+        with self._stats_lock:
+            self._stats["queries"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            for key, value in stats.items():
+                self._stats[key] += value
+        return packed
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self._pack(self.base_retriever.invoke(query), query)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self._pack(await self.base_retriever.ainvoke(query), query)
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        queries = s["queries"] or 1
+        s["budget_tokens"] = self.budget_tokens
+        s["avg_prompt_tokens"] = s["prompt_tokens"] / queries
+        s["avg_context_tokens_in"] = s["tokens_in"] / queries
+        s["avg_context_tokens_out"] = s["tokens_out"] / queries
+        return s
@@ -0,0 +1,147 @@
+import os
+import posixpath
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+import graph_client
+from config import CRAWL_WORKERS, CRAWL_PAGE_SIZE, CRAWL_EXCLUDE, INGEST_EXTENSIONS
+
+# Breadth-first folder crawler. Every page of every folder listing is a
+# separate task on a thread pool of CRAWL_WORKERS, so sibling folders are
+# listed in parallel and a large folder's @odata.nextLink pages are fetched
+# while other folders are being listed too. Files are yielded as soon as
+# their page arrives, so the download stage starts before the crawl ends.
+# Children are requested with $select, so Graph only returns the fields
+# ingestion uses instead of the full driveItem (thumbnails, sharing,
+# createdBy, ...).
+
+CHILDREN_SELECT = ",".join([
+    "id", "name", "eTag", "cTag", "size", "lastModifiedDateTime",
+    "parentReference", "file", "folder", "@microsoft.graph.downloadUrl"
+])
+
+
+def normalize_extensions(extensions):
+    """Lower-case, dot-prefixed, de-duplicated and sorted, e.g. ["PDF", ".docx"] -> [".docx", ".pdf"]."""
+    return sorted({e if e.startswith(".") else f".{e}" for e in (x.strip().lower() for x in extensions) if e})
+
+
+def normalize_patterns(patterns):
+    return sorted({p.strip().strip("/").lower() for p in patterns or [] if p.strip().strip("/")})
+
+
+class PathFilter:
+    """
+    Which folders are crawled and which files are indexed, decided on the
+    path relative to the crawl root. Patterns are case-insensitive globs:
+    one without "/" matches a single file or folder name anywhere in the
+    tree (like .gitignore), one with "/" matches the whole relative path,
+    with "*" also matching across folders.
+
+    Folders matching `exclude` are not descended into. Files are indexed
+    when their extension is in `extensions`, they match one of `include`
+    (if any is given) and none of `exclude`.
+    """
+
+    def __init__(self, extensions=None, include=None, exclude=None):
+        self.extensions = normalize_extensions(extensions or INGEST_EXTENSIONS)
+        self.include = normalize_patterns(include)
+        self.exclude = normalize_patterns(CRAWL_EXCLUDE if exclude is None else exclude)
+
+    @staticmethod
+    def _matches(patterns, path):
+        path = path.replace(os.sep, "/").lower()
+        name = posixpath.basename(path)
+        return any(fnmatchcase(path if "/" in p else name, p) for p in patterns)
+
+    def skip_folder(self, path):
+        return self._matches(self.exclude, path)
+
+    def accepts_file(self, path):
+        if os.path.splitext(path)[1].lower() not in self.extensions:
+            return False
+        if self.include and not self._matches(self.include, path):
+            return False
+        return not self._matches(self.exclude, path)
+
+    def signature(self):
+        """What the filter selects, for detecting changes between syncs."""
+        return {"extensions": self.extensions, "include": self.include, "exclude": self.exclude}
+
+
+class FolderCrawler:
+    """
+    Lists the relevant files below a folder with up to `workers` Graph
+    requests in flight. `errors` counts folder pages that could not be
+    fetched, so callers know the listing is incomplete.
+    """
+
+    def __init__(self, client=None, path_filter=None, workers=CRAWL_WORKERS, page_size=CRAWL_PAGE_SIZE):
+        self.client = client or graph_client.get_client()
+        self.path_filter = path_filter or PathFilter()
+        self.workers = max(1, workers)
+        self.page_size = page_size
+        self.stats = {"folders": 0, "pages": 0, "files": 0, "errors": 0}
+
+    def children_url(self, drive_id, folder_id):
+        return f"drives/{drive_id}/items/{folder_id}/children?$select={CHILDREN_SELECT}&$top={self.page_size}"
+
+    def crawl(self, drive_id, root_id, path_prefix=""):
+        """
+        Yield the relevant file items below `root_id`, each with
+        "local_path_rel" set, in the order their folder pages arrive.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as pool:
+            pending = {}
+
+            def submit(url, prefix):
+                pending[pool.submit(self.client.get_json, url)] = prefix
+
+            print(f"Scanning folder: {path_prefix}...")
+            self.stats["folders"] += 1
+            submit(self.children_url(drive_id, root_id), path_prefix)
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        prefix = pending.pop(future)
+                        try:
+                            page = future.result()
+                        except requests.exceptions.RequestException as e:
+                            print(f"Error scanning {prefix}: {e}")
+                            self.stats["errors"] += 1
+                            continue
+                        self.stats["pages"] += 1
+
+                        next_link = page.get("@odata.nextLink")
+                        if next_link:
+                            submit(next_link, prefix)
+                        yield from self._process_page(drive_id, page.get("value", []), prefix, submit)
+            finally:
+                # The consumer stopped early (or failed): drop the queued listings
+                for future in pending:
+                    future.cancel()
+
+    def _process_page(self, drive_id, items, prefix, submit):
+        # Queue sub-folders before handing out files, so listing continues
+        # while the consumer works on them
+        for item in items:
+            if "folder" not in item:
+                continue
+            path = os.path.join(prefix, item.get("name", ""))
+            if self.path_filter.skip_folder(path):
+                print(f"Skipping excluded folder: {path}")
+                continue
+            print(f"Scanning folder: {path}...")
+            self.stats["folders"] += 1
+            submit(self.children_url(drive_id, item.get("id")), path)
+
+        for item in items:
+            if "file" not in item:
+                continue
+            path = os.path.join(prefix, item.get("name", ""))
+            if self.path_filter.accepts_file(path):
+                print(f"Found relevant file: {item.get('name', '')}")
+                item["local_path_rel"] = path
+                self.stats["files"] += 1
+                yield item
@@ -2,10 +2,10 @@
 import os
 import sys
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import model_registry
 
 PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "chroma_db")
-EMBEDDINGS = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+EMBEDDINGS = model_registry.get_embeddings()
 
 def text_wrap(text, width=80):
     return "\n".join([text[i:i+width] for i in range(0, len(text), width)])
@@ -0,0 +1,180 @@
+import zipfile
+from lxml import etree
+from langchain_core.documents import Document
+
+# Streaming DOCX extractor. Reads word/document.xml with lxml.iterparse and
+# produces exactly the text load_docx_with_tables builds through python-docx
+# (paragraph text, tables as Markdown, merged cells repeated), but resolves
+# vertically merged cells from the previous row instead of walking back up the
+# table for every cell, and frees each body element once it is emitted.
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY = _w("body")
+W_P = _w("p")
+W_TBL = _w("tbl")
+W_TR = _w("tr")
+W_TC = _w("tc")
+W_R = _w("r")
+W_T = _w("t")
+W_TAB = _w("tab")
+W_PTAB = _w("ptab")
+W_BR = _w("br")
+W_CR = _w("cr")
+W_NO_BREAK_HYPHEN = _w("noBreakHyphen")
+W_HYPERLINK = _w("hyperlink")
+W_TC_PR = _w("tcPr")
+W_TR_PR = _w("trPr")
+W_GRID_SPAN = _w("gridSpan")
+W_GRID_BEFORE = _w("gridBefore")
+W_V_MERGE = _w("vMerge")
+W_VAL = _w("val")
+W_TYPE = _w("type")
+
+
+def _run_text(r):
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_TAB or tag == W_PTAB:
+            parts.append("\t")
+        elif tag == W_BR:
+            # Page and column breaks carry no text
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == W_CR:
+            parts.append("\n")
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def paragraph_text(p):
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+
+def _cell_text(tc):
+    return "\n".join(paragraph_text(p) for p in tc if p.tag == W_P)
+
+
+def _int_val(parent, tag, default):
+    if parent is None:
+        return default
+    el = parent.find(tag)
+    if el is None:
+        return default
+    try:
+        return int(el.get(W_VAL))
+    except (TypeError, ValueError):
+        return default
+
+
+def _clean_text(text):
+    return text.strip().replace('\n', ' ').replace('|', '\\|')
+
+
+def table_rows(tbl):
+    """
+    Rows of cell texts, one entry per grid column a cell spans. A cell that
+    continues a vertical merge repeats the text of the cell that started it.
+    """
+    rows = []
+    above = {}  # grid offset -> (text, span) of the merge-root cell in the previous row
+    for tr in tbl:
+        if tr.tag != W_TR:
+            continue
+        offset = _int_val(tr.find(W_TR_PR), W_GRID_BEFORE, 0)
+        current = {}
+        cells = []
+        for tc in tr:
+            if tc.tag != W_TC:
+                continue
+            tc_pr = tc.find(W_TC_PR)
+            span = _int_val(tc_pr, W_GRID_SPAN, 1)
+            v_merge = tc_pr.find(W_V_MERGE) if tc_pr is not None else None
+
+            if v_merge is not None and v_merge.get(W_VAL, "continue") == "continue":
+                text, root_span = above.get(offset, ("", span))
+            else:
+                text, root_span = _clean_text(_cell_text(tc)), span
+
+            current[offset] = (text, root_span)
+            cells.extend([text] * root_span)
+            offset += span
+        above = current
+        rows.append(cells)
+    return rows
+
+
+def table_markdown(rows):
+    md_table = []
+    headers = rows[0]
+    md_table.append("| " + " | ".join(headers) + " |")
+    # Separator row (required for valid MD table)
+    md_table.append("| " + " | ".join(["---"] * len(headers)) + " |")
+    for row in rows[1:]:
+        md_table.append("| " + " | ".join(row) + " |")
+    return "\n".join(md_table)
+
+
+def iter_blocks(source):
+    """
+    Stream the body of a document.xml file object, yielding ("p", text) and
+    ("tbl", rows) in document order.
+    """
+    for _, elem in etree.iterparse(source, events=("end",), tag=(W_P, W_TBL), huge_tree=True):
+        parent = elem.getparent()
+        if parent is None or parent.tag != W_BODY:
+            # Paragraphs inside tables are handled with their table
+            continue
+
+        if elem.tag == W_P:
+            yield "p", paragraph_text(elem)
+        else:
+            yield "tbl", table_rows(elem)
+
+        # Release what has been emitted
+        elem.clear()
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def extract_docx_text(file_path):
+    full_text = []
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open("word/document.xml") as source:
+            for kind, value in iter_blocks(source):
+                if kind == "p":
+                    if value.strip():
+                        full_text.append(value)
+                elif value:
+                    full_text.append("")
+                    full_text.append(table_markdown(value))
+                    full_text.append("")
+    return "\n".join(full_text)
+
+
+def load_docx(file_path):
+    """
+    Drop-in replacement for ingest.load_docx_with_tables. Module-level and
+    free of heavy imports so it can run in a spawned process pool.
+    """
+    try:
+        text = extract_docx_text(file_path)
+    except Exception as e:
+        print(f"Error opening DOCX {file_path}: {e}")
+        return []
+    return [Document(page_content=text, metadata={"source": file_path})]
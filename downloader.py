@@ -0,0 +1,143 @@
+import os
+import time
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from config import DOWNLOAD_WORKERS
+import graph_client
+import blob_store
+import metrics
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def build_session(pool_size=DOWNLOAD_WORKERS):
+    """A keep-alive session whose connection pool matches the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class Downloader:
+    """
+    Bounded-concurrency file downloader.
+    Streams bodies into the blob store under `target_dir` through a shared
+    pooled Session, hashing them on the way, and skips items whose eTag and
+    size match the blob recorded for them last time.
+    """
+
+    def __init__(self, target_dir, workers=DOWNLOAD_WORKERS, session=None, graph=None):
+        self.store = blob_store.open_store(target_dir)
+        self.graph = graph
+        self.workers = max(1, workers)
+        self.session = session or build_session(self.workers)
+        self._lock = threading.Lock()
+        self._recorded = {}
+
+    def current_path(self, file_item):
+        """Path of the stored content if it is still the item's current version."""
+        entry = self.store.lookup(file_item.get("id"))
+        if not entry or not file_item.get("eTag"):
+            return None
+        if entry.get("eTag") != file_item.get("eTag") or entry.get("size") != file_item.get("size"):
+            return None
+        path = self.store.blob_path(entry["blob"])
+        try:
+            return path if os.path.getsize(path) == file_item.get("size") else None
+        except OSError:
+            return None
+
+    def _stream_to_store(self, response, file_item):
+        """Returns (blob path, bytes written, whether the content was new to the store)."""
+        digest = hashlib.sha256()
+        tmp_path, f = self.store.open_temp()
+        written = 0
+        try:
+            with f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        written += len(chunk)
+            blob, is_new = self.store.commit(tmp_path, digest.hexdigest(), file_item.get("name"))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if file_item.get("id"):
+            with self._lock:
+                self._recorded[file_item["id"]] = {"blob": blob, "name": file_item.get("name"),
+                                                   "eTag": file_item.get("eTag"), "size": written}
+        return self.store.blob_path(blob), written, is_new
+
+    def _fetch(self, file_item):
+        download_url = file_item.get("@microsoft.graph.downloadUrl")
+        if download_url:
+            # Pre-signed URL, no auth header needed
+            with self.session.get(download_url, stream=True, timeout=60) as response:
+                if response.status_code == 200:
+                    return self._stream_to_store(response, file_item)
+
+        # Fall back to the /content endpoint (also used when no pre-signed URL is present)
+        drive_id = file_item.get("parentReference", {}).get("driveId")
+        item_id = file_item.get("id")
+        graph = self.graph or graph_client.get_client()
+        with graph.get(f"drives/{drive_id}/items/{item_id}/content", stream=True) as response:
+            return self._stream_to_store(response, file_item)
+
+    def download_one(self, file_item):
+        """Returns (local_path or None, bytes_downloaded, skipped)."""
+        name = file_item.get("name")
+        file_path = self.current_path(file_item)
+        if file_path:
+            metrics.DOWNLOAD_FILES.labels(metrics.agent_label(), "unchanged").inc()
+            return file_path, 0, True
+
+        try:
+            file_path, written, is_new = self._fetch(file_item)
+        except Exception as e:
+            print(f"Failed to download {name}: {e}")
+            metrics.DOWNLOAD_FILES.labels(metrics.agent_label(), "failed").inc()
+            return None, 0, False
+
+        # "deduplicated": the same content was already stored for another item
+        metrics.DOWNLOAD_FILES.labels(metrics.agent_label(), "downloaded" if is_new else "deduplicated").inc()
+        metrics.DOWNLOAD_BYTES.labels(metrics.agent_label()).inc(written)
+        return file_path, written, False
+
+    def download(self, files):
+        """
+        Download `files` concurrently. Sets file_item["local_path"] (the blob's
+        path) and file_item["blob"] on success and returns the local paths in
+        input order.
+        """
+        files = list(files)
+        if not files:
+            return []
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(files))) as pool:
+            results = list(pool.map(self.download_one, files))
+        elapsed = max(time.time() - start, 1e-6)
+
+        paths = []
+        total_bytes = 0
+        skipped = 0
+        for file_item, (path, written, was_skipped) in zip(files, results):
+            total_bytes += written
+            skipped += was_skipped
+            if path:
+                file_item["local_path"] = path
+                file_item["blob"] = os.path.basename(path)
+                paths.append(path)
+
+        with self._lock:
+            recorded, self._recorded = self._recorded, {}
+        self.store.record(recorded)
+        rate = total_bytes / elapsed / (1024 * 1024)
+        print(f"Downloaded {len(paths) - skipped}/{len(files)} files "
+              f"({skipped} unchanged, {total_bytes / (1024 * 1024):.1f} MiB in {elapsed:.1f}s, {rate:.2f} MiB/s)")
+        return paths
@@ -0,0 +1,234 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_MB
+import metrics
+
+# Content-addressed embedding cache shared by ingestion and serving.
+# Rows are keyed by (model name, sha256 of the whitespace-normalized text) and
+# store the vector as packed float32. When the table grows past max_bytes the
+# least recently used rows are evicted.
+#
+# The row count and payload size are tracked in memory so that inserts do
+# not scan the table. Replaced rows and other processes' writes make them
+# drift, so they are re-read from the database when they say the budget is
+# exceeded (before anything is evicted) and every RECOUNT_EVERY_ROWS inserts.
+#
+# Lookups don't write either: last_used only needs to be coarse for LRU, so a
+# hit is only recorded when the row's stamp is older than
+# TOUCH_RESOLUTION_SECONDS, and recorded hits are written with the next
+# insert (which precedes any eviction) or once TOUCH_FLUSH_ROWS pile up.
+
+SQLITE_MAX_VARIABLES = 900
+RECOUNT_EVERY_ROWS = 10000
+TOUCH_RESOLUTION_SECONDS = 300
+TOUCH_FLUSH_ROWS = 1000
+# Approximate per-row overhead for key/index
+ROW_OVERHEAD_BYTES = 160
+
+
+def normalize_text(text):
+    return " ".join((text or "").split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (model, key) -> last_used not yet written
+        self._touches = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._recount()
+
+    def get_many(self, model, keys):
+        """Returns {key: vector} for the keys that are cached."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                chunk = unique_keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                    if last_used < now - TOUCH_RESOLUTION_SECONDS:
+                        self._touches[(model, key)] = now
+
+            if len(self._touches) >= TOUCH_FLUSH_ROWS:
+                self._flush_touches()
+                self._conn.commit()
+
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def put_many(self, model, items):
+        """Store [(key, vector)] and evict old rows if the cache is too large."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(model, key, array("f", vector).tobytes(), now) for key, vector in items]
+        with self._lock:
+            # Recent hits must be on disk before eviction picks the oldest rows
+            self._flush_touches()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            # Replaced rows count as new until the next recount
+            self._rows += len(rows)
+            self._payload += sum(len(row[2]) for row in rows)
+            self._unverified += len(rows)
+            self._evict_if_needed()
+
+    def _flush_touches(self):
+        if not self._touches:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+            [(last_used, model, key) for (model, key), last_used in self._touches.items()]
+        )
+        self._touches.clear()
+
+    def _recount(self):
+        self._rows, self._payload = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        self._unverified = 0
+
+    def _size_bytes(self):
+        # Approximate: payload plus a fixed per-row overhead
+        return self._payload + self._rows * ROW_OVERHEAD_BYTES, self._rows
+
+    def _evict_if_needed(self):
+        size, _ = self._size_bytes()
+        if size <= self.max_bytes and self._unverified < RECOUNT_EVERY_ROWS:
+            return
+        self._recount()
+        size, count = self._size_bytes()
+        if size <= self.max_bytes or count == 0:
+            return
+        # Evict down to 90% of the budget so we do not evict on every insert
+        target = int(self.max_bytes * 0.9)
+        per_row = size / count
+        to_remove = max(1, int((size - target) / per_row) + 1)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (to_remove,)
+        )
+        self._conn.commit()
+        self.evictions += to_remove
+        self._recount()
+
+    def stats(self):
+        with self._lock:
+            self._recount()
+            size, count = self._size_bytes()
+            lookups = self.hits + self.misses
+            return {
+                "entries": count,
+                "approx_bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults the cache before running the model.
+    The underlying model is only built (via `factory`) on the first miss, so a
+    run over unchanged text never loads or calls it.
+    """
+
+    def __init__(self, model_name, factory, cache=None):
+        self.model_name = model_name
+        self._factory = factory
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.cache = cache or get_embedding_cache()
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = self._factory()
+            return self._model
+
+    def embed_documents(self, texts):
+        keys = [text_key(t) for t in texts]
+        cached = self.cache.get_many(self.model_name, keys)
+        hit_count = sum(1 for key in keys if key in cached)
+        agent = metrics.agent_label()
+        metrics.CACHE_LOOKUPS.labels(agent, "embedding_store", "hit").inc(hit_count)
+        metrics.CACHE_LOOKUPS.labels(agent, "embedding_store", "miss").inc(len(keys) - hit_count)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.model.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        # Queries go through the same path; HuggingFaceEmbeddings embeds
+        # queries and documents identically.
+        return self.embed_documents([text])[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
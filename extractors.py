@@ -0,0 +1,313 @@
+import posixpath
+import zipfile
+from functools import partial
+from lxml import etree
+from langchain_core.documents import Document
+from docx_fast import table_markdown
+from config import PDF_PAGES_PER_TASK, XLSX_ROWS_PER_DOCUMENT
+
+# Native extractors for PDF, PPTX and XLSX, used instead of the unstructured
+# loader. Each yields one Document per page, slide or block of sheet rows,
+# with the page/slide/sheet in the metadata:
+#
+#   - PDF: the text layer via pypdf (scanned pages without one come out
+#     empty). Large files are split into page ranges that the ingestion
+#     pipeline parses in parallel, see pdf_tasks().
+#   - PPTX: slide XML streamed with lxml in presentation order; tables become
+#     Markdown like in docx_fast, speaker notes are appended to their slide.
+#   - XLSX: worksheets streamed row by row with lxml.iterparse, so memory does
+#     not grow with the sheet; rows become Markdown tables that repeat the
+#     header row in every block.
+#
+# All loaders are module-level functions (or partials of them) so they can
+# run in the pipeline's process pool.
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+S_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+NOTES_REL_TYPE = f"{R_NS}/notesSlide"
+
+A_P = f"{{{A_NS}}}p"
+A_R = f"{{{A_NS}}}r"
+A_FLD = f"{{{A_NS}}}fld"
+A_T = f"{{{A_NS}}}t"
+A_BR = f"{{{A_NS}}}br"
+A_TBL = f"{{{A_NS}}}tbl"
+A_TR = f"{{{A_NS}}}tr"
+A_TC = f"{{{A_NS}}}tc"
+P_SLD_ID = f"{{{P_NS}}}sldId"
+R_ID = f"{{{R_NS}}}id"
+S_SHEET = f"{{{S_NS}}}sheet"
+S_SI = f"{{{S_NS}}}si"
+S_T = f"{{{S_NS}}}t"
+S_ROW = f"{{{S_NS}}}row"
+S_C = f"{{{S_NS}}}c"
+S_V = f"{{{S_NS}}}v"
+S_IS = f"{{{S_NS}}}is"
+S_RPH = f"{{{S_NS}}}rPh"
+PKG_REL = f"{{{PKG_REL_NS}}}Relationship"
+
+
+def _clean_cell(text):
+    return text.strip().replace('\n', ' ').replace('|', '\\|')
+
+
+def _relationships(archive, rels_path):
+    """{rId: (target path inside the package, relationship type)} of one part."""
+    try:
+        root = etree.fromstring(archive.read(rels_path))
+    except KeyError:
+        return {}
+    # Targets are relative to the part's folder (the parent of _rels/)
+    base = posixpath.dirname(posixpath.dirname(rels_path))
+    rels = {}
+    for rel in root.iter(PKG_REL):
+        target = rel.get("Target", "")
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+        rels[rel.get("Id")] = (path, rel.get("Type"))
+    return rels
+
+
+def _rels_path(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, "_rels", f"{name}.rels")
+
+
+# --- PDF ---
+
+def _open_pdf(path):
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        # Many "protected" PDFs only restrict editing and open with an empty password
+        reader.decrypt("")
+    return reader
+
+
+def pdf_page_count(path):
+    return len(_open_pdf(path).pages)
+
+
+def load_pdf_pages(path, start=0, end=None):
+    """Documents for pages [start, end) that have a text layer."""
+    reader = _open_pdf(path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    docs = []
+    for number in range(start, end):
+        text = reader.pages[number].extract_text() or ""
+        if text.strip():
+            docs.append(Document(page_content=text, metadata={"source": path, "page": number + 1}))
+    return docs
+
+
+def load_pdf(path):
+    try:
+        return load_pdf_pages(path)
+    except Exception as e:
+        print(f"Error opening PDF {path}: {e}")
+        return []
+
+
+def pdf_tasks(path, pages_per_task=PDF_PAGES_PER_TASK):
+    """
+    Loaders that together extract the whole PDF: one for small files, one
+    per `pages_per_task` page range for large ones.
+    """
+    count = pdf_page_count(path)
+    if count <= pages_per_task:
+        return [load_pdf]
+    return [partial(load_pdf_pages, start=start, end=start + pages_per_task)
+            for start in range(0, count, pages_per_task)]
+
+
+# --- PPTX ---
+
+def _paragraph_text(p):
+    parts = []
+    for child in p:
+        if child.tag in (A_R, A_FLD):
+            t = child.find(A_T)
+            parts.append(t.text or "" if t is not None else "")
+        elif child.tag == A_BR:
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _slide_table_rows(tbl):
+    rows = []
+    for tr in tbl.iter(A_TR):
+        cells = []
+        for tc in tr.iter(A_TC):
+            # Cells covered by a merge repeat the merged cell's text, as in DOCX tables
+            text = _clean_cell("\n".join(_paragraph_text(p) for p in tc.iter(A_P)))
+            if tc.get("hMerge") == "1" and cells:
+                text = cells[-1]
+            elif tc.get("vMerge") == "1" and rows and len(rows[-1]) > len(cells):
+                text = rows[-1][len(cells)]
+            cells.append(text)
+        rows.append(cells)
+    return rows
+
+
+def _slide_text(xml):
+    """Text of one slide (or notes) part in document order, tables as Markdown."""
+    root = etree.fromstring(xml)
+    blocks = []
+    for el in root.iter(A_P, A_TBL):
+        if el.tag == A_TBL:
+            rows = _slide_table_rows(el)
+            if rows:
+                blocks.append(table_markdown(rows))
+        elif next(el.iterancestors(A_TBL), None) is None:
+            text = _paragraph_text(el)
+            if text.strip():
+                blocks.append(text)
+    return "\n".join(blocks)
+
+
+def iter_slides(path):
+    """Yield (slide number, text, notes) in presentation order."""
+    with zipfile.ZipFile(path) as archive:
+        presentation = etree.fromstring(archive.read("ppt/presentation.xml"))
+        rels = _relationships(archive, "ppt/_rels/presentation.xml.rels")
+        slide_parts = [rels[s.get(R_ID)][0] for s in presentation.iter(P_SLD_ID) if s.get(R_ID) in rels]
+
+        for number, part in enumerate(slide_parts, start=1):
+            text = _slide_text(archive.read(part))
+            notes = ""
+            for target, rel_type in _relationships(archive, _rels_path(part)).values():
+                if rel_type == NOTES_REL_TYPE:
+                    notes = _notes_text(archive.read(target))
+            yield number, text, notes
+
+
+def _notes_text(xml):
+    # Notes pages also carry the slide image and the slide number placeholder;
+    # only the body placeholder holds the speaker's notes
+    root = etree.fromstring(xml)
+    for sp in root.iter(f"{{{P_NS}}}sp"):
+        ph = sp.find(f"{{{P_NS}}}nvSpPr/{{{P_NS}}}nvPr/{{{P_NS}}}ph")
+        if ph is not None and ph.get("type") == "body":
+            return "\n".join(t for t in (_paragraph_text(p) for p in sp.iter(A_P)) if t.strip())
+    return ""
+
+
+def load_pptx(path):
+    docs = []
+    try:
+        for number, text, notes in iter_slides(path):
+            if notes:
+                text = f"{text}\n\nNotes: {notes}" if text else f"Notes: {notes}"
+            if text.strip():
+                docs.append(Document(page_content=text, metadata={"source": path, "slide": number}))
+    except Exception as e:
+        print(f"Error opening PPTX {path}: {e}")
+        return []
+    return docs
+
+
+# --- XLSX ---
+
+def _shared_strings(archive, path):
+    try:
+        source = archive.open(path)
+    except KeyError:
+        return []
+    strings = []
+    with source:
+        for _, si in etree.iterparse(source, events=("end",), tag=S_SI, huge_tree=True):
+            # Phonetic runs (rPh) are reading aids, not cell text
+            strings.append("".join(t.text or "" for t in si.iter(S_T)
+                                   if next(t.iterancestors(S_RPH), None) is None))
+            si.clear()
+    return strings
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference such as "AB12"."""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def _cell_value(c, shared):
+    cell_type = c.get("t")
+    if cell_type == "inlineStr":
+        inline = c.find(S_IS)
+        return "".join(t.text or "" for t in inline.iter(S_T)) if inline is not None else ""
+    v = c.find(S_V)
+    value = v.text if v is not None and v.text is not None else ""
+    if cell_type == "s" and value:
+        try:
+            return shared[int(value)]
+        except (ValueError, IndexError):
+            return ""
+    if cell_type == "b":
+        return "TRUE" if value == "1" else "FALSE"
+    return value
+
+
+def iter_sheet_rows(archive, part, shared):
+    """Yield each non-empty row of a worksheet as a list of cell texts."""
+    with archive.open(part) as source:
+        for _, row in etree.iterparse(source, events=("end",), tag=S_ROW, huge_tree=True):
+            cells = []
+            for position, c in enumerate(row.iter(S_C)):
+                ref = c.get("r")
+                column = _column_index(ref) if ref else position
+                if column >= len(cells):
+                    cells.extend([""] * (column - len(cells) + 1))
+                cells[column] = _clean_cell(_cell_value(c, shared))
+            row.clear()
+            # Drop the already processed siblings too, so memory stays flat
+            while row.getprevious() is not None:
+                del row.getparent()[0]
+            if any(cells):
+                yield cells
+
+
+def iter_sheets(path):
+    """Yield (sheet name, row iterator) for every worksheet in workbook order."""
+    with zipfile.ZipFile(path) as archive:
+        workbook = etree.fromstring(archive.read("xl/workbook.xml"))
+        rels = _relationships(archive, "xl/_rels/workbook.xml.rels")
+        shared = _shared_strings(archive, "xl/sharedStrings.xml")
+        for sheet in workbook.iter(S_SHEET):
+            target = rels.get(sheet.get(R_ID))
+            if target is None or target[0] not in archive.namelist():
+                continue
+            yield sheet.get("name"), iter_sheet_rows(archive, target[0], shared)
+
+
+def load_xlsx(path, rows_per_document=XLSX_ROWS_PER_DOCUMENT):
+    docs = []
+
+    def emit(sheet, header, rows, first_row):
+        width = max(len(r) for r in [header] + rows)
+        table = [r + [""] * (width - len(r)) for r in [header] + rows]
+        docs.append(Document(page_content=f"Sheet: {sheet}\n\n{table_markdown(table)}",
+                             metadata={"source": path, "sheet": sheet, "row": first_row}))
+
+    try:
+        for sheet, rows in iter_sheets(path):
+            header, block, first_row = None, [], 2
+            for number, cells in enumerate(rows, start=1):
+                if header is None:
+                    header = cells
+                    continue
+                block.append(cells)
+                if len(block) >= rows_per_document:
+                    emit(sheet, header, block, first_row)
+                    block, first_row = [], number + 1
+            if block or (header is not None and first_row == 2):
+                emit(sheet, header, block, first_row)
+    except Exception as e:
+        print(f"Error opening XLSX {path}: {e}")
+        return []
+    return docs
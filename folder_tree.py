@@ -0,0 +1,274 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+import graph_client
+import metrics
+from config import FOLDER_CACHE_TTL, FOLDER_CACHE_MAX_AGE, FOLDER_CACHE_MAX_ENTRIES, FOLDER_PREFETCH_LIMIT
+
+# Folder tree behind the folder picker (/api/browse) and folder name lookups.
+#
+# Each folder's list of sub-folders is cached for FOLDER_CACHE_TTL seconds.
+# After that the next request revalidates it with a conditional GET of the
+# folder (If-None-Match with the eTag recorded when it was listed), which is
+# answered with 304 while nothing in it changed, so the listing is kept for
+# another TTL. Listings older than FOLDER_CACHE_MAX_AGE are always fetched
+# again. Whenever a folder is served, the sub-folders of its first
+# FOLDER_PREFETCH_LIMIT children are fetched in the background with one
+# $batch request, so expanding one of them is answered from memory.
+#
+# Concurrent requests for the same folder share one Graph call.
+
+FOLDER_SELECT = "id,name,eTag,cTag,folder,parentReference"
+# $batch accepts at most 20 requests
+PREFETCH_BATCH_SIZE = 20
+
+
+def _summary(item):
+    return {"id": item.get("id"), "name": item.get("name"), "parentReference": item.get("parentReference", {})}
+
+
+class _Listing:
+    __slots__ = ("folders", "etag", "fetched", "validated")
+
+    def __init__(self, folders, etag):
+        self.folders = folders
+        self.etag = etag
+        self.fetched = self.validated = time.monotonic()
+
+
+class FolderTree:
+    def __init__(self, client=None, ttl=FOLDER_CACHE_TTL, max_age=FOLDER_CACHE_MAX_AGE,
+                 max_entries=FOLDER_CACHE_MAX_ENTRIES, prefetch_limit=FOLDER_PREFETCH_LIMIT):
+        self._client = client
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.prefetch_limit = prefetch_limit
+        # (drive_id, folder_id) -> _Listing, least recently used first
+        self._listings = OrderedDict()
+        # (drive_id, folder_id) -> {"name", "eTag", "childCount", "parentReference"} of every folder seen
+        self._folders = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="folder-prefetch")
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "refetched": 0, "prefetched": 0}
+
+    @property
+    def client(self):
+        return self._client or graph_client.get_client()
+
+    def children_url(self, drive_id, folder_id):
+        return f"drives/{drive_id}/items/{folder_id}/children?$select={FOLDER_SELECT}&$top=999"
+
+    def item_url(self, drive_id, folder_id):
+        return f"drives/{drive_id}/items/{folder_id}?$select={FOLDER_SELECT}"
+
+    # --- Lookups ---
+
+    def children(self, drive_id, folder_id="root", refresh=False):
+        """Sub-folders of a folder as [{"id", "name", "parentReference"}]."""
+        key = (drive_id, folder_id)
+        with self._lock:
+            listing = None if refresh else self._listings.get(key)
+            fresh = listing is not None and self._is_fresh(listing)
+            self._stats["hits" if fresh else "misses"] += 1
+            if fresh:
+                self._listings.move_to_end(key)
+        metrics.record_cache("folders", fresh)
+
+        if not fresh:
+            listing = self._load(key, listing)
+        self._schedule_prefetch(drive_id, listing.folders)
+        return [dict(f) for f in listing.folders]
+
+    def folder_info(self, drive_id, folder_id):
+        """{"id", "name"} of a folder, from any listing it appeared in when possible."""
+        if not folder_id or folder_id == "root":
+            return {"id": "root", "name": "root"}
+        with self._lock:
+            known = self._folders.get((drive_id, folder_id))
+        if known is None:
+            item = self.client.get_json(self.item_url(drive_id, folder_id))
+            with self._lock:
+                self._remember(drive_id, [item])
+            known = item
+        return {"id": folder_id, "name": known.get("name")}
+
+    def invalidate(self, drive_id=None, folder_id=None):
+        with self._lock:
+            if folder_id is None:
+                self._listings.clear()
+            else:
+                self._listings.pop((drive_id, folder_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._listings),
+                "max_entries": self.max_entries,
+                "folders_known": len(self._folders),
+                "ttl_seconds": self.ttl,
+                "max_age_seconds": self.max_age,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                **self._stats
+            }
+
+    # --- Loading ---
+
+    def _is_fresh(self, listing):
+        now = time.monotonic()
+        return now - listing.validated < self.ttl and now - listing.fetched < self.max_age
+
+    def _claim(self, key):
+        """(future, owner): the caller loads `key` when owner is True, else waits on the future."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _settle(self, key, future, listing=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(listing)
+
+    def _load(self, key, stale):
+        future, owner = self._claim(key)
+        if not owner:
+            try:
+                return future.result()
+            except Exception:
+                # The shared load failed (e.g. a background prefetch); try once ourselves
+                return self._fetch(key)
+        try:
+            listing = self._revalidate(key, stale) if stale is not None else None
+            if listing is None:
+                listing = self._fetch(key)
+        except Exception as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, listing)
+        return listing
+
+    def _revalidate(self, key, stale):
+        """The stale listing, marked fresh, if the folder's eTag is unchanged; else None."""
+        if not stale.etag or time.monotonic() - stale.fetched >= self.max_age:
+            return None
+        drive_id, folder_id = key
+        try:
+            response = self.client.get(self.item_url(drive_id, folder_id), headers={"If-None-Match": stale.etag})
+            unchanged = response.status_code == 304 or response.json().get("eTag") == stale.etag
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Revalidating folder {folder_id} failed ({e}), listing it again.")
+            return None
+        if not unchanged:
+            return None
+        with self._lock:
+            stale.validated = time.monotonic()
+            self._stats["revalidated"] += 1
+            self._store(key, stale)
+        return stale
+
+    def _fetch(self, key):
+        """List a folder together with its own eTag in one $batch round trip."""
+        drive_id, folder_id = key
+        (item_status, item), (status, body) = self.client.batch(
+            [self.item_url(drive_id, folder_id), self.children_url(drive_id, folder_id)])
+        if status != 200 or body is None:
+            message = (body or {}).get("error", {}).get("message") if isinstance(body, dict) else None
+            raise requests.exceptions.HTTPError(f"Listing folder {folder_id} failed: HTTP {status} {message or ''}".strip())
+        etag = item.get("eTag") if item_status == 200 and item else None
+        listing = self._listing_from_page(drive_id, body, etag)
+        with self._lock:
+            self._stats["refetched"] += 1
+            if item_status == 200 and item:
+                self._remember(drive_id, [item])
+            self._store(key, listing)
+        return listing
+
+    def _listing_from_page(self, drive_id, body, etag):
+        items = list(body.get("value", []))
+        if body.get("@odata.nextLink"):
+            items.extend(self.client.iter_values(body["@odata.nextLink"]))
+        folders = [item for item in items if "folder" in item]
+        with self._lock:
+            self._remember(drive_id, folders)
+        return _Listing([_summary(item) for item in folders], etag)
+
+    def _store(self, key, listing):
+        self._listings[key] = listing
+        self._listings.move_to_end(key)
+        while len(self._listings) > self.max_entries:
+            self._listings.popitem(last=False)
+
+    def _remember(self, drive_id, items):
+        for item in items:
+            if not item.get("id"):
+                continue
+            key = (drive_id, item["id"])
+            self._folders[key] = {"name": item.get("name"), "eTag": item.get("eTag"),
+                                  "childCount": (item.get("folder") or {}).get("childCount"),
+                                  "parentReference": item.get("parentReference", {})}
+            self._folders.move_to_end(key)
+        # Names are small, but keep them bounded too
+        while len(self._folders) > self.max_entries * 20:
+            self._folders.popitem(last=False)
+
+    # --- Prefetch ---
+
+    def _schedule_prefetch(self, drive_id, folders):
+        if not self.prefetch_limit:
+            return
+        claimed = []
+        for folder in folders[:self.prefetch_limit]:
+            key = (drive_id, folder["id"])
+            with self._lock:
+                listing = self._listings.get(key)
+                if listing is not None and self._is_fresh(listing):
+                    continue
+                known = self._folders.get(key, {})
+                if known.get("childCount") == 0 and key not in self._inflight:
+                    # Nothing to list; an empty folder costs no request
+                    self._store(key, _Listing([], known.get("eTag")))
+                    continue
+            future, owner = self._claim(key)
+            if owner:
+                claimed.append((key, future))
+        if claimed:
+            self._prefetcher.submit(self._prefetch, claimed)
+
+    def _prefetch(self, claimed):
+        for start in range(0, len(claimed), PREFETCH_BATCH_SIZE):
+            chunk = claimed[start:start + PREFETCH_BATCH_SIZE]
+            try:
+                responses = self.client.batch([self.children_url(*key) for key, _ in chunk])
+            except Exception as e:
+                for key, future in chunk:
+                    self._settle(key, future, error=e)
+                continue
+            for (key, future), (status, body) in zip(chunk, responses):
+                if status != 200 or body is None:
+                    self._settle(key, future, error=requests.exceptions.HTTPError(f"HTTP {status}"))
+                    continue
+                drive_id, folder_id = key
+                try:
+                    with self._lock:
+                        etag = self._folders.get(key, {}).get("eTag")
+                    listing = self._listing_from_page(drive_id, body, etag)
+                except Exception as e:
+                    self._settle(key, future, error=e)
+                    continue
+                with self._lock:
+                    self._stats["prefetched"] += 1
+                    self._store(key, listing)
+                self._settle(key, future, listing)
+
+
+folder_tree = FolderTree()
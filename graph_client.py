@@ -0,0 +1,220 @@
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import CLIENT_ID, CLIENT_SECRET, TENANT_ID
+import metrics
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+# Refresh the token this many seconds before it actually expires
+TOKEN_REFRESH_MARGIN = 300
+# Graph accepts at most 20 requests per JSON $batch
+MAX_BATCH_SIZE = 20
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenCache:
+    """
+    Caches the app-only Graph token and refreshes it shortly before expiry.
+    One credential object is built per process instead of one per call.
+    """
+
+    def __init__(self, credential=None, scope=GRAPH_SCOPE):
+        self._credential = credential
+        self._scope = scope
+        self._token = None
+        self._lock = threading.Lock()
+
+    def _get_credential(self):
+        if self._credential is None:
+            from azure.identity import ClientSecretCredential
+            self._credential = ClientSecretCredential(
+                tenant_id=TENANT_ID,
+                client_id=CLIENT_ID,
+                client_secret=CLIENT_SECRET
+            )
+        return self._credential
+
+    def get_token(self):
+        with self._lock:
+            if self._token is None or self._token.expires_on - time.time() < TOKEN_REFRESH_MARGIN:
+                self._token = self._get_credential().get_token(self._scope)
+            return self._token.token
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+
+
+def parse_retry_after(value, default):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class GraphClient:
+    """
+    Thin Microsoft Graph client: cached token, pooled keep-alive connections,
+    automatic backoff on throttling (honoring Retry-After) and JSON $batch.
+    """
+
+    def __init__(self, token_cache=None, base_url=GRAPH_BASE_URL, pool_size=16,
+                 max_retries=6, backoff_base=1.0, max_backoff=60.0, timeout=60):
+        self.token_cache = token_cache or TokenCache()
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path_or_url):
+        if path_or_url.startswith("http://") or path_or_url.startswith("https://"):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def auth_headers(self):
+        return {"Authorization": f"Bearer {self.token_cache.get_token()}"}
+
+    def _backoff(self, attempt, retry_after=None):
+        # Graph's Retry-After is how long throttling lasts; retrying earlier
+        # only burns an attempt, so it is honoured as given
+        if retry_after is not None:
+            return retry_after
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay, self.max_backoff) * (0.5 + random.random() / 2)
+
+    def request(self, method, path_or_url, headers=None, **kwargs):
+        """
+        Send a request, retrying throttled (429) and transient 5xx responses.
+        Raises requests.HTTPError once retries are exhausted or on other errors.
+        """
+        url = self.url(path_or_url)
+        kwargs.setdefault("timeout", self.timeout)
+        refreshed = False
+        attempt = 0
+
+        while True:
+            request_headers = self.auth_headers()
+            if headers:
+                request_headers.update(headers)
+
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.GRAPH_REQUEST_SECONDS.labels(metrics.agent_label(), method, "error").observe(
+                    time.perf_counter() - t0)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(f"Graph request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            metrics.GRAPH_REQUEST_SECONDS.labels(metrics.agent_label(), method, str(response.status_code)).observe(
+                time.perf_counter() - t0)
+            if response.status_code == 429:
+                metrics.GRAPH_THROTTLED.labels(metrics.agent_label()).inc()
+
+            if response.status_code == 401 and not refreshed:
+                # Token revoked or clock skew: fetch a fresh one once
+                self.token_cache.invalidate()
+                refreshed = True
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                retry_after = response.headers.get("Retry-After")
+                delay = self._backoff(attempt, parse_retry_after(retry_after, None) if retry_after else None)
+                print(f"Graph returned {response.status_code} for {url}, retrying in {delay:.1f}s")
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def get(self, path_or_url, **kwargs):
+        return self.request("GET", path_or_url, **kwargs)
+
+    def get_json(self, path_or_url, **kwargs):
+        return self.get(path_or_url, **kwargs).json()
+
+    def iter_pages(self, path_or_url, **kwargs):
+        """Yield each page of a collection, following @odata.nextLink."""
+        url = path_or_url
+        while url:
+            data = self.get_json(url, **kwargs)
+            yield data
+            url = data.get("@odata.nextLink")
+
+    def iter_values(self, path_or_url, **kwargs):
+        for page in self.iter_pages(path_or_url, **kwargs):
+            yield from page.get("value", [])
+
+    def batch(self, paths):
+        """
+        Fetch many GET paths (relative to the API root) via JSON $batch.
+        Returns a list of (status, body) tuples in the order of `paths`;
+        a sub-request the $batch response left out gets (None, None).
+        Throttled sub-requests are retried after the largest Retry-After seen.
+        """
+        results = [None] * len(paths)
+        pending = list(range(len(paths)))
+        attempt = 0
+
+        while pending:
+            throttled = []
+            retry_after = 0.0
+            for start in range(0, len(pending), MAX_BATCH_SIZE):
+                chunk = pending[start:start + MAX_BATCH_SIZE]
+                body = {
+                    "requests": [
+                        {"id": str(index), "method": "GET", "url": "/" + paths[index].lstrip("/")}
+                        for index in chunk
+                    ]
+                }
+                data = self.request("POST", "$batch", json=body).json()
+                for sub in data.get("responses", []):
+                    index = int(sub["id"])
+                    status = sub.get("status")
+                    if status == 429:
+                        metrics.GRAPH_THROTTLED.labels(metrics.agent_label()).inc()
+                    if status in RETRY_STATUS_CODES and attempt < self.max_retries:
+                        throttled.append(index)
+                        sub_headers = sub.get("headers") or {}
+                        retry_after = max(retry_after, parse_retry_after(sub_headers.get("Retry-After"), 0.0))
+                    else:
+                        results[index] = (status, sub.get("body"))
+
+            if throttled:
+                delay = self._backoff(attempt, retry_after or None)
+                print(f"{len(throttled)} batched Graph requests throttled, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+            pending = sorted(throttled)
+
+        return [result if result is not None else (None, None) for result in results]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide shared GraphClient."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GraphClient()
+        return _client
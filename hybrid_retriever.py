@@ -0,0 +1,178 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, List
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pipeline import chunk_id, content_hash
+import metrics
+
+# Dense + keyword retrieval fused with reciprocal rank fusion (RRF): every
+# result list contributes 1 / (rrf_k + rank) per document, so a chunk ranked
+# well by either retriever surfaces without calibrating BM25 scores against
+# cosine distances. Without a keyword index the retriever is plain dense
+# search, so every chain goes through the same instrumented path.
+#
+# Batch callers can prefetch() the results of many queries at once: their
+# vector searches go to Chroma as one query, and the chain calls that follow
+# pick the results up instead of searching again. Results are kept per batch
+# and only handed to searches that ran use_prefetched() with the same batch
+# ID, so other requests for the same text always search the current index.
+
+# Keyword searches are short SQLite reads; they run here while the calling
+# thread does the vector search.
+_keyword_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+# Prefetched results not picked up (e.g. the batch client went away) are dropped beyond this
+MAX_PREFETCHED = 1024
+# ... or once they are this old
+PREFETCH_TTL_SECONDS = 120
+
+# Batch whose prefetched results searches in this context (task or thread) take
+_prefetch_batch = ContextVar("prefetch_batch", default=None)
+
+
+def use_prefetched(batch_id):
+    """Let searches in the current context pick up results prefetched for `batch_id`."""
+    _prefetch_batch.set(batch_id)
+
+
+def doc_key(doc):
+    """The chunk ID the pipeline assigned, rebuilt from the chunk's metadata."""
+    meta = doc.metadata or {}
+    if meta.get("item_id") is not None and meta.get("chunk_index") is not None:
+        return chunk_id(meta["item_id"], meta["chunk_index"], doc.page_content)
+    return content_hash(doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists, k, rrf_k=60):
+    """Fuse ranked [(key, Document)] lists into the top-k Documents."""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, (key, doc) in enumerate(results, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any
+    keyword_index: Any = None
+    k: int = 3
+    candidates: int = 20
+    rrf_k: int = 60
+    agent_id: str = ""
+
+    # (batch ID, query) -> (fused results, expires_at) from prefetch(), taken by
+    # the next search for that query within the batch
+    _prefetched: Any = PrivateAttr(default_factory=OrderedDict)
+    _prefetch_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _vector_results(self, docs):
+        return [(doc_key(doc), doc) for doc in docs]
+
+    def _keyword_results(self, query):
+        t0 = time.perf_counter()
+        results = [(doc_id, Document(page_content=content, metadata=metadata))
+                   for doc_id, _, content, metadata in self.keyword_index.search(query, self.candidates)]
+        metrics.KEYWORD_QUERY_SECONDS.labels(metrics.agent_label(self.agent_id)).observe(time.perf_counter() - t0)
+        return results
+
+    def _dense(self, query):
+        t0 = time.perf_counter()
+        k = self.candidates if self.keyword_index is not None else self.k
+        docs = self.vectorstore.similarity_search(query, k=k)
+        metrics.CHROMA_QUERY_SECONDS.labels(metrics.agent_label(self.agent_id)).observe(time.perf_counter() - t0)
+        return docs
+
+    async def _adense(self, query):
+        t0 = time.perf_counter()
+        k = self.candidates if self.keyword_index is not None else self.k
+        docs = await self.vectorstore.asimilarity_search(query, k=k)
+        metrics.CHROMA_QUERY_SECONDS.labels(metrics.agent_label(self.agent_id)).observe(time.perf_counter() - t0)
+        return docs
+
+    def _dense_many(self, vectors):
+        t0 = time.perf_counter()
+        k = self.candidates if self.keyword_index is not None else self.k
+        result = self.vectorstore._collection.query(query_embeddings=vectors, n_results=k,
+                                                    include=["documents", "metadatas"])
+        metrics.CHROMA_QUERY_SECONDS.labels(metrics.agent_label(self.agent_id)).observe(time.perf_counter() - t0)
+        return [[Document(id=cid, page_content=text, metadata=meta or {}) for cid, text, meta in zip(*hits)]
+                for hits in zip(result["ids"], result["documents"], result["metadatas"])]
+
+    def prefetch(self, queries, vectors, batch_id):
+        """
+        Search several queries (with their embeddings) in one vector store
+        call, keyword searches alongside, and keep the results for the
+        retrieval calls of the batch that follow.
+        """
+        if not queries:
+            return
+        keyword_futures = None
+        if self.keyword_index is not None:
+            keyword_futures = [_keyword_executor.submit(self._keyword_results, query) for query in queries]
+        dense = self._dense_many(vectors)
+        expires_at = time.monotonic() + PREFETCH_TTL_SECONDS
+        for i, query in enumerate(queries):
+            if keyword_futures is None:
+                docs = dense[i]
+            else:
+                docs = reciprocal_rank_fusion([self._vector_results(dense[i]), keyword_futures[i].result()],
+                                              self.k, self.rrf_k)
+            with self._prefetch_lock:
+                self._prefetched[(batch_id, query)] = (docs, expires_at)
+                while len(self._prefetched) > MAX_PREFETCHED:
+                    self._prefetched.popitem(last=False)
+
+    def _take_prefetched(self, query):
+        batch_id = _prefetch_batch.get()
+        if batch_id is None:
+            return None
+        with self._prefetch_lock:
+            entry = self._prefetched.pop((batch_id, query), None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def clear_prefetched(self):
+        with self._prefetch_lock:
+            self._prefetched.clear()
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        t0 = time.perf_counter()
+        prefetched = self._take_prefetched(query)
+        if prefetched is not None:
+            docs = prefetched
+        elif self.keyword_index is None:
+            docs = self._dense(query)
+        else:
+            keyword_future = _keyword_executor.submit(self._keyword_results, query)
+            dense = self._vector_results(self._dense(query))
+            docs = reciprocal_rank_fusion([dense, keyword_future.result()], self.k, self.rrf_k)
+        metrics.record_stage("retrieve", time.perf_counter() - t0)
+        return docs
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        t0 = time.perf_counter()
+        prefetched = self._take_prefetched(query)
+        if prefetched is not None:
+            docs = prefetched
+        elif self.keyword_index is None:
+            docs = await self._adense(query)
+        else:
+            loop = asyncio.get_running_loop()
+            dense, keyword = await asyncio.gather(
+                self._adense(query),
+                loop.run_in_executor(_keyword_executor, self._keyword_results, query)
+            )
+            docs = reciprocal_rank_fusion([self._vector_results(dense), keyword], self.k, self.rrf_k)
+        metrics.record_stage("retrieve", time.perf_counter() - t0)
+        return docs
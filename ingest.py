@@ -5,140 +5,257 @@ from config import (
     CLIENT_ID, CLIENT_SECRET, TENANT_ID, 
     SHAREPOINT_SITE_ID, SHAREPOINT_DRIVE_ID, 
     SHAREPOINT_TARGET_FOLDER_ID,
-    GOOGLE_API_KEY, PERSIST_DIRECTORY
+    GOOGLE_API_KEY, PERSIST_DIRECTORY,
+    DOWNLOAD_WORKERS, EMBED_BATCH_SIZE, PIPELINE_QUEUE_SIZE,
+    PARSE_WORKERS, BLOB_GC_AFTER_INGEST
 )
-from azure.identity import ClientSecretCredential
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import UnstructuredFileLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import sync_manifest
+import graph_client
+import ingest_jobs
+from downloader import Downloader
+import blob_store
+from pipeline import IngestionPipeline
+import docx_fast
+import extractors
+from crawler import FolderCrawler, PathFilter
+from folder_tree import folder_tree
+from config_store import agents_store
+import bm25_index
+import metrics
+from embedding_cache import CachedEmbeddings
+import model_registry
 from langchain_core.documents import Document
-import docx
-from docx.text.paragraph import Paragraph
-from docx.table import Table
-from docx.oxml.text.paragraph import CT_P
-from docx.oxml.table import CT_Tbl
-from docx.document import Document as _Document
+
+# The API imports this module for its Graph helpers only, so Chroma,
+# unstructured, the text splitter and python-docx are imported where they
+# are used rather than here; they add seconds to API startup.
+
+# Save the manifest every N indexed files during a sync
+MANIFEST_CHECKPOINT_EVERY = 25
 
 # Ensure upload directory exists
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "downloads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 def get_header():
-    credential = ClientSecretCredential(
-        tenant_id=TENANT_ID,
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET
-    )
-    token = credential.get_token("https://graph.microsoft.com/.default")
-    return {"Authorization": f"Bearer {token.token}"}
+    # Token is cached and refreshed by the shared Graph client
+    return graph_client.get_client().auth_headers()
+
+_resolved_drive_id = None
 
-def get_drive_id(headers):
+def get_drive_id(headers=None):
+    global _resolved_drive_id
     if SHAREPOINT_DRIVE_ID:
         return SHAREPOINT_DRIVE_ID
+    if _resolved_drive_id:
+        return _resolved_drive_id
     
     # If no Drive ID, try to get the default drive of the site
     if not SHAREPOINT_SITE_ID:
         raise ValueError("SHAREPOINT_SITE_ID or SHAREPOINT_DRIVE_ID must be provided")
     
-    url = f"https://graph.microsoft.com/v1.0/sites/{SHAREPOINT_SITE_ID}/drive"
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    return response.json().get("id")
+    data = graph_client.get_client().get_json(f"sites/{SHAREPOINT_SITE_ID}/drive?$select=id")
+    _resolved_drive_id = data.get("id")
+    return _resolved_drive_id
 
-def list_files_recursive(headers, drive_id, item_id, path_prefix=""):
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/children"
-    
-    print(f"Scanning folder: {path_prefix}...")
-    
-    while url:
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            items = data.get("value", [])
-            
-            # Pass 1: Process Files First
-            for item in items:
-                if "file" in item:
-                    name = item.get("name", "")
-                    # Filter for PDF, Word, and Text
-                    lower_name = name.lower()
-                    if lower_name.endswith(".docx"):
-                        print(f"Found relevant file: {name}")
-                        item["local_path_rel"] = os.path.join(path_prefix, name)
-                        yield item
-            
-            # Pass 2: Recurse into Folders
-            for item in items:
-                if "folder" in item:
-                    name = item.get("name", "")
-                    # optimization: skip system/code folders
-                    lower_name = name.lower()
-                    skip_keywords = ["bin", "obj", "script", "app_", "jquery", "image", "css", "style", "font", "vendor", "node_modules", "dist", "build"]
-                    if any(k in lower_name for k in skip_keywords):
-                        print(f"Skipping system folder: {name}")
-                        continue
-                        
-                    new_prefix = os.path.join(path_prefix, name)
-                    yield from list_files_recursive(headers, drive_id, item.get("id"), new_prefix)
-            
-            url = data.get("@odata.nextLink")
-            
-        except requests.exceptions.HTTPError as e:
-            print(f"Error scanning {path_prefix}: {e}")
-            break
+def agent_path_filter(agent_id):
+    """
+    The agent's file selection from agents.json: "extensions" (else
+    INGEST_EXTENSIONS) and "include"/"exclude" globs (else CRAWL_EXCLUDE).
+    """
+    agent = next((a for a in agents_store.get() if a.get("id") == agent_id), None) or {}
+    return PathFilter(extensions=agent.get("extensions"), include=agent.get("include"),
+                      exclude=agent.get("exclude"))
+
+def list_files_recursive(headers, drive_id, item_id, path_prefix="", path_filter=None, crawler=None):
+    """
+    Yield the relevant files below a folder as the concurrent crawler finds
+    them (see crawler.py). Pass a FolderCrawler to inspect its stats after.
+    """
+    crawler = crawler or FolderCrawler(path_filter=path_filter)
+    return crawler.crawl(drive_id, item_id, path_prefix)
 
-def list_files(headers, drive_id, target_folder_id=None):
+def resolve_root_id(target_folder_id=None):
+    if target_folder_id:
+        return target_folder_id
+    if SHAREPOINT_TARGET_FOLDER_ID:
+        return SHAREPOINT_TARGET_FOLDER_ID
+    return "root"
+
+def list_files(headers, drive_id, target_folder_id=None, path_filter=None):
+    root_id = resolve_root_id(target_folder_id)
     if target_folder_id:
-        root_id = target_folder_id
         print(f"Starting recursive scan from Target Folder ID: {root_id}")
     elif SHAREPOINT_TARGET_FOLDER_ID:
-        root_id = SHAREPOINT_TARGET_FOLDER_ID
         print(f"Starting recursive scan from Configured Target Folder ID: {root_id}")
     else:
-        root_id = "root"
         print(f"Starting recursive scan from Drive Root")
 
-    return list_files_recursive(headers, drive_id, root_id)
+    return list_files_recursive(headers, drive_id, root_id, path_filter=path_filter)
 
-def list_folders(headers, drive_id, parent_id="root"):
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{parent_id}/children"
-    folders = []
-    
+def get_item_id(headers, drive_id, item_id):
+    # Resolve aliases such as "root" to the real driveItem ID, which is what
+    # parentReference.id carries in delta responses.
+    if item_id != "root":
+        return item_id
+    return graph_client.get_client().get_json(f"drives/{drive_id}/root?$select=id").get("id")
+
+class DeltaResyncRequired(Exception):
+    """The stored delta link expired; the caller must enumerate from scratch."""
+
+def iter_delta_items(headers, drive_id, root_id, delta_link=None):
+    """
+    Walk a Graph delta feed page by page. Yields lists of items; the final
+    @odata.deltaLink is returned as the generator's return value.
+    Delta on sub-folders is not available on SharePoint/OneDrive for Business,
+    so if the folder-scoped feed is rejected we fall back to the drive root
+    and let the caller filter by ancestry.
+    """
+    client = graph_client.get_client()
+    if delta_link:
+        url = delta_link
+    else:
+        url = f"drives/{drive_id}/items/{root_id}/delta"
+
+    tried_root = False
     while url:
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            
-            for item in data.get("value", []):
-                if "folder" in item:
-                    folders.append({
-                        "id": item.get("id"),
-                        "name": item.get("name"),
-                        "parentReference": item.get("parentReference", {})
-                    })
-            
-            url = data.get("@odata.nextLink")
-            
+            data = client.get_json(url)
         except requests.exceptions.HTTPError as e:
-            print(f"Error listing folders: {e}")
+            status = e.response.status_code if e.response is not None else None
+            if status == 410:
+                raise DeltaResyncRequired(str(e))
+            if status in (400, 403, 404, 501) and not delta_link and not tried_root:
+                print(f"Folder delta not supported ({status}), using drive root delta.")
+                tried_root = True
+                url = f"drives/{drive_id}/root/delta"
+                continue
+            raise
+
+        yield data.get("value", [])
+
+        if "@odata.deltaLink" in data:
+            return data["@odata.deltaLink"]
+        url = data.get("@odata.nextLink")
+
+    return None
+
+def _drop_folder_subtree(folders, items, folder_id, deleted_ids):
+    """Forget a folder and everything known beneath it."""
+    pending = [folder_id]
+    while pending:
+        current = pending.pop()
+        folders.pop(current, None)
+        pending.extend(fid for fid, f in folders.items() if f.get("parent_id") == current)
+        for iid, entry in items.items():
+            if entry.get("parent_id") == current:
+                deleted_ids.add(iid)
+
+def collect_delta_changes(headers, drive_id, root_id, manifest, path_filter=None, progress=None):
+    """
+    Compare the Graph delta feed against the manifest.
+    Returns (changed_items, deleted_ids, folders, delta_link).
+    """
+    path_filter = path_filter or PathFilter()
+    delta_link = manifest.get("delta_link")
+    full_enumeration = not delta_link
+
+    folders = {fid: dict(f) for fid, f in manifest.get("folders", {}).items()}
+    folders[root_id] = {"path": "", "parent_id": None}
+    known_items = manifest.get("items", {})
+
+    candidates = {}
+    deleted_ids = set()
+    seen_ids = set()
+
+    feed = iter_delta_items(headers, drive_id, root_id, delta_link)
+    while True:
+        try:
+            page = next(feed)
+        except StopIteration as stop:
+            new_delta_link = stop.value
             break
-            
-    return folders
+
+        # Lets a cancelled job stop between pages of a long enumeration
+        report_progress(progress, "scanning", files_seen=len(seen_ids))
+        for item in page:
+            item_id = item.get("id")
+            if not item_id or item_id == root_id or "root" in item:
+                continue
+            parent_id = item.get("parentReference", {}).get("id")
+            name = item.get("name", "")
+
+            if "deleted" in item:
+                if item_id in folders:
+                    _drop_folder_subtree(folders, known_items, item_id, deleted_ids)
+                if item_id in known_items or item_id in candidates:
+                    deleted_ids.add(item_id)
+                candidates.pop(item_id, None)
+                continue
+
+            in_scope = parent_id in folders
+            path = os.path.join(folders[parent_id]["path"], name) if in_scope else None
+
+            if "folder" in item:
+                if in_scope and not path_filter.skip_folder(path):
+                    folders[item_id] = {"path": path, "parent_id": parent_id}
+                elif item_id in folders:
+                    # Moved out of scope or renamed into an excluded path
+                    _drop_folder_subtree(folders, known_items, item_id, deleted_ids)
+                continue
+
+            if "file" not in item:
+                continue
+
+            if in_scope and path_filter.accepts_file(path):
+                item["local_path_rel"] = path
+                candidates[item_id] = item
+                seen_ids.add(item_id)
+                deleted_ids.discard(item_id)
+            elif item_id in known_items:
+                deleted_ids.add(item_id)
+                candidates.pop(item_id, None)
+
+    if full_enumeration:
+        # Anything we used to index that the fresh enumeration did not return is gone
+        deleted_ids.update(iid for iid in known_items if iid not in seen_ids)
+
+    changed_items = [item for item in candidates.values() if sync_manifest.is_changed(manifest, item)]
+    return changed_items, deleted_ids, folders, new_delta_link
+
+def collect_crawl_changes(headers, drive_id, root_id, manifest, path_filter=None, progress=None):
+    """
+    Fallback when the delta feed is unavailable: crawl the folder tree and
+    compare eTag/cTag against the manifest.
+    Returns (changed_items, deleted_ids, folders, delta_link=None).
+    """
+    known_items = manifest.get("items", {})
+    seen_ids = set()
+    changed_items = []
+    crawler = FolderCrawler(path_filter=path_filter)
+    for item in list_files_recursive(headers, drive_id, root_id, crawler=crawler):
+        report_progress(progress, "scanning", files_seen=len(seen_ids))
+        seen_ids.add(item.get("id"))
+        if sync_manifest.is_changed(manifest, item):
+            changed_items.append(item)
+    if crawler.stats["errors"]:
+        # Files in folders that could not be listed are not gone
+        print(f"{crawler.stats['errors']} folder listings failed; not removing unseen files.")
+        return changed_items, set(), {}, None
+    deleted_ids = {iid for iid in known_items if iid not in seen_ids}
+    return changed_items, deleted_ids, {}, None
+
+def list_folders(headers, drive_id, parent_id="root"):
+    # Served from the cached folder tree (see folder_tree.py)
+    try:
+        return folder_tree.children(drive_id, parent_id)
+    except requests.exceptions.RequestException as e:
+        print(f"Error listing folders: {e}")
+        return []
 
 def get_folder_info(headers, drive_id, folder_id):
-    if not folder_id or folder_id == "root":
-        return {"id": "root", "name": "root"}
-        
-    url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{folder_id}"
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        return {"id": data.get("id"), "name": data.get("name")}
+        return folder_tree.folder_info(drive_id, folder_id)
     except Exception as e:
         print(f"Error getting folder info: {e}")
         return {"id": folder_id, "name": "Unknown"}
@@ -155,45 +272,23 @@ def download_file(headers, file_id, file_name):
     # Or construct it.
     pass 
 
-def download_files(headers, files):
-    downloaded_paths = []
-    for file_item in files:
-        name = file_item.get("name")
-        download_url = file_item.get("@microsoft.graph.downloadUrl")
-        
-        if not download_url:
-            print(f"Skipping {name}, no download URL found.")
-            continue
-            
-        print(f"Downloading {name}...")
-        response = requests.get(download_url) # Download URL is public-ish pre-signed or needs auth? 
-        # Usually it works directly but let's check. 
-        # Actually standard Graph download URL often doesn't need auth header if it's a pre-signed link, 
-        # but safely we can use the /content endpoint with auth.
-        
-        if response.status_code != 200:
-            # Try /content endpoint
-            drive_id = file_item.get("parentReference", {}).get("driveId")
-            item_id = file_item.get("id")
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/content"
-            response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            file_path = os.path.join(UPLOAD_DIR, name)
-            with open(file_path, "wb") as f:
-                f.write(response.content)
-            downloaded_paths.append(file_path)
-        else:
-            print(f"Failed to download {name}")
-            
-    return downloaded_paths
-
-    return downloaded_paths
+def download_files(headers, files, downloader=None):
+    downloader = downloader or Downloader(UPLOAD_DIR)
+    return downloader.download(files)
 
 def load_docx_with_tables(file_path):
     """
     Load a DOCX file and convert tables to Markdown, preserving order.
+    Reference python-docx implementation; ingestion uses docx_fast.load_docx,
+    which produces the same text (see benchmarks/bench_docx_extract.py).
     """
+    import docx
+    from docx.text.paragraph import Paragraph
+    from docx.table import Table
+    from docx.oxml.text.paragraph import CT_P
+    from docx.oxml.table import CT_Tbl
+    from docx.document import Document as _Document
+
     try:
         doc = docx.Document(file_path)
     except Exception as e:
@@ -259,88 +354,286 @@ def load_docx_with_tables(file_path):
 
     return [Document(page_content="\n".join(full_text), metadata={"source": file_path})]
 
+# Native loaders; anything else goes through unstructured
+LOADERS = {
+    ".docx": docx_fast.load_docx,
+    ".pdf": extractors.load_pdf,
+    ".pptx": extractors.load_pptx,
+    ".xlsx": extractors.load_xlsx
+}
+
+def load_document(path):
+    loader = LOADERS.get(os.path.splitext(path)[1].lower())
+    if loader:
+        return loader(path)
+    from langchain_community.document_loaders import UnstructuredFileLoader
+    loader = UnstructuredFileLoader(path)
+    return loader.load()
+
+def get_text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+
+def build_pipeline(agent_id, downloader=None, progress=None):
+    """
+    Load the embedding model and open the vector store once for the whole run.
+    """
+    # Use Local Embeddings (HuggingFace), shared with serving and loaded only
+    # if some text is not cached yet
+    embeddings = model_registry.get_embeddings()
+    
+    from langchain_chroma import Chroma
+    target_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
+    print(f"Persisting to {target_dir}")
+    vectorstore = Chroma(persist_directory=target_dir, embedding_function=embeddings)
+
+    return IngestionPipeline(
+        embeddings=embeddings,
+        vectorstore=vectorstore,
+        keyword_index=bm25_index.open_for_agent(agent_id, vectorstore._collection),
+        downloader=downloader or Downloader(UPLOAD_DIR),
+        load_document=load_document,
+        text_splitter=get_text_splitter(),
+        embed_batch_size=EMBED_BATCH_SIZE,
+        download_window=DOWNLOAD_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        parallel_loaders=LOADERS,
+        split_loaders={".pdf": extractors.pdf_tasks},
+        parse_workers=PARSE_WORKERS,
+        progress=progress,
+        agent_id=agent_id
+    )
+
+def print_cache_stats(embeddings):
+    if isinstance(embeddings, CachedEmbeddings):
+        stats = embeddings.cache.stats()
+        print(f"Embedding cache: {stats['hit_rate']:.0%} hit rate "
+              f"({stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries)")
+
+class _LocalFileDownloader:
+    """Stand-in downloader for files that are already on disk."""
+    def download(self, items):
+        return [item["local_path"] for item in items]
+
 def process_and_index(file_paths, agent_id="default"):
     if not file_paths:
         print("No files to process.")
         return
 
-    documents = []
-    for path in file_paths:
-        print(f"Loading {path}...")
+    pipeline = build_pipeline(agent_id, downloader=_LocalFileDownloader())
+    items = [{"name": os.path.basename(path), "local_path": path} for path in file_paths]
+    for _ in pipeline.run(items):
+        pass
+    print(pipeline.summary())
+    print_cache_stats(pipeline.embeddings)
+
+def open_vectorstore(agent_id, embeddings=None):
+    from langchain_chroma import Chroma
+    target_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
+    return Chroma(persist_directory=target_dir, embedding_function=embeddings)
+
+def remove_indexed_items(agent_id, entries):
+    """
+    Delete every chunk belonging to the given manifest entries
+    ({item_id: entry}). Chunks indexed before item IDs were recorded are
+    matched by their source path instead.
+    """
+    target_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
+    if not entries or not os.path.exists(target_dir):
+        return 0
+
+    collection = open_vectorstore(agent_id)._collection
+    # Opening the keyword index creates it; a store that predates it is
+    # backfilled from Chroma later, which an empty file would prevent
+    keyword_index = bm25_index.KeywordIndex.for_agent(agent_id) if bm25_index.KeywordIndex.exists(agent_id) else None
+    removed = 0
+    for item_id, entry in entries.items():
+        ids = collection.get(where={"item_id": item_id}, include=[])["ids"]
+        source = entry.get("local_path")
+        if source:
+            legacy = collection.get(where={"source": source}, include=["metadatas"])
+            ids += [cid for cid, meta in zip(legacy["ids"], legacy["metadatas"]) if not (meta or {}).get("item_id")]
+        if ids:
+            collection.delete(ids=ids)
+            if keyword_index is not None:
+                keyword_index.delete(ids)
+            removed += len(ids)
+    if keyword_index is not None:
+        keyword_index.close()
+    print(f"Removed {removed} chunks for {len(entries)} deleted files.")
+    return removed
+
+def clear_index(agent_id):
+    target_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
+    if not os.path.exists(target_dir):
+        return
+    vectorstore = open_vectorstore(agent_id)
+    ids = vectorstore.get(include=[])["ids"]
+    # Chroma caps the number of IDs per delete call
+    for i in range(0, len(ids), 5000):
+        vectorstore.delete(ids=ids[i:i + 5000])
+    if bm25_index.KeywordIndex.exists(agent_id):
+        keyword_index = bm25_index.KeywordIndex.for_agent(agent_id)
+        keyword_index.clear()
+        keyword_index.close()
+    print(f"Cleared {len(ids)} chunks from {target_dir}")
+
+def report_progress(progress, phase, **counters):
+    if progress is not None:
+        progress(phase, counters)
+
+def sync_incremental(headers, drive_id, root_id, agent_id, full_resync=False, progress=None, path_filter=None):
+    """
+    Only download and re-index files that were added or changed since the last
+    run, and drop the chunks of files that were deleted or moved out of scope.
+
+    `progress(phase, counters)` is called as the run advances. The manifest is
+    checkpointed while indexing, so an interrupted run resumes where it
+    stopped. Returns a summary of the run.
+    """
+    if not full_resync and sync_manifest.root_changed(agent_id, root_id):
+        # The old folder's files are not in the new folder's delta feed, so
+        # nothing would ever delete their chunks
+        print(f"Target folder changed for agent {agent_id}, clearing the index.")
+        full_resync = True
+    if full_resync:
+        sync_manifest.delete_manifest(agent_id)
+        clear_index(agent_id)
+
+    report_progress(progress, "scanning")
+    manifest = sync_manifest.load_manifest(agent_id, root_id)
+
+    path_filter = path_filter or PathFilter()
+    if manifest.get("delta_link") and manifest.get("filter") != path_filter.signature():
+        # The delta feed only reports changes, so files that the new file
+        # types or include/exclude rules select (or drop) only show up in a
+        # full enumeration
+        print("File selection changed, re-enumerating folder.")
+        manifest["delta_link"] = None
+    elif manifest.get("delta_link") and sync_manifest.has_unstored_items(manifest):
+        # Unchanged files are not in the delta feed; list them all once so
+        # the ones indexed from the old flat downloads directory are fetched again
+        print("Moving downloads to the blob store, re-enumerating folder.")
+        manifest["delta_link"] = None
+
+    try:
         try:
-            if path.lower().endswith(".docx"):
-                docs = load_docx_with_tables(path)
-            else:
-                # Fallback for other types (though we restricted to docx)
-                loader = UnstructuredFileLoader(path)
-                docs = loader.load()
-            
-            documents.extend(docs)
+            changes = collect_delta_changes(headers, drive_id, root_id, manifest, path_filter, progress)
+        except DeltaResyncRequired:
+            print("Delta link expired, re-enumerating folder.")
+            manifest["delta_link"] = None
+            changes = collect_delta_changes(headers, drive_id, root_id, manifest, path_filter, progress)
+    except requests.exceptions.HTTPError as e:
+        print(f"Delta query failed ({e}), comparing against manifest by crawling instead.")
+        changes = collect_crawl_changes(headers, drive_id, root_id, manifest, path_filter, progress)
+
+    changed_items, deleted_ids, folders, delta_link = changes
+    print(f"Sync plan: {len(changed_items)} added/changed, {len(deleted_ids)} deleted.")
+
+    # Drop chunks of deleted files. Changed files are upserted in place and
+    # their leftover chunks are removed by the pipeline.
+    deleted_entries = {iid: manifest["items"][iid] for iid in deleted_ids if iid in manifest["items"]}
+    remove_indexed_items(agent_id, deleted_entries)
+    for iid in deleted_ids:
+        manifest["items"].pop(iid, None)
+
+    files_total = len(changed_items)
+    report_progress(progress, "indexing", files_total=files_total)
+    stats = {}
+    indexed_ids = set()
+    if changed_items:
+        pipeline = build_pipeline(
+            agent_id,
+            progress=lambda s: report_progress(progress, "indexing", files_total=files_total, **s)
+        )
+        try:
+            for n, item in enumerate(pipeline.run(changed_items), start=1):
+                manifest["items"][item["id"]] = sync_manifest.manifest_entry(item)
+                indexed_ids.add(item["id"])
+                if n % MANIFEST_CHECKPOINT_EVERY == 0:
+                    # Delta link stays at the previous run; indexed files are skipped on resume
+                    sync_manifest.save_manifest(agent_id, manifest)
+        except ingest_jobs.IngestCancelled:
+            # Stop here: no summary, and the last checkpoint is where a resumed run starts
+            raise
         except Exception as e:
-            print(f"Error loading {path}: {e}")
+            print(f"Error during ingestion: {e}")
+        print(pipeline.summary())
+        print_cache_stats(pipeline.embeddings)
+        stats = pipeline.stats
 
-    if not documents:
-        return
+    failed = [item for item in changed_items if item["id"] not in indexed_ids]
+    if failed:
+        # Keep the old delta link so the failed files show up again next run
+        print(f"{len(failed)} files failed; delta link not advanced.")
+    else:
+        manifest["delta_link"] = delta_link
+        manifest["filter"] = path_filter.signature()
 
-    print("Splitting documents...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
+    if folders:
+        folders.pop(root_id, None)
+        manifest["folders"] = folders
+    sync_manifest.save_manifest(agent_id, manifest)
 
-    print("Creating embeddings and indexing...")
-    # Use Local Embeddings (HuggingFace)
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    target_dir = os.path.join(PERSIST_DIRECTORY, agent_id)
-    print(f"Persisting to {target_dir}")
-    
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=target_dir
-    )
-    print("Ingestion complete.")
+    return {
+        "files_total": files_total,
+        "files_indexed": files_total - len(failed),
+        "files_failed": len(failed),
+        "files_deleted": len(deleted_entries),
+        "chunks": stats.get("chunks", 0)
+    }
 
-def main(target_folder_id=None, agent_id="default"):
+def main(target_folder_id=None, agent_id="default", incremental=True, full_resync=False, progress=None,
+         path_filter=None):
     if not CLIENT_ID or not CLIENT_SECRET or not TENANT_ID:
         print("Please set CLIENT_ID, CLIENT_SECRET, and TENANT_ID in .env")
         return
 
+    # Graph and download metrics of this run are labelled with the agent
+    metrics.set_default_agent(agent_id)
+
     print("Authenticating...")
     headers = get_header()
     
     print("Resolving Drive ID...")
     drive_id = get_drive_id(headers)
     print(f"Using Drive ID: {drive_id}")
+
+    path_filter = path_filter or agent_path_filter(agent_id)
+    print(f"Indexing file types: {', '.join(path_filter.extensions)}")
+
+    if incremental:
+        root_id = get_item_id(headers, drive_id, resolve_root_id(target_folder_id))
+        print(f"Syncing changes under folder {root_id}...")
+        summary = sync_incremental(headers, drive_id, root_id, agent_id,
+                                   full_resync=full_resync, progress=progress, path_filter=path_filter)
+        if BLOB_GC_AFTER_INGEST:
+            # Files this agent no longer indexes may have been its last reference
+            try:
+                blob_store.collect_garbage(UPLOAD_DIR)
+            except Exception as e:
+                print(f"Blob garbage collection failed: {e}")
+        print("Ingestion complete.")
+        return summary
     
     print("Listing and Processing files...")
     
-    files_generator = list_files(headers, drive_id, target_folder_id)
-    
-    # Process in batches
-    batch_size = 1
-    batch = []
-    
-    for file_item in files_generator:
-        batch.append(file_item)
-        if len(batch) >= batch_size:
-            print(f"Processing batch of {len(batch)} files...")
-            try:
-                paths = download_files(headers, batch)
-                process_and_index(paths, agent_id)
-            except Exception as e:
-                print(f"Error processing batch: {e}")
-            batch = []
-            
-    # Process remaining
-    if batch:
-        print(f"Processing final batch of {len(batch)} files...")
-        try:
-            paths = download_files(headers, batch)
-            process_and_index(paths, agent_id)
-        except Exception as e:
-            print(f"Error processing batch: {e}")
+    files_generator = list_files(headers, drive_id, target_folder_id, path_filter)
+    pipeline = build_pipeline(agent_id, progress=lambda s: report_progress(progress, "indexing", **s))
+    for _ in pipeline.run(files_generator):
+        pass
+    print(pipeline.summary())
+    print_cache_stats(pipeline.embeddings)
             
     print("Ingestion complete.")
+    return {
+        "files_total": pipeline.stats["files"] + pipeline.stats["failed"],
+        "files_indexed": pipeline.stats["files"],
+        "files_failed": pipeline.stats["failed"],
+        "files_deleted": 0,
+        "chunks": pipeline.stats["chunks"]
+    }
 
 if __name__ == "__main__":
-    main()
+    import sys
+    main(full_resync="--full" in sys.argv)
@@ -0,0 +1,435 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import subprocess
+from contextlib import contextmanager
+from config import (
+    INGEST_JOBS_PATH, INGEST_MAX_WORKERS, INGEST_CPU_THREADS, INGEST_NICE,
+    INGEST_HEARTBEAT_SECONDS, INGEST_STALE_SECONDS
+)
+
+# Persistent ingestion job queue.
+#
+# The API only records jobs in SQLite and starts a worker process
+# (`python ingest_jobs.py`); the worker claims queued jobs and runs
+# ingest.main with a capped number of CPU threads, writing progress and a
+# heartbeat back to the job row. At most one queued/running job may exist
+# per agent (enforced by a partial unique index), so two ingestions never
+# write to the same Chroma directory. A running job whose heartbeat stops
+# (worker killed, host restarted) is put back in the queue and resumes from
+# the sync manifest checkpoint.
+
+class JobConflict(Exception):
+    """The agent already has a queued or running job."""
+
+    def __init__(self, job):
+        super().__init__(f"Agent {job['agent_id']} already has an active ingestion job {job['id']}")
+        self.job = job
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class JobStore:
+    def __init__(self, path=INGEST_JOBS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    agent_id TEXT NOT NULL,
+                    folder_id TEXT NOT NULL,
+                    full_resync INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    message TEXT NOT NULL DEFAULT '',
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_pid INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_agent
+                    ON jobs(agent_id) WHERE status IN ('queued', 'running');
+                CREATE INDEX IF NOT EXISTS idx_jobs_agent_created ON jobs(agent_id, created_at);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: the API and the worker
+        # processes all write to this file
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"] or "{}")
+        job["full_resync"] = bool(job["full_resync"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def active_job(self, agent_id):
+        with self._connect() as conn:
+            return self._to_dict(conn.execute(
+                "SELECT * FROM jobs WHERE agent_id = ? AND status IN ('queued', 'running')", (agent_id,)
+            ).fetchone())
+
+    def latest(self, agent_id):
+        with self._connect() as conn:
+            return self._to_dict(conn.execute(
+                "SELECT * FROM jobs WHERE agent_id = ? ORDER BY created_at DESC LIMIT 1", (agent_id,)
+            ).fetchone())
+
+    def list_jobs(self, agent_id=None, limit=50):
+        with self._connect() as conn:
+            if agent_id:
+                rows = conn.execute("SELECT * FROM jobs WHERE agent_id = ? ORDER BY created_at DESC LIMIT ?",
+                                    (agent_id, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def index_version(self, agent_id):
+        """Finish time of the agent's last job; changes whenever a job may have rewritten the index."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT MAX(finished_at) FROM jobs WHERE agent_id = ? AND status IN ('completed', 'failed', 'cancelled')",
+                (agent_id,)
+            ).fetchone()[0]
+
+    def enqueue(self, agent_id, folder_id, full_resync=False):
+        """
+        Queue a job for the agent. A running job whose worker stopped sending
+        heartbeats does not block it: it is closed and the new job takes over
+        (resuming from the manifest checkpoint, as a requeued job would).
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    stale = conn.execute(
+                        "SELECT id, full_resync, cancel_requested FROM jobs "
+                        "WHERE agent_id = ? AND status = 'running' AND heartbeat_at < ?",
+                        (agent_id, now - INGEST_STALE_SECONDS)
+                    ).fetchone()
+                    if stale is not None:
+                        conn.execute(
+                            "UPDATE jobs SET status = ?, message = ?, finished_at = ? WHERE id = ?",
+                            ("cancelled" if stale["cancel_requested"] else "failed",
+                             f"Worker lost; superseded by job {job_id}", now, stale["id"])
+                        )
+                        # A full resync that had not cleared the index yet still has to
+                        full_resync = full_resync or bool(stale["full_resync"])
+                    conn.execute(
+                        "INSERT INTO jobs (id, agent_id, folder_id, full_resync, status, message, created_at) "
+                        "VALUES (?, ?, ?, ?, 'queued', 'Waiting for a worker', ?)",
+                        (job_id, agent_id, folder_id, int(full_resync), now)
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.IntegrityError:
+            raise JobConflict(self.active_job(agent_id))
+        return self.get(job_id)
+
+    def resume(self, job_id):
+        """Put a failed or cancelled job back in the queue."""
+        # A "running" job whose worker died comes back as queued here
+        self.requeue_stale()
+        job = self.get(job_id)
+        if job is None or job["status"] not in ("failed", "cancelled"):
+            return job
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', message = 'Resuming', cancel_requested = 0, "
+                    "finished_at = NULL WHERE id = ? AND status IN ('failed', 'cancelled')",
+                    (job_id,)
+                )
+        except sqlite3.IntegrityError:
+            raise JobConflict(self.active_job(job["agent_id"]))
+        return self.get(job_id)
+
+    def request_cancel(self, job_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', message = 'Cancelled before start', finished_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, message = 'Cancelling...' WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+        # Nobody is left to act on the flag when the worker died
+        self.requeue_stale()
+        return self.get(job_id)
+
+    def claim_next(self, pid):
+        """Atomically move the oldest queued job to running, respecting INGEST_MAX_WORKERS."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+                row = None
+                if running < INGEST_MAX_WORKERS:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                    ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_pid = ?, attempts = attempts + 1, "
+                        "started_at = COALESCE(started_at, ?), heartbeat_at = ?, message = 'Starting' WHERE id = ?",
+                        (pid, now, now, row["id"])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def heartbeat(self, job_id, message, progress, full_resync=None):
+        """Record progress; returns True if cancellation was requested."""
+        with self._connect() as conn:
+            if full_resync is not None:
+                conn.execute("UPDATE jobs SET full_resync = ? WHERE id = ?", (int(full_resync), job_id))
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, message = CASE WHEN cancel_requested THEN message ELSE ? END, "
+                "progress = ? WHERE id = ? AND status = 'running'",
+                (time.time(), message, json.dumps(progress), job_id)
+            )
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id, status, message, progress):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, progress = ?, finished_at = ?, heartbeat_at = ? WHERE id = ?",
+                (status, message, json.dumps(progress), time.time(), time.time(), job_id)
+            )
+
+    def requeue_stale(self):
+        """Return running jobs whose worker stopped sending heartbeats to the queue."""
+        cutoff = time.time() - INGEST_STALE_SECONDS
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'queued' END, "
+                "message = CASE WHEN cancel_requested THEN 'Cancelled' ELSE 'Worker lost, resuming' END, "
+                "finished_at = CASE WHEN cancel_requested THEN ? ELSE NULL END "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (time.time(), cutoff)
+            )
+            return cursor.rowcount
+
+    def has_queued(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+
+# --- Progress ---
+
+def build_progress(phase, counters, started_at):
+    elapsed = time.time() - started_at
+    total = counters.get("files_total")
+    indexed = counters.get("files", 0)
+    files_rate = indexed / elapsed if elapsed else 0.0
+    progress = {
+        "phase": phase,
+        "files_scanned": total,
+        "files_downloaded": counters.get("downloaded", 0),
+        "files_parsed": counters.get("parsed", 0),
+        "files_indexed": indexed,
+        "files_failed": counters.get("failed", 0),
+        "chunks_embedded": counters.get("chunks", 0),
+        "elapsed_seconds": round(elapsed, 1),
+        "files_per_second": round(files_rate, 2),
+        "chunks_per_second": round(counters.get("chunks", 0) / elapsed, 1) if elapsed else 0.0,
+        "eta_seconds": None
+    }
+    if total and files_rate:
+        remaining = max(0, total - indexed - counters.get("failed", 0))
+        progress["eta_seconds"] = round(remaining / files_rate)
+    return progress
+
+
+def describe(progress):
+    phase = progress.get("phase")
+    if phase == "scanning":
+        return "Scanning folder for changes..."
+    if phase != "indexing":
+        return "Starting..."
+    total = progress.get("files_scanned")
+    parts = [f"Indexed {progress['files_indexed']}" + (f"/{total}" if total is not None else "") + " files",
+             f"{progress['chunks_embedded']} chunks",
+             f"{progress['files_per_second']} files/s"]
+    if progress.get("files_failed"):
+        parts.append(f"{progress['files_failed']} failed")
+    if progress.get("eta_seconds") is not None:
+        parts.append(f"ETA {progress['eta_seconds']}s")
+    return ", ".join(parts)
+
+
+# --- Worker process ---
+
+def limit_cpu():
+    """Keep ingestion from starving the API of CPU."""
+    if hasattr(os, "nice") and INGEST_NICE:
+        try:
+            os.nice(INGEST_NICE)
+        except OSError:
+            pass
+    try:
+        import torch
+        torch.set_num_threads(INGEST_CPU_THREADS)
+    except ImportError:
+        pass
+
+
+def run_job(store, job):
+    import ingest
+
+    job_id = job["id"]
+    started_at = time.time()
+    cancel_event = threading.Event()
+    stop_event = threading.Event()
+    state = {"phase": "starting", "counters": {}}
+    state_lock = threading.Lock()
+
+    def progress(phase, counters):
+        if cancel_event.is_set():
+            raise IngestCancelled()
+        with state_lock:
+            state["phase"] = phase
+            state["counters"] = counters
+
+    def snapshot():
+        with state_lock:
+            return build_progress(state["phase"], state["counters"], started_at)
+
+    def heartbeat():
+        full_resync_cleared = False
+        while not stop_event.wait(INGEST_HEARTBEAT_SECONDS):
+            current = snapshot()
+            # Once the index was cleared a resumed run must not clear it again
+            clear_flag = None
+            if job["full_resync"] and not full_resync_cleared and current["phase"] != "starting":
+                clear_flag, full_resync_cleared = False, True
+            if store.heartbeat(job_id, describe(current), current, full_resync=clear_flag):
+                cancel_event.set()
+
+    beat = threading.Thread(target=heartbeat, name="ingest-heartbeat", daemon=True)
+    beat.start()
+
+    print(f"[job {job_id}] Ingesting agent {job['agent_id']} (attempt {job['attempts']})")
+    status, message, summary = "failed", "", None
+    try:
+        summary = ingest.main(target_folder_id=job["folder_id"], agent_id=job["agent_id"],
+                              full_resync=job["full_resync"], progress=progress)
+        if summary is None:
+            message = "Graph credentials are not configured"
+    except IngestCancelled:
+        pass
+    except Exception as e:
+        message = str(e)
+    finally:
+        stop_event.set()
+        beat.join()
+
+    final = snapshot()
+    if cancel_event.is_set() or (store.get(job_id) or {}).get("cancel_requested"):
+        final["eta_seconds"] = None
+        status, message = "cancelled", f"Cancelled. {describe(final)}"
+    elif summary is not None:
+        status = "completed"
+        message = (f"Ingestion complete: {summary['files_indexed']} files indexed, "
+                   f"{summary['files_failed']} failed, {summary['files_deleted']} removed, "
+                   f"{summary['chunks']} chunks")
+        final.update({"files_scanned": summary["files_total"], "files_indexed": summary["files_indexed"],
+                      "files_failed": summary["files_failed"], "eta_seconds": 0})
+    store.finish(job_id, status, message, final)
+    print(f"[job {job_id}] {status}: {message}")
+
+
+def worker_main():
+    limit_cpu()
+    store = JobStore()
+    while True:
+        store.requeue_stale()
+        job = store.claim_next(os.getpid())
+        if job is None:
+            return
+        run_job(store, job)
+
+
+def spawn_worker():
+    """Start a detached worker process with a capped thread count."""
+    env = dict(os.environ)
+    threads = str(INGEST_CPU_THREADS)
+    env.update({
+        "OMP_NUM_THREADS": threads,
+        "MKL_NUM_THREADS": threads,
+        "OPENBLAS_NUM_THREADS": threads,
+        "TOKENIZERS_PARALLELISM": "false",
+        "PARSE_WORKERS": env.get("INGEST_PARSE_WORKERS", threads)
+    })
+    kwargs = {}
+    if os.name == "posix":
+        kwargs["start_new_session"] = True
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), **kwargs)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def ensure_worker():
+    """Requeue jobs of dead workers and start a worker if work is waiting."""
+    store = get_store()
+    store.requeue_stale()
+    if store.has_queued():
+        spawn_worker()
+
+
+def recover_stale_jobs():
+    """Requeue jobs of dead workers and start a worker to resume them, if there were any."""
+    if get_store().requeue_stale():
+        spawn_worker()
+
+
+if __name__ == "__main__":
+    worker_main()
@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+from contextvars import ContextVar
+from contextlib import contextmanager
+from config import METRICS_MULTIPROC_DIR
+
+# Prometheus metrics for ingestion and chat, served by api.py at /metrics.
+#
+# Ingestion runs in a separate worker process (ingest_jobs.py). Set
+# METRICS_MULTIPROC_DIR to have every process write its samples there so
+# /metrics reports the worker's metrics as well; without it only the API
+# process's own metrics are exported.
+#
+# Every metric carries an `agent` label. Chat code passes the agent
+# explicitly; ingestion code (Graph client, downloader) uses the process
+# default, which ingest.main sets for the agent being ingested.
+
+if METRICS_MULTIPROC_DIR:
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_MULTIPROC_DIR)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192, 16384)
+
+# --- Ingestion ---
+GRAPH_REQUEST_SECONDS = Histogram(
+    "rag_graph_request_seconds", "Microsoft Graph request latency", ["agent", "method", "status"],
+    buckets=SLOW_BUCKETS)
+GRAPH_THROTTLED = Counter(
+    "rag_graph_throttled_total", "Graph responses with status 429", ["agent"])
+DOWNLOAD_BYTES = Counter(
+    "rag_download_bytes_total", "Bytes downloaded from SharePoint", ["agent"])
+DOWNLOAD_FILES = Counter(
+    "rag_download_files_total", "Files handled by the downloader", ["agent", "result"])
+PARSE_SECONDS = Histogram(
+    "rag_parse_seconds", "Time to extract text from one file", ["agent", "extension"],
+    buckets=SLOW_BUCKETS)
+CHUNKS = Counter(
+    "rag_chunks_total", "Chunks produced by the text splitter", ["agent"])
+EMBED_BATCH_SECONDS = Histogram(
+    "rag_embed_batch_seconds", "Latency of one embedding batch", ["agent"], buckets=SLOW_BUCKETS)
+CHROMA_UPSERT_SECONDS = Histogram(
+    "rag_chroma_upsert_seconds", "Latency of one Chroma upsert batch", ["agent"], buckets=SLOW_BUCKETS)
+
+# --- Chat ---
+CHROMA_QUERY_SECONDS = Histogram(
+    "rag_chroma_query_seconds", "Latency of one Chroma similarity search", ["agent"], buckets=FAST_BUCKETS)
+KEYWORD_QUERY_SECONDS = Histogram(
+    "rag_keyword_query_seconds", "Latency of one BM25 keyword search", ["agent"], buckets=FAST_BUCKETS)
+CHAT_STAGE_SECONDS = Histogram(
+    "rag_chat_stage_seconds", "Time spent per chat stage", ["agent", "stage"], buckets=SLOW_BUCKETS)
+LLM_TTFT_SECONDS = Histogram(
+    "rag_llm_time_to_first_token_seconds", "LLM time to first token", ["agent", "provider"],
+    buckets=SLOW_BUCKETS)
+LLM_TOTAL_SECONDS = Histogram(
+    "rag_llm_seconds", "LLM total generation time", ["agent", "provider"], buckets=SLOW_BUCKETS)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens", "Estimated prompt tokens after context packing", ["agent", "provider"],
+    buckets=TOKEN_BUCKETS)
+LLM_INPUT_TOKENS = Histogram(
+    "rag_llm_input_tokens", "Prompt tokens as reported by the LLM provider", ["agent", "provider"],
+    buckets=TOKEN_BUCKETS)
+CHAT_REQUESTS = Counter(
+    "rag_chat_requests_total", "Chat requests", ["agent", "endpoint", "outcome"])
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["agent", "cache", "result"])
+CHAIN_EVICTIONS = Counter(
+    "rag_chain_evictions_total", "QA chains evicted from the chain cache", ["agent", "reason"])
+CHAINS_RESIDENT = Gauge(
+    "rag_chains_resident", "QA chains currently cached", multiprocess_mode="livesum")
+
+_default_agent = "none"
+_current_agent = ContextVar("metrics_agent", default=None)
+
+
+def set_default_agent(agent_id):
+    """Agent label for metrics recorded by this process outside a chat request."""
+    global _default_agent
+    _default_agent = agent_id or "none"
+
+
+def agent_label(agent_id=None):
+    return agent_id or _current_agent.get() or _default_agent
+
+
+def record_cache(cache, hit, agent_id=None):
+    CACHE_LOOKUPS.labels(agent_label(agent_id), cache, "hit" if hit else "miss").inc()
+
+
+# --- Per-request stage timings ---
+
+_stage_timings = ContextVar("stage_timings", default=None)
+
+
+class StageTimings:
+    """Collects per-stage durations of one chat request (milliseconds)."""
+
+    def __init__(self, agent_id):
+        self.agent_id = agent_id
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+        CHAT_STAGE_SECONDS.labels(agent_label(self.agent_id), stage).observe(seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(ms, 1) for stage, ms in self.stages.items()}
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+def start_request(agent_id):
+    """Begin stage timing for the current request (an asyncio task or thread)."""
+    timings = StageTimings(agent_id)
+    _stage_timings.set(timings)
+    _current_agent.set(agent_id)
+    return timings
+
+
+def record_stage(stage, seconds):
+    """Record a stage of the current request; a no-op outside a chat request."""
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def render():
+    """(body, content type) for the /metrics endpoint."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,95 @@
+import threading
+from config import EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_CACHE_ENABLED
+from embedding_cache import CachedEmbeddings
+
+# Process-wide registry of embedding (and reranking) models, keyed by
+# (model name, device).
+# Ingestion, serving and the CLI tools all share one copy of the weights
+# instead of loading a new HuggingFaceEmbeddings per agent or per run.
+
+_models = {}
+_handles = {}
+_dimensions = {}
+_load_locks = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL, device=EMBEDDING_DEVICE):
+    """The shared raw HuggingFaceEmbeddings instance, loaded on first use."""
+    key = (model_name, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        lock = _load_locks.setdefault(key, threading.Lock())
+    # Load outside the registry lock so different models can load in parallel
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            print(f"Loading embedding model {model_name} on {device}...")
+            model = HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"device": device})
+            _models[key] = model
+    return model
+
+
+def get_cross_encoder(model_name, device=EMBEDDING_DEVICE):
+    """The shared sentence-transformers CrossEncoder used for reranking."""
+    key = ("cross-encoder", model_name, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        lock = _load_locks.setdefault(key, threading.Lock())
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            print(f"Loading cross-encoder {model_name} on {device}...")
+            model = CrossEncoder(model_name, device=device)
+            # The first call is slow; keep it out of the first query's rerank budget
+            model.predict([("warm-up", "warm-up")])
+            _models[key] = model
+    return model
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL, device=EMBEDDING_DEVICE):
+    """
+    Shared embeddings handle for ingestion and serving: cache-backed when the
+    embedding cache is enabled, otherwise the raw model.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return get_embedding_model(model_name, device)
+
+    key = (model_name, device)
+    with _registry_lock:
+        handle = _handles.get(key)
+        if handle is None:
+            handle = CachedEmbeddings(model_name, lambda: get_embedding_model(model_name, device))
+            _handles[key] = handle
+    return handle
+
+
+def embedding_dimension(model_name=EMBEDDING_MODEL, device=EMBEDDING_DEVICE):
+    """Vector size of the model (loads it if needed)."""
+    key = (model_name, device)
+    if key not in _dimensions:
+        model = get_embedding_model(model_name, device)
+        client = getattr(model, "_client", None) or getattr(model, "client", None)
+        if hasattr(client, "get_sentence_embedding_dimension"):
+            _dimensions[key] = client.get_sentence_embedding_dimension()
+        else:
+            _dimensions[key] = len(model.embed_query("dimension"))
+    return _dimensions[key]
+
+
+def warm_up(model_name=EMBEDDING_MODEL, device=EMBEDDING_DEVICE):
+    """Load the model and run one inference so the first query pays nothing."""
+    get_embedding_model(model_name, device).embed_query("warm-up")
+
+
+def loaded_models():
+    return [{"model": key[-2], "device": key[-1], "kind": key[0] if len(key) == 3 else "embedding"}
+            for key in _models]
@@ -0,0 +1,367 @@
+import os
+import time
+import hashlib
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import metrics
+
+# Staged ingestion pipeline:
+#
+#   crawl -> download -> parse -> split -> embed -> upsert
+#
+# Each stage is a generator running in its own thread and handing results to
+# the next stage through a bounded queue. A slow stage therefore blocks the
+# ones before it (backpressure) instead of letting files pile up in memory.
+
+_DONE = object()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(item_id, ordinal, text):
+    """
+    Deterministic chunk ID: re-ingesting the same file yields the same IDs,
+    so writes become upserts instead of duplicates.
+    """
+    return f"{item_id}:{ordinal}:{content_hash(text)[:16]}"
+
+
+def timed_load(loader, path):
+    """Run `loader(path)` and return (docs, seconds); module-level so it pickles."""
+    t0 = time.perf_counter()
+    docs = loader(path)
+    return docs, time.perf_counter() - t0
+
+
+def gather_loads(futures, started):
+    """
+    Combine timed_load futures for parts of one file into a single future of
+    (their docs in order, seconds since `started`).
+    """
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            docs = [doc for future in futures for doc in future.result()[0]]
+        except Exception as e:
+            combined.set_exception(e)
+            return
+        combined.set_result((docs, time.perf_counter() - started))
+
+    for future in futures:
+        future.add_done_callback(done)
+    return combined
+
+
+def item_key(item):
+    # Drive item ID when known, the local path for ad-hoc files
+    return item.get("id") or item.get("local_path")
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def run_stage(stage, upstream, maxsize, name, stop_event):
+    """
+    Run `stage(upstream)` (a generator function) in a background thread and
+    return a generator over its output, buffered by a queue of `maxsize`.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+
+    def put(value):
+        while not stop_event.is_set():
+            try:
+                buffer.put(value, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            for value in stage(upstream):
+                if not put(value):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(_StageError(e))
+
+    threading.Thread(target=worker, name=f"ingest-{name}", daemon=True).start()
+
+    def consume():
+        while True:
+            value = buffer.get()
+            if value is _DONE:
+                return
+            if isinstance(value, _StageError):
+                raise value.exc
+            yield value
+
+    return consume()
+
+
+class IngestionPipeline:
+    """
+    Streams drive items through download, parse, split, embed and upsert.
+    The embedding model and vector store are supplied once per run; chunks
+    from many files are embedded together in batches of `embed_batch_size`.
+    An optional keyword index receives the same upserts and deletes, and an
+    optional `progress(stats)` callback is invoked from the stages as work
+    completes (raising from it aborts the run).
+    """
+
+    def __init__(self, embeddings, vectorstore, downloader, load_document, text_splitter,
+                 embed_batch_size=256, download_window=8, queue_size=4,
+                 parallel_loaders=None, parse_workers=1, keyword_index=None, progress=None,
+                 agent_id=None, split_loaders=None):
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.keyword_index = keyword_index
+        self.progress = progress
+        self.agent = metrics.agent_label(agent_id)
+        self.downloader = downloader
+        self.load_document = load_document
+        self.text_splitter = text_splitter
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.download_window = max(1, download_window)
+        self.queue_size = max(1, queue_size)
+        # {".ext": picklable loader} run in a process pool of parse_workers
+        self.parallel_loaders = parallel_loaders or {}
+        # {".ext": planner(path) -> [picklable loader, ...]} for formats whose
+        # files can be split, e.g. PDFs by page range; the parts run in the pool
+        self.split_loaders = split_loaders or {}
+        self.parse_workers = max(1, parse_workers)
+        self._parse_pool = None
+        self.stats = {"files": 0, "chunks": 0, "failed": 0, "stale_deleted": 0, "embed_seconds": 0.0,
+                      "downloaded": 0, "parsed": 0}
+
+    # --- Stages ---
+
+    def download_stage(self, items):
+        window = []
+        for item in items:
+            window.append(item)
+            if len(window) >= self.download_window:
+                yield from self._download(window)
+                window = []
+        if window:
+            yield from self._download(window)
+
+    def _download(self, window):
+        self.downloader.download(window)
+        for item in window:
+            if item.get("local_path"):
+                self.stats["downloaded"] += 1
+            else:
+                self.stats["failed"] += 1
+        self._report()
+        for item in window:
+            if item.get("local_path"):
+                yield item
+
+    def _submit_parse(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        planner = self.split_loaders.get(extension)
+        if planner and self._parse_pool:
+            started = time.perf_counter()
+            try:
+                parts = planner(path)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+            if len(parts) > 1:
+                return gather_loads([self._parse_pool.submit(timed_load, part, path) for part in parts], started)
+
+        loader = self.parallel_loaders.get(extension)
+        if loader and self._parse_pool:
+            return self._parse_pool.submit(timed_load, loader, path)
+
+        future = Future()
+        try:
+            future.set_result(timed_load(self.load_document, path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def parse_stage(self, items):
+        """
+        Parse files in the process pool, keeping at most 2x workers in flight
+        and yielding results in submission order.
+        """
+        in_flight = deque()
+        window = self.parse_workers * 2
+        for item in items:
+            print(f"Loading {item['local_path']}...")
+            in_flight.append((item, self._submit_parse(item["local_path"])))
+            if len(in_flight) >= window:
+                yield from self._collect_parsed(*in_flight.popleft())
+        while in_flight:
+            yield from self._collect_parsed(*in_flight.popleft())
+
+    def _collect_parsed(self, item, future):
+        try:
+            docs, seconds = future.result()
+        except Exception as e:
+            print(f"Error loading {item['local_path']}: {e}")
+            self.stats["failed"] += 1
+            return
+        extension = os.path.splitext(item["local_path"])[1].lower() or "none"
+        metrics.PARSE_SECONDS.labels(self.agent, extension).observe(seconds)
+        self.stats["parsed"] += 1
+        self._report()
+        yield item, docs
+
+    def split_stage(self, parsed):
+        for item, docs in parsed:
+            chunks = self.text_splitter.split_documents(docs) if docs else []
+            key = item_key(item)
+            # Downloads are stored under their content hash; cite drive files by their path instead
+            source = (item.get("local_path_rel") or item.get("name")) if item.get("id") else None
+            for ordinal, chunk in enumerate(chunks):
+                if source:
+                    chunk.metadata["source"] = source
+                chunk.metadata["item_id"] = key
+                chunk.metadata["chunk_index"] = ordinal
+                chunk.id = chunk_id(key, ordinal, chunk.page_content)
+            item["chunk_ids"] = [chunk.id for chunk in chunks]
+            metrics.CHUNKS.labels(self.agent).inc(len(chunks))
+            yield item, chunks
+
+    def embed_stage(self, split):
+        """
+        Accumulate chunks across files and embed/upsert them in full batches.
+        Yields each item once all of its chunks are persisted.
+        """
+        # [item, chunks not yet persisted], in arrival order
+        pending_items = []
+        buffer = []
+        for item, chunks in split:
+            pending_items.append([item, len(chunks)])
+            buffer.extend(chunks)
+            while len(buffer) >= self.embed_batch_size:
+                batch, buffer = buffer[:self.embed_batch_size], buffer[self.embed_batch_size:]
+                self._flush(batch)
+                yield from self._completed(pending_items, len(batch))
+            yield from self._completed(pending_items, 0)
+
+        if buffer:
+            self._flush(buffer)
+            yield from self._completed(pending_items, len(buffer))
+
+    def _completed(self, pending_items, flushed):
+        """Credit `flushed` chunks to the oldest items and pop finished ones."""
+        while pending_items:
+            entry = pending_items[0]
+            credit = min(entry[1], flushed)
+            entry[1] -= credit
+            flushed -= credit
+            if entry[1] > 0:
+                return
+            pending_items.pop(0)
+            self.delete_stale(entry[0])
+            self.stats["files"] += 1
+            self._report()
+            yield entry[0]
+
+    def _flush(self, batch):
+        texts = [doc.page_content for doc in batch]
+
+        t0 = time.time()
+        vectors = self.embeddings.embed_documents(texts)
+        elapsed = time.time() - t0
+        self.stats["embed_seconds"] += elapsed
+        metrics.EMBED_BATCH_SECONDS.labels(self.agent).observe(elapsed)
+
+        t0 = time.time()
+        self.upsert(batch, vectors)
+        metrics.CHROMA_UPSERT_SECONDS.labels(self.agent).observe(time.time() - t0)
+        self.stats["chunks"] += len(batch)
+        self._report()
+
+    def upsert(self, docs, vectors):
+        self.vectorstore._collection.upsert(
+            ids=[doc.id for doc in docs],
+            embeddings=vectors,
+            documents=[doc.page_content for doc in docs],
+            metadatas=[doc.metadata for doc in docs]
+        )
+        if self.keyword_index is not None:
+            self.keyword_index.upsert(
+                [doc.id for doc in docs],
+                [doc.page_content for doc in docs],
+                [doc.metadata for doc in docs]
+            )
+
+    def delete_stale(self, item):
+        """
+        Remove chunks left over from an earlier version of the file: chunks of
+        this item whose ID is no longer produced, plus legacy random-ID chunks
+        that were indexed under the same source path before item IDs existed.
+        """
+        keep = set(item.get("chunk_ids", []))
+        collection = self.vectorstore._collection
+
+        stale = [cid for cid in collection.get(where={"item_id": item_key(item)}, include=[])["ids"]
+                 if cid not in keep]
+
+        source = item.get("local_path")
+        if source:
+            legacy = collection.get(where={"source": source}, include=["metadatas"])
+            stale += [cid for cid, meta in zip(legacy["ids"], legacy["metadatas"])
+                      if not (meta or {}).get("item_id") and cid not in keep]
+
+        if stale:
+            collection.delete(ids=stale)
+            if self.keyword_index is not None:
+                self.keyword_index.delete(stale)
+            self.stats["stale_deleted"] += len(stale)
+
+    def _report(self):
+        if self.progress is not None:
+            self.progress(dict(self.stats))
+
+    # --- Driver ---
+
+    def run(self, items):
+        """
+        Push `items` (any iterable, e.g. the crawler generator) through every
+        stage. Yields items as they are fully indexed.
+        """
+        stop_event = threading.Event()
+        stream = iter(items)
+        if self.parse_workers > 1 and (self.parallel_loaders or self.split_loaders):
+            # spawn, not fork: the parent may already hold torch and its threads
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        try:
+            stream = run_stage(self.download_stage, stream, self.queue_size, "download", stop_event)
+            stream = run_stage(self.parse_stage, stream, self.queue_size, "parse", stop_event)
+            stream = run_stage(self.split_stage, stream, self.queue_size, "split", stop_event)
+            yield from self.embed_stage(stream)
+        finally:
+            stop_event.set()
+            if self._parse_pool:
+                self._parse_pool.shutdown(wait=False, cancel_futures=True)
+                self._parse_pool = None
+
+    def summary(self):
+        s = self.stats
+        rate = s["chunks"] / s["embed_seconds"] if s["embed_seconds"] else 0.0
+        return (f"{s['files']} files indexed, {s['failed']} failed, {s['chunks']} chunks "
+                f"({rate:.1f} chunks/s embedding), {s['stale_deleted']} stale chunks removed")
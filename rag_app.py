@@ -2,7 +2,7 @@ import os
 import sys
 from config import GOOGLE_API_KEY, PERSIST_DIRECTORY
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import model_registry
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
@@ -18,7 +18,7 @@ def main():
         return
 
     print("Loading vector store...")
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings = model_registry.get_embeddings()
     vectorstore = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
     
     # Setup Retriever
@@ -0,0 +1,105 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, List
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from config import RERANK_BATCH_SIZE, RERANK_WORKERS
+import metrics
+
+# Cross-encoder reranking over a wider candidate set. The base retriever
+# returns `candidates` chunks, a small cross-encoder scores (query, chunk)
+# pairs in batches on CPU and the best `top_n` are kept. Scoring runs under a
+# hard time budget: when it is exceeded (or scoring fails) the query gets the
+# first `top_n` chunks in retriever order instead, and the unfinished scoring
+# stops at the next batch boundary.
+
+# Few workers on purpose: each scoring call already uses every torch thread,
+# and queued work that waits too long simply falls back.
+_rerank_executor = ThreadPoolExecutor(max_workers=RERANK_WORKERS, thread_name_prefix="rerank")
+
+
+class RerankingRetriever(BaseRetriever):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: Any
+    cross_encoder: Any
+    top_n: int = 3
+    budget_ms: int = 250
+    batch_size: int = RERANK_BATCH_SIZE
+
+    _stats: dict = PrivateAttr(default_factory=lambda: {"queries": 0, "reranked": 0, "fallbacks": 0,
+                                                          "candidates": 0, "rerank_seconds": 0.0})
+    _stats_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _score(self, query, docs, cancelled):
+        scores = []
+        for start in range(0, len(docs), self.batch_size):
+            if cancelled.is_set():
+                return None
+            batch = docs[start:start + self.batch_size]
+            scores.extend(self.cross_encoder.predict([(query, doc.page_content) for doc in batch]))
+        return scores
+
+    def _order(self, docs, scores):
+        ranked = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [docs[i] for i in ranked[:self.top_n]]
+
+    def _record(self, candidates, reranked, seconds):
+        metrics.record_stage("rerank", seconds)
+        with self._stats_lock:
+            self._stats["queries"] += 1
+            self._stats["candidates"] += candidates
+            self._stats["reranked" if reranked else "fallbacks"] += 1
+            self._stats["rerank_seconds"] += seconds
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs = self.base_retriever.invoke(query)
+        if len(docs) <= 1:
+            return docs[:self.top_n]
+
+        t0 = time.perf_counter()
+        cancelled = threading.Event()
+        future = _rerank_executor.submit(self._score, query, docs, cancelled)
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000)
+        except FutureTimeout:
+            cancelled.set()
+            scores = None
+        except Exception as e:
+            # A scoring failure (model, tokenizer) costs the query its ranking, not its answer
+            print(f"Reranking failed ({e}), keeping retriever order")
+            scores = None
+        self._record(len(docs), scores is not None, time.perf_counter() - t0)
+        return self._order(docs, scores) if scores is not None else docs[:self.top_n]
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs = await self.base_retriever.ainvoke(query)
+        if len(docs) <= 1:
+            return docs[:self.top_n]
+
+        t0 = time.perf_counter()
+        cancelled = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(_rerank_executor, self._score, query, docs, cancelled)
+        try:
+            scores = await asyncio.wait_for(future, timeout=self.budget_ms / 1000)
+        except asyncio.TimeoutError:
+            cancelled.set()
+            scores = None
+        except Exception as e:
+            # A scoring failure (model, tokenizer) costs the query its ranking, not its answer
+            print(f"Reranking failed ({e}), keeping retriever order")
+            scores = None
+        self._record(len(docs), scores is not None, time.perf_counter() - t0)
+        return self._order(docs, scores) if scores is not None else docs[:self.top_n]
+
+    def stats(self):
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["top_n"] = self.top_n
+        s["budget_ms"] = self.budget_ms
+        s["avg_candidates"] = s["candidates"] / s["queries"] if s["queries"] else 0.0
+        s["fallback_rate"] = s["fallbacks"] / s["queries"] if s["queries"] else 0.0
+        return s
@@ -83,14 +83,7 @@ function addMessage(text, type, sources = []) {
     let content = `<div>${text}</div>`;
 
     if (sources && sources.length > 0) {
-        // Unique sources
-        // Unique sources
-        const uniqueSources = [...new Set(sources)];
-        const sourceLinks = uniqueSources.map(s => {
-            const filename = s.split('/').pop();
-            return `<a href="/files/${encodeURIComponent(filename)}" target="_blank" style="color: #4ade80; text-decoration: underline;">${filename}</a>`;
-        });
-        content += `<div class="sources">Sources: ${sourceLinks.join(', ')}</div>`;
+        content += `<div class="sources">${renderSources(sources)}</div>`;
     }
 
     div.innerHTML = content;
@@ -99,6 +92,20 @@ function addMessage(text, type, sources = []) {
     return div;
 }
 
+// Helper to render source links
+function renderSources(sources, files = []) {
+    // Files carry a link to the stored copy; older answers only have names
+    const entries = files.length > 0 ? files : [...new Set(sources)].map(name => ({ name, url: null }));
+    const sourceLinks = entries.map(f => {
+        const filename = f.name.split('/').pop();
+        if (!f.url) {
+            return `<span title="${f.name}">${filename}</span>`;
+        }
+        return `<a href="${f.url}" target="_blank" title="${f.name}" style="color: #4ade80; text-decoration: underline;">${filename}</a>`;
+    });
+    return `Sources: ${sourceLinks.join(', ')}`;
+}
+
 // Helper to add typing indicator
 function addTypingIndicator() {
     const div = document.createElement('div');
@@ -385,8 +392,11 @@ ingestBtn.addEventListener('click', async () => {
             body: JSON.stringify({ agent_id: currentAgentId })
         });
         const data = await res.json();
-        log(data.message);
-        log('(Check server terminal for detailed progress)');
+        if (res.status === 409) {
+            log(data.detail.message);
+        } else {
+            log(data.message);
+        }
     } catch (e) {
         log('Error starting ingestion.');
     } finally {
@@ -431,8 +441,8 @@ function pollIngestionStatus() {
                 ingestBtn.disabled = false;
                 ingestBtn.style.opacity = '1';
                 setTimeout(() => clearInterval(pollingInterval), 5000); // Stop polling after success
-            } else if (data.status === 'failed') {
-                statusDiv.style.color = '#ef4444'; // red
+            } else if (data.status === 'failed' || data.status === 'cancelled') {
+                statusDiv.style.color = data.status === 'failed' ? '#ef4444' : '#9ca3af'; // red / gray
                 ingestBtn.disabled = false;
                 ingestBtn.style.opacity = '1';
                 clearInterval(pollingInterval);
@@ -445,6 +455,33 @@ function pollIngestionStatus() {
 }
 
 // Chat Logic
+// Parse a Server-Sent Events stream from a fetch() response body
+async function readEventStream(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 async function sendMessage() {
     const text = chatInput.value.trim();
     if (!text) return;
@@ -452,10 +489,16 @@ async function sendMessage() {
     addMessage(text, 'user');
     chatInput.value = '';
 
-    const loading = addTypingIndicator();
+    let loading = addTypingIndicator();
+    const removeLoading = () => {
+        if (loading) {
+            chatHistory.removeChild(loading);
+            loading = null;
+        }
+    };
 
     try {
-        const res = await fetch('/api/chat', {
+        const res = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ query: text, agent_id: currentAgentId })
@@ -466,11 +509,42 @@ async function sendMessage() {
             throw new Error(err.detail || 'Failed to get answer');
         }
 
-        const data = await res.json();
-        chatHistory.removeChild(loading);
-        addMessage(data.answer, 'ai', data.sources);
+        // Message bubble is filled in as tokens arrive
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message ai';
+        const answerDiv = document.createElement('div');
+        answerDiv.style.whiteSpace = 'pre-wrap';
+        const sourcesDiv = document.createElement('div');
+        sourcesDiv.className = 'sources';
+        sourcesDiv.style.display = 'none';
+        messageDiv.appendChild(answerDiv);
+        messageDiv.appendChild(sourcesDiv);
+
+        await readEventStream(res, (event, data) => {
+            if (event === 'sources') {
+                if (data.sources && data.sources.length > 0) {
+                    sourcesDiv.innerHTML = renderSources(data.sources, data.files || []);
+                    sourcesDiv.style.display = 'block';
+                }
+            } else if (event === 'token') {
+                if (loading) {
+                    removeLoading();
+                    chatHistory.appendChild(messageDiv);
+                }
+                answerDiv.textContent += data.text;
+                chatHistory.scrollTop = chatHistory.scrollHeight;
+            } else if (event === 'error') {
+                throw new Error(data.detail || 'Failed to get answer');
+            }
+        });
+
+        if (loading) {
+            // Stream ended without any tokens
+            removeLoading();
+            chatHistory.appendChild(messageDiv);
+        }
     } catch (e) {
-        chatHistory.removeChild(loading);
+        removeLoading();
         addMessage(`Error: ${e.message}`, 'ai');
     }
 }
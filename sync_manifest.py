@@ -0,0 +1,129 @@
+import os
+import json
+from config import PERSIST_DIRECTORY
+
+# The manifest lives next to the agent's Chroma directory:
+#   chroma_db/<agent_id>/            <- vector store
+#   chroma_db/<agent_id>.manifest.json
+# It records every indexed drive item (with its eTag/cTag), the Graph delta
+# link and the file selection (types, include/exclude rules) it was built
+# for, so that the next ingestion only touches what changed.
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(agent_id):
+    return os.path.join(PERSIST_DIRECTORY, f"{agent_id}.manifest.json")
+
+
+def empty_manifest(root_id=None):
+    return {
+        "version": MANIFEST_VERSION,
+        "root_id": root_id,
+        "delta_link": None,
+        "filter": None,
+        "folders": {},
+        "items": {}
+    }
+
+
+class ManifestUnavailable(Exception):
+    """The agent has a manifest, but it cannot be read or has an old format."""
+
+
+def read_manifest(agent_id):
+    """
+    The agent's manifest as stored, or None when it has none. Raises
+    ManifestUnavailable instead of passing off a broken manifest as empty.
+    """
+    path = manifest_path(agent_id)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        raise ManifestUnavailable(f"Unreadable manifest {path}: {e}")
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ManifestUnavailable(f"Manifest {path} has an old format")
+    return manifest
+
+
+def load_manifest(agent_id, root_id=None):
+    """
+    Load the manifest for an agent. A missing, unreadable or outdated manifest,
+    or one recorded for a different target folder, yields an empty manifest.
+    """
+    try:
+        manifest = read_manifest(agent_id)
+    except ManifestUnavailable as e:
+        print(f"{e}, starting a full sync.")
+        return empty_manifest(root_id)
+    if manifest is None:
+        return empty_manifest(root_id)
+
+    if root_id and manifest.get("root_id") != root_id:
+        print(f"Target folder changed for agent {agent_id}, starting a full sync.")
+        return empty_manifest(root_id)
+
+    return manifest
+
+
+def root_changed(agent_id, root_id):
+    """True when the agent's manifest was recorded for a different target folder."""
+    try:
+        manifest = read_manifest(agent_id)
+    except ManifestUnavailable:
+        return False
+    return manifest is not None and manifest.get("root_id") != root_id
+
+
+def save_manifest(agent_id, manifest):
+    os.makedirs(PERSIST_DIRECTORY, exist_ok=True)
+    path = manifest_path(agent_id)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def delete_manifest(agent_id):
+    path = manifest_path(agent_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def item_version(item):
+    """
+    Version marker used to decide whether a file's content changed.
+    cTag only changes with content; eTag and lastModified also change on
+    metadata edits, so they are only used as fallbacks.
+    """
+    return item.get("cTag") or item.get("eTag") or item.get("lastModifiedDateTime")
+
+
+def manifest_entry(item):
+    return {
+        "name": item.get("name"),
+        "version": item_version(item),
+        "size": item.get("size"),
+        "lastModifiedDateTime": item.get("lastModifiedDateTime"),
+        "parent_id": item.get("parentReference", {}).get("id"),
+        "local_path_rel": item.get("local_path_rel"),
+        "local_path": item.get("local_path"),
+        "blob": item.get("blob")
+    }
+
+
+def is_changed(manifest, item):
+    entry = manifest["items"].get(item.get("id"))
+    if not entry or not entry.get("blob"):
+        # Files indexed before the blob store have no trustworthy local copy
+        return True
+    return entry.get("version") != item_version(item)
+
+
+def has_unstored_items(manifest):
+    return any(not entry.get("blob") for entry in manifest["items"].values())
@@ -0,0 +1,27 @@
+from answer_cache import SemanticAnswerCache, identifier_tokens
+
+VECTOR = [0.6, 0.8, 0.0]
+NEARBY = [0.6, 0.79, 0.02]
+
+
+def test_identifier_tokens():
+    assert identifier_tokens("Torque for part A-123 rev 2.5 (2024)?") == {"a-123", "2.5", "2024"}
+    assert identifier_tokens("How do I reset the pump?") == frozenset()
+
+
+def test_semantic_hit_requires_same_identifiers():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("agent", "status of order A123", VECTOR, {"answer": "shipped"})
+
+    assert cache.lookup("agent", "Status of order a123?", NEARBY) == {"answer": "shipped"}
+    assert cache.lookup("agent", "status of order A124", VECTOR) is None
+    assert cache.lookup("agent", "status of order A123 and A124", VECTOR) is None
+    assert cache.stats()["identifier_mismatches"] == 2
+
+
+def test_queries_without_identifiers_match_on_similarity():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("agent", "how do I reset the pump", VECTOR, {"answer": "hold the button"})
+
+    assert cache.lookup("agent", "how can I reset the pump", NEARBY) == {"answer": "hold the button"}
+    assert cache.lookup("agent", "how do I reset pump 2", VECTOR) is None
@@ -0,0 +1,47 @@
+import os
+import hashlib
+import pytest
+import blob_store
+import sync_manifest
+
+
+class StubAgents:
+    def __init__(self, agents):
+        self.agents = agents
+
+    def get(self):
+        return self.agents
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_manifest, "PERSIST_DIRECTORY", str(tmp_path / "data"))
+    monkeypatch.setattr(blob_store, "agents_store", StubAgents([{"id": "a"}, {"id": "b"}]))
+    store = blob_store.BlobStore(str(tmp_path / "downloads"))
+    for item_id in ("item-a", "item-b"):
+        path, f = store.open_temp()
+        with f:
+            f.write(item_id.encode())
+        blob, _ = store.commit(path, hashlib.sha256(item_id.encode()).hexdigest(), f"{item_id}.txt")
+        store.record({item_id: {"blob": blob, "name": f"{item_id}.txt"}})
+    manifest = sync_manifest.empty_manifest()
+    manifest["items"] = {"item-a": {}}
+    sync_manifest.save_manifest("a", manifest)
+    return store
+
+
+def test_collects_items_no_manifest_lists(store):
+    stats = store.collect_garbage(blob_store.referenced_items(), grace_seconds=-1)
+
+    assert stats["items_removed"] == 1
+    assert store.path_of("item-a") and not store.lookup("item-b")
+
+
+def test_unreadable_manifest_stops_collection(store):
+    with open(sync_manifest.manifest_path("b"), "w") as f:
+        f.write("{truncated")
+
+    with pytest.raises(sync_manifest.ManifestUnavailable):
+        store.collect_garbage(blob_store.referenced_items(), grace_seconds=-1)
+    assert store.path_of("item-a") and store.path_of("item-b")
+    assert os.path.exists(sync_manifest.manifest_path("b"))
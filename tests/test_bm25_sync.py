@@ -0,0 +1,108 @@
+import os
+import bm25_index
+import compact_index
+import ingest
+import sync_manifest
+
+
+class StubCollection:
+    """The parts of a Chroma collection that deletion and the BM25 backfill use."""
+
+    def __init__(self, chunks):
+        # id -> (document, metadata)
+        self.chunks = dict(chunks)
+
+    def count(self):
+        return len(self.chunks)
+
+    def get(self, where=None, include=None, limit=None, offset=0):
+        rows = [(cid, doc, meta) for cid, (doc, meta) in self.chunks.items()
+                if not where or all(meta.get(k) == v for k, v in where.items())]
+        rows = rows[offset:offset + limit if limit else None]
+        return {"ids": [r[0] for r in rows], "documents": [r[1] for r in rows], "metadatas": [r[2] for r in rows]}
+
+    def delete(self, ids):
+        for cid in ids:
+            self.chunks.pop(cid, None)
+
+
+class StubVectorStore:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def get(self, include=None):
+        return self._collection.get(include=include)
+
+    def delete(self, ids):
+        self._collection.delete(ids)
+
+
+def test_deleting_files_from_legacy_store_keeps_bm25_backfill(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "PERSIST_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(bm25_index, "PERSIST_DIRECTORY", str(tmp_path))
+    os.makedirs(tmp_path / "legacy")
+    collection = StubCollection({
+        f"{item}:{n}": (f"chunk {n} of {item} about torque settings", {"item_id": item, "chunk_index": n})
+        for item in ("A", "B", "C") for n in range(2)
+    })
+    monkeypatch.setattr(ingest, "open_vectorstore", lambda agent_id, embeddings=None: StubVectorStore(collection))
+
+    # A store indexed before the keyword index existed
+    assert not bm25_index.KeywordIndex.exists("legacy")
+    ingest.remove_indexed_items("legacy", {"A": {"local_path": None}})
+    assert not bm25_index.KeywordIndex.exists("legacy")
+
+    keyword_index = bm25_index.open_for_agent("legacy", collection)
+    try:
+        assert keyword_index.count() == collection.count() == 4
+    finally:
+        keyword_index.close()
+
+
+def test_changing_the_target_folder_drops_the_old_folders_chunks(tmp_path, monkeypatch):
+    for module in (ingest, bm25_index, sync_manifest):
+        monkeypatch.setattr(module, "PERSIST_DIRECTORY", str(tmp_path))
+    os.makedirs(tmp_path / "agent")
+    collection = StubCollection({
+        f"{item}:0": (f"chunk of {item} from the old folder", {"item_id": item, "chunk_index": 0})
+        for item in ("A", "B")
+    })
+    monkeypatch.setattr(ingest, "open_vectorstore", lambda agent_id, embeddings=None: StubVectorStore(collection))
+    bm25_index.open_for_agent("agent", collection).close()
+    manifest = sync_manifest.empty_manifest("old-folder")
+    manifest["items"] = {"A": {}, "B": {}}
+    sync_manifest.save_manifest("agent", manifest)
+    # The new folder is empty
+    monkeypatch.setattr(ingest, "collect_delta_changes", lambda *args, **kwargs: ([], set(), {}, "delta-link"))
+
+    ingest.sync_incremental(None, "drive", "new-folder", "agent")
+
+    keyword_index = bm25_index.KeywordIndex.for_agent("agent")
+    try:
+        assert collection.count() == keyword_index.count() == 0
+    finally:
+        keyword_index.close()
+    assert sync_manifest.load_manifest("agent")["root_id"] == "new-folder"
+
+
+def test_compacting_removes_duplicates_from_the_keyword_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(compact_index, "PERSIST_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(bm25_index, "PERSIST_DIRECTORY", str(tmp_path))
+    os.makedirs(tmp_path / "agent")
+    (tmp_path / "agent" / "chroma.sqlite3").touch()
+    # Each chunk appended twice under random IDs before chunk IDs were deterministic
+    collection = StubCollection({
+        f"{copy}-{n}": (f"chunk {n} about torque settings", {"item_id": "A", "chunk_index": n})
+        for copy in ("first", "second") for n in range(3)
+    })
+    monkeypatch.setattr(compact_index, "Chroma", lambda persist_directory: StubVectorStore(collection))
+    bm25_index.open_for_agent("agent", collection).close()
+
+    assert compact_index.compact_agent("agent") == 3
+
+    keyword_index = bm25_index.KeywordIndex.for_agent("agent")
+    try:
+        assert keyword_index.count() == collection.count() == 3
+        assert {doc_id for doc_id, *_ in keyword_index.search("torque", 10)} == set(collection.chunks)
+    finally:
+        keyword_index.close()
@@ -0,0 +1,52 @@
+import embedding_cache
+from embedding_cache import EmbeddingCache, ROW_OVERHEAD_BYTES
+
+DIM = 8
+ROW_BYTES = DIM * 4 + ROW_OVERHEAD_BYTES
+
+
+def put(cache, start, n):
+    cache.put_many("m", [(f"k{i}", [float(i)] * DIM) for i in range(start, start + n)])
+
+
+def test_inserts_under_budget_do_not_scan_the_table(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=ROW_BYTES * 100)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    put(cache, 0, 10)
+
+    assert not [sql for sql in statements if "COUNT(*)" in sql]
+    assert cache.stats()["entries"] == 10
+
+
+def test_evicts_least_recently_used_past_the_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "TOUCH_RESOLUTION_SECONDS", -1)
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, max_bytes=ROW_BYTES * 10)
+    put(cache, 0, 8)
+    cache.get_many("m", ["k0"])
+    put(cache, 8, 4)
+
+    stats = cache.stats()
+    assert stats["entries"] <= 10 and stats["evictions"] > 0
+    assert "k0" in cache.get_many("m", ["k0"])
+    # A reopened cache starts from the stored counts
+    assert EmbeddingCache(path, max_bytes=ROW_BYTES * 10)._size_bytes() == (stats["approx_bytes"], stats["entries"])
+
+
+def test_hits_are_not_written_until_the_next_insert(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=ROW_BYTES * 100)
+    put(cache, 0, 4)
+    cache._conn.execute("UPDATE embeddings SET last_used = 0")
+    cache._conn.commit()
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    for _ in range(3):
+        assert len(cache.get_many("m", ["k0", "k1"])) == 2
+    assert not [sql for sql in statements if sql.startswith(("UPDATE", "COMMIT"))]
+
+    put(cache, 4, 1)
+    stamps = dict(cache._conn.execute("SELECT key, last_used FROM embeddings").fetchall())
+    assert stamps["k0"] > 0 and stamps["k1"] > 0 and stamps["k2"] == 0
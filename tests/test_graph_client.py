@@ -0,0 +1,171 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import graph_client
+from benchmarks import fake_graph
+
+
+class ScriptedGraph:
+    """
+    http.server stand-in that answers each path from a script of
+    (status, headers, body) responses, repeating the last one, and records
+    the Authorization header of every request.
+    """
+
+    def __init__(self, scripts):
+        self.scripts = {path: list(responses) for path, responses in scripts.items()}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1.0"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def next_response(self, path, auth, body):
+        with self._lock:
+            self.requests.append((path, auth, body))
+            script = self.scripts[path]
+            response = script.pop(0) if len(script) > 1 else script[0]
+        return response(body) if callable(response) else response
+
+    def _handler_class(self):
+        graph = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, headers, payload = graph.next_response(
+                    self.path.split("/v1.0/", 1)[1], self.headers.get("Authorization"), body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class CountingTokenCache:
+    """Hands out token-1, token-2, ... and counts invalidations."""
+
+    def __init__(self):
+        self.issued = 1
+        self.invalidations = 0
+
+    def get_token(self):
+        return f"token-{self.issued}"
+
+    def invalidate(self):
+        self.invalidations += 1
+        self.issued += 1
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(graph_client.time, "sleep", delays.append)
+    return delays
+
+
+def make_client(base_url, token_cache=None, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    kwargs.setdefault("max_backoff", 0.05)
+    return graph_client.GraphClient(token_cache=token_cache or CountingTokenCache(), base_url=base_url, **kwargs)
+
+
+@pytest.fixture
+def scripted():
+    servers = []
+
+    def start(scripts):
+        servers.append(ScriptedGraph(scripts))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_429_waits_for_retry_after_beyond_max_backoff(scripted, sleeps):
+    server = scripted({"me": [(429, {"Retry-After": "120"}, {}), (200, {}, {"id": "me"})]})
+    client = make_client(server.base_url)
+
+    assert client.get_json("me") == {"id": "me"}
+    assert sleeps == [120.0]
+
+
+def test_401_refreshes_token_once(scripted, sleeps):
+    server = scripted({"me": [(401, {}, {}), (200, {}, {"id": "me"})]})
+    tokens = CountingTokenCache()
+
+    assert make_client(server.base_url, tokens).get_json("me") == {"id": "me"}
+    assert tokens.invalidations == 1
+    assert [auth for _, auth, _ in server.requests] == ["Bearer token-1", "Bearer token-2"]
+    assert sleeps == []
+
+
+def test_repeated_401_raises(scripted, sleeps):
+    server = scripted({"me": [(401, {}, {})]})
+    tokens = CountingTokenCache()
+
+    with pytest.raises(requests.HTTPError):
+        make_client(server.base_url, tokens).get("me")
+    assert tokens.invalidations == 1
+    assert len(server.requests) == 2
+
+
+def test_5xx_retries_with_capped_exponential_backoff(scripted, sleeps):
+    server = scripted({"me": [(503, {}, {}), (502, {}, {}), (500, {}, {}), (200, {}, {"id": "me"})]})
+
+    assert make_client(server.base_url).get_json("me") == {"id": "me"}
+    assert len(sleeps) == 3
+    assert all(0 < delay <= 0.05 for delay in sleeps)
+
+
+def test_5xx_raises_once_retries_are_exhausted(scripted, sleeps):
+    server = scripted({"me": [(503, {}, {})]})
+
+    with pytest.raises(requests.HTTPError):
+        make_client(server.base_url, max_retries=2).get("me")
+    assert len(server.requests) == 3
+
+
+def test_batch_retries_throttled_sub_requests_in_order(tmp_path, sleeps):
+    drive = fake_graph.FakeDrive(str(tmp_path), num_files=2, num_folders=1, tables=0)
+    server = fake_graph.FakeGraphServer(drive, throttle_every=3, retry_after=7).start()
+    try:
+        client = make_client(server.graph_url, fake_graph.StaticTokenCache())
+        paths = [f"drives/{fake_graph.DRIVE_ID}/root"] * 25
+        results = client.batch(paths)
+    finally:
+        server.stop()
+
+    assert server.stats["throttled"] > 0
+    assert results == [(200, {"id": fake_graph.ROOT_ID})] * 25
+    assert sleeps and all(delay == 7.0 for delay in sleeps)
+
+
+def test_batch_fills_sub_requests_missing_from_the_response(scripted, sleeps):
+    def answer_first_only(body):
+        first = body["requests"][0]
+        return 200, {}, {"responses": [{"id": first["id"], "status": 200, "body": {"url": first["url"]}}]}
+
+    server = scripted({"$batch": [answer_first_only]})
+    results = make_client(server.base_url).batch(["a", "b", "c"])
+
+    assert results == [(200, {"url": "/a"}), (None, None), (None, None)]
@@ -0,0 +1,56 @@
+import contextvars
+from langchain_core.documents import Document
+import hybrid_retriever
+from hybrid_retriever import HybridRetriever, use_prefetched
+
+
+class StubCollection:
+    def query(self, query_embeddings, n_results, include):
+        n = len(query_embeddings)
+        return {"ids": [["p"]] * n, "documents": [["prefetched"]] * n, "metadatas": [[{}]] * n}
+
+
+class StubVectorStore:
+    def __init__(self):
+        self._collection = StubCollection()
+        self.searches = 0
+
+    def similarity_search(self, query, k):
+        self.searches += 1
+        return [Document(page_content="searched")]
+
+
+def in_batch(batch_id, fn, *args):
+    def run():
+        use_prefetched(batch_id)
+        return fn(*args)
+    return contextvars.copy_context().run(run)
+
+
+def make_retriever():
+    store = StubVectorStore()
+    return HybridRetriever(vectorstore=store, k=1), store
+
+
+def test_prefetched_results_are_only_used_by_their_batch():
+    retriever, store = make_retriever()
+    retriever.prefetch(["q"], [[1.0, 0.0]], "batch-1")
+
+    assert retriever.invoke("q")[0].page_content == "searched"
+    assert in_batch("batch-2", retriever.invoke, "q")[0].page_content == "searched"
+    assert in_batch("batch-1", retriever.invoke, "q")[0].page_content == "prefetched"
+    # Taken once
+    assert in_batch("batch-1", retriever.invoke, "q")[0].page_content == "searched"
+    assert store.searches == 3
+
+
+def test_expired_and_cleared_results_are_searched_again(monkeypatch):
+    retriever, store = make_retriever()
+    retriever.prefetch(["a"], [[1.0, 0.0]], "batch")
+    retriever.clear_prefetched()
+    monkeypatch.setattr(hybrid_retriever, "PREFETCH_TTL_SECONDS", -1)
+    retriever.prefetch(["b"], [[1.0, 0.0]], "batch")
+
+    assert in_batch("batch", retriever.invoke, "a")[0].page_content == "searched"
+    assert in_batch("batch", retriever.invoke, "b")[0].page_content == "searched"
+    assert store.searches == 2
@@ -0,0 +1,63 @@
+import os
+import pytest
+import bm25_index
+import graph_client
+import ingest
+import ingest_jobs
+import sync_manifest
+from benchmarks import fake_graph
+
+AGENT_ID = "cancel-test"
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_manifest, "PERSIST_DIRECTORY", str(tmp_path / "data"))
+    monkeypatch.setattr(ingest, "PERSIST_DIRECTORY", str(tmp_path / "data"))
+    monkeypatch.setattr(bm25_index, "PERSIST_DIRECTORY", str(tmp_path / "data"))
+    monkeypatch.setattr(ingest, "UPLOAD_DIR", str(tmp_path / "downloads"))
+    corpus = fake_graph.FakeDrive(str(tmp_path / "corpus"), num_files=30, num_folders=3, tables=0)
+    server = fake_graph.FakeGraphServer(corpus, page_size=10).start()
+    monkeypatch.setattr(graph_client, "_client", graph_client.GraphClient(
+        token_cache=fake_graph.StaticTokenCache(), base_url=server.graph_url))
+    yield corpus
+    server.stop()
+
+
+def cancel_when(predicate):
+    calls = []
+
+    def progress(phase, counters):
+        calls.append(phase)
+        if predicate(phase, counters):
+            raise ingest_jobs.IngestCancelled()
+
+    return progress, calls
+
+
+def test_cancel_while_scanning_stops_enumeration(drive):
+    progress, calls = cancel_when(lambda phase, counters: "files_seen" in counters)
+
+    with pytest.raises(ingest_jobs.IngestCancelled):
+        ingest.sync_incremental(None, fake_graph.DRIVE_ID, fake_graph.ROOT_ID, AGENT_ID, progress=progress)
+    assert "indexing" not in calls
+    assert not os.path.exists(sync_manifest.manifest_path(AGENT_ID))
+
+
+class CancelledPipeline:
+    """Indexes one file, then the job is cancelled."""
+    stats = {}
+    embeddings = None
+
+    def run(self, items):
+        yield next(iter(items))
+        raise ingest_jobs.IngestCancelled()
+
+
+def test_cancel_while_indexing_skips_manifest_and_summary(drive, monkeypatch):
+    monkeypatch.setattr(ingest, "build_pipeline", lambda agent_id, progress=None: CancelledPipeline())
+    progress, _ = cancel_when(lambda phase, counters: False)
+
+    with pytest.raises(ingest_jobs.IngestCancelled):
+        ingest.sync_incremental(None, fake_graph.DRIVE_ID, fake_graph.ROOT_ID, AGENT_ID, progress=progress)
+    assert not os.path.exists(sync_manifest.manifest_path(AGENT_ID))
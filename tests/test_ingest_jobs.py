@@ -0,0 +1,46 @@
+import time
+import pytest
+import ingest_jobs
+from ingest_jobs import JobConflict, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def start(store, agent_id="a", full_resync=False, heartbeat_age=0.0):
+    job = store.enqueue(agent_id, "folder", full_resync)
+    assert store.claim_next(pid=1)["id"] == job["id"]
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - heartbeat_age, job["id"]))
+    return job
+
+
+def test_live_job_blocks_a_new_trigger(store):
+    start(store)
+    with pytest.raises(JobConflict):
+        store.enqueue("a", "folder")
+
+
+def test_job_with_expired_heartbeat_does_not_block_a_new_trigger(store):
+    stale = start(store, full_resync=True, heartbeat_age=ingest_jobs.INGEST_STALE_SECONDS + 1)
+
+    job = store.enqueue("a", "folder")
+
+    assert job["status"] == "queued" and job["full_resync"]
+    assert store.get(stale["id"])["status"] == "failed"
+    assert store.active_job("a")["id"] == job["id"]
+
+
+def test_cancelling_a_job_whose_worker_died_finishes_it(store):
+    stale = start(store, heartbeat_age=ingest_jobs.INGEST_STALE_SECONDS + 1)
+
+    assert store.request_cancel(stale["id"])["status"] == "cancelled"
+    assert store.active_job("a") is None
+
+
+def test_resuming_a_job_whose_worker_died_requeues_it(store):
+    stale = start(store, heartbeat_age=ingest_jobs.INGEST_STALE_SECONDS + 1)
+
+    assert store.resume(stale["id"])["status"] == "queued"
@@ -0,0 +1,28 @@
+import api
+import answer_cache
+
+
+class StubJobStore:
+    version = 1.0
+
+    def index_version(self, agent_id):
+        return self.version
+
+
+def test_reindex_drops_cached_answers_without_a_resident_chain(monkeypatch):
+    jobs = StubJobStore()
+    monkeypatch.setattr(api.ingest_jobs, "get_store", lambda: jobs)
+    monkeypatch.setattr(api, "index_version_checked", {})
+    monkeypatch.setattr(api, "answer_index_versions", {})
+    cache = answer_cache.SemanticAnswerCache()
+    monkeypatch.setattr(answer_cache, "answer_cache", cache)
+
+    api.refresh_if_reindexed("idle-agent")
+    cache.store("idle-agent", "how do I reset the pump", [1.0, 0.0], {"answer": "old"})
+    assert "idle-agent" not in api.qa_chains
+
+    jobs.version = 2.0
+    api.index_version_checked.clear()
+    api.refresh_if_reindexed("idle-agent")
+
+    assert cache.lookup("idle-agent", "how do I reset the pump", [1.0, 0.0]) is None
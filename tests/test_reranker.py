@@ -0,0 +1,31 @@
+import asyncio
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from reranker import RerankingRetriever
+
+
+class ListRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return list(self.docs)
+
+
+class BrokenCrossEncoder:
+    def predict(self, pairs):
+        raise RuntimeError("model failed to load")
+
+
+def make_retriever():
+    docs = [Document(page_content=f"chunk {i}") for i in range(5)]
+    return RerankingRetriever(base_retriever=ListRetriever(docs=docs), cross_encoder=BrokenCrossEncoder(),
+                              top_n=2, budget_ms=5000), docs
+
+
+def test_scoring_failure_falls_back_to_retriever_order():
+    retriever, docs = make_retriever()
+
+    assert retriever.invoke("torque") == docs[:2]
+    assert asyncio.run(retriever.ainvoke("torque")) == docs[:2]
+    stats = retriever.stats()
+    assert stats["fallbacks"] == 2 and stats["reranked"] == 0